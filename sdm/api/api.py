@@ -5,16 +5,24 @@ This module is the abstract class for the API calls
 import logging
 
 from sdm import constants as c
+from sdm.util import instrumentation
+from sdm.util.date_utils import trunc_today
+from sdm.util.market_utils import find_missing_dates
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import datetime as dt
+import time
 import requests
+import json
 import csv
 
 
 class API(ABC):
 
-    def __init__(self, base_url, token, market, response_format):
+    def __init__(self, base_url, token, market, response_format, response_cache=None):
         self._base_url = base_url
+        self._response_cache = response_cache
         self._token = token
         if market.lower() not in c.MARKETS:
             raise ValueError("Market {} is not supported yet! We only support the following markets: {}"
@@ -25,15 +33,70 @@ class API(ABC):
                              .format(response_format, c.RESPONSE_FORMATS))
         self._format = response_format
         self._symbol_list = None
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=c.API_CONNECTION_POOL_SIZE,
+                                                pool_maxsize=c.API_CONNECTION_POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
 
     def _call_url(self, suffix):
-        response = requests.get(self._base_url + suffix)
-        if self._format == 'json':
-            return response.json()
-        elif self._format == 'csv':
-            return csv.reader(response.text.splitlines())
-        else:
-            raise ValueError("Not Recognized Format!")
+        url = self._base_url + suffix
+        ttl = self._get_cache_ttl(suffix) if self._response_cache is not None else 0
+        text = self._response_cache.get(url) if ttl != 0 else None
+        if ttl != 0:
+            instrumentation.count(instrumentation.COUNTER_CACHE_HITS if text is not None
+                                  else instrumentation.COUNTER_CACHE_MISSES)
+        if text is None:
+            with instrumentation.span(instrumentation.SPAN_DOWNLOAD):
+                response = self._get_with_retries(url)
+                text = response.text
+            instrumentation.count(instrumentation.COUNTER_REQUESTS)
+            instrumentation.count(instrumentation.COUNTER_BYTES_DOWNLOADED, len(response.content))
+            if ttl != 0 and response.status_code == requests.codes.ok:
+                self._response_cache.put(url, text, ttl)
+        with instrumentation.span(instrumentation.SPAN_PARSE):
+            if self._format == 'json':
+                return json.loads(text)
+            elif self._format == 'csv':
+                return csv.reader(text.splitlines())
+            else:
+                raise ValueError("Not Recognized Format!")
+
+    def _get_with_retries(self, url):
+        """
+        Send the request, and send it again after a delay if the provider is rate limiting or failing.
+        :return: the last response received
+        """
+        for attempt in range(c.API_MAX_RETRIES + 1):
+            response = self._session.get(url)
+            if response.status_code not in c.API_RETRY_STATUS_CODES or attempt == c.API_MAX_RETRIES:
+                return response
+            try:
+                delay = float(response.headers["Retry-After"])
+            except (KeyError, ValueError):
+                delay = c.API_RETRY_BACKOFF * 2 ** attempt
+            logging.warning("Got status {} from the API provider. Retrying in {:.2f} seconds".format(
+                response.status_code, delay))
+            instrumentation.count(instrumentation.COUNTER_RETRIES)
+            time.sleep(delay)
+
+    def _get_cache_ttl(self, suffix):
+        """
+        Decide how long the response of an API call can be cached.
+        :param suffix: the suffix of the url called
+        :return: seconds the response stays valid in the cache. None if it never expires, and 0 to not cache it
+        """
+        return 0
+
+    @staticmethod
+    def _date_range_ttl(end_date):
+        # Data up to two days ago is final and will not change, while more recent data may still be updated
+        if end_date <= trunc_today() - dt.timedelta(days=2):
+            return None
+        return c.RESPONSE_CACHE_RECENT_TTL
+
+    def get_market(self):
+        return self._market
 
     def get_url(self, suffix):
         return self._base_url + suffix
@@ -68,16 +131,42 @@ class API(ABC):
                 symbol_data = self.get_daily_historical_per_symbol(symbol, start_date, end_date)
                 if symbol_data is None:
                     continue
-                result = {**result, **symbol_data}
+                result.update(symbol_data)
+        return result
+
+    def get_daily_historical_missing(self, data):
+        """
+        Download only the missing open days of each symbol in the historical data, instead of downloading the whole
+        history again. The data passed in is not changed.
+        :param data: the historical data used in sdm, with symbol as the key and an OrderedDict with datetime object as
+        the key as the value
+        :return: A dict with symbol name as the key, and the value is an OrderedDict with only the records downloaded
+        for the missing days. Symbols without any missing day, or without data from the provider, are not included.
+        """
+        result = {}
+        for symbol, missing_dates in find_missing_dates(data, self._market).items():
+            symbol_data = self.get_daily_historical_per_symbol(symbol, missing_dates[0], missing_dates[-1])
+            if symbol_data is None:
+                continue
+            missing_dates = set(missing_dates)
+            found = OrderedDict((datetime, record) for datetime, record in symbol_data[symbol].items()
+                                if datetime in missing_dates)
+            if len(found) > 0:
+                result[symbol] = found
+        logging.info("Downloaded {} missing records for {} symbols".format(
+            sum(len(symbol_data) for symbol_data in result.values()), len(result)))
         return result
 
     @abstractmethod
-    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
+    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                                        as_columns=False):
         """
         Return the daily historical data for a symbol.
         :param symbol: symbol name for the stock. Case insensitive.
         :param start_date: Datetime object which defines the start date of the data to request.
         :param end_date: Datetime object which defines the end date of the data to request.
+        :param as_columns: if True, the data is returned in the columnar format defined in sdm.util.columnar, with only
+        the base columns kept.
         :return: A dict with symbol name as the key. The value is an OrderedDict object with datetime object as its own
         key. Each item in this OrderedDict is the stock data of this date as another dict.
         """
@@ -1,16 +1,18 @@
 from .api import API
 from sdm import constants as c
-from sdm.util.date_utils import string_to_date, date_to_string, trunc_today, timestamp_to_datetime
+from sdm.util.date_utils import string_to_date, date_to_string, trunc_today, timestamp_to_datetime, \
+    timestamps_to_datetimes
+from sdm.util.columnar import records_to_historical, records_to_columns, column_length
 
-from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
 import datetime as dt
 import logging
 
 
 class FMPAPI(API):
 
-    def __init__(self, token, market, response_format="json"):
-        super().__init__(c.FMP_BASE_URL, token, market, response_format)
+    def __init__(self, token, market, response_format="json", response_cache=None, base_url=c.FMP_BASE_URL):
+        super().__init__(base_url, token, market, response_format, response_cache)
         self._date_key = "date"
         self._symbol_key = "symbol"
         self._exchange_key = "exchange"
@@ -18,7 +20,8 @@ class FMPAPI(API):
         self._previous_close_key = "previousClose"
         self._type_key = "type"
 
-    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
+    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                                        as_columns=False):
 
         # Can only get up to today
         if end_date >= trunc_today():
@@ -36,14 +39,32 @@ class FMPAPI(API):
         try:
             if "historical" not in raw_response:
                 return None
-            response = self.convert_historical_response(raw_response["historical"], start_date, end_date)
-            logging.info("Symbol {} has {} entries loaded".format(symbol, len(response)))
+            response = self.convert_historical_response(raw_response["historical"], start_date, end_date, as_columns,
+                                                        symbol)
+            logging.info("Symbol {} has {} entries loaded".format(
+                symbol, column_length(response) if as_columns else len(response)))
         except self.InvalidSymbolError:
             logging.error("    FAILED to load URL: " + self.get_url(suffix))
             return None
 
         return {symbol: response}
 
+    def _get_cache_ttl(self, suffix):
+        if suffix.startswith("stock/list") or suffix.startswith("symbol/available-tsx"):
+            return c.RESPONSE_CACHE_SYMBOL_LIST_TTL
+        if suffix.startswith("historical-price-full/"):
+            return self._query_date_ttl(suffix, "to")
+        if suffix.startswith("batch-request-end-of-day-prices"):
+            return self._query_date_ttl(suffix, "date")
+        return 0
+
+    def _query_date_ttl(self, suffix, parameter):
+        date_string = parse_qs(urlsplit(suffix).query).get(parameter, [None])[0]
+        # Without the date, the response runs up to the latest day, which may still be updated
+        if date_string is None:
+            return c.RESPONSE_CACHE_RECENT_TTL
+        return self._date_range_ttl(string_to_date(date_string, c.FMP_DATE_FORMAT))
+
     def get_symbol_list_internal(self):
         if self._market == "tsx":
             suffix = "symbol/available-tsx?"
@@ -92,32 +113,34 @@ class FMPAPI(API):
         raw_response = super()._call_url(suffix)
         logging.info("Successfully loaded all {} realtime quotes for market {}".format(len(raw_response), self._market))
         result = {}
-        valid_symbols = self.get_symbol_list_internal()
+        valid_symbols = set(self.get_symbol_list())
         for quote in raw_response:
             if self._symbol_key in quote and quote[self._symbol_key] in valid_symbols:
                 symbol_quote = dict(quote)
-                if self._timestamp_key in symbol_quote and symbol_quote[self._timestamp_key] is not None:
-                    symbol_quote[c.DATETIME_KEY] = timestamp_to_datetime(symbol_quote[self._timestamp_key])
-                    del symbol_quote[self._timestamp_key]
                 del symbol_quote[self._symbol_key]
                 result[quote[self._symbol_key]] = symbol_quote
+
+        # convert the timestamps of all the quotes at once
+        timed_quotes = [quote for quote in result.values() if quote.get(self._timestamp_key) is not None]
+        datetimes = timestamps_to_datetimes([quote.pop(self._timestamp_key) for quote in timed_quotes])
+        for quote, datetime in zip(timed_quotes, datetimes):
+            quote[c.DATETIME_KEY] = datetime
         return result
 
-    def convert_historical_response(self, data, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
-        result = {}
-        for record in data:
-            if self._date_key in record:
-                date = string_to_date(record[self._date_key], c.FMP_DATE_FORMAT)
-                # For historical data we can only do it for one symbol each call, so there cannot be two entries with
-                # the same date
-                if date in result:
-                    logging.warning("Duplicate date {} found in the FMP Historical Data for symbol {}. "
-                                    "Skipping this record.".format(record[self._date_key], record["symbol"]))
-                elif start_date <= date <= end_date:
-                    date_values = dict(record)
-                    del date_values[self._date_key]
-                    result[date] = date_values
-        return OrderedDict(sorted(result.items()))
+    def convert_historical_response(self, data, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE, as_columns=False,
+                                    symbol=None):
+        # For historical data we can only do it for one symbol each call, so there cannot be two entries with the same
+        # date. The records of FMP do not have the symbol, so it is passed in for the warnings
+        if as_columns:
+            result, duplicates = records_to_columns(data, self._date_key, start_date, end_date,
+                                                    date_format=c.FMP_DATE_FORMAT)
+        else:
+            result, duplicates = records_to_historical(data, self._date_key, start_date, end_date,
+                                                       date_format=c.FMP_DATE_FORMAT)
+        for record in duplicates:
+            logging.warning("Duplicate date {} found in the FMP Historical Data for symbol {}. Skipping this record."
+                            .format(record[self._date_key], symbol))
+        return result
 
     def get_daily_eod_price_all_bulk(self, date_string):
         suffix = f"batch-request-end-of-day-prices?date={date_string}&apikey={self._token}"
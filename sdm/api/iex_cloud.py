@@ -3,19 +3,20 @@ This module is responsible for implementing the Alpha Vantage API calls
 
 """
 import logging
-from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from sdm.util.date_utils import date_difference, get_current_datetime, string_to_date
+from sdm.util.date_utils import date_difference, get_current_datetime
+from sdm.util.columnar import records_to_historical, records_to_columns, column_length
 from sdm.api.api import API
 from sdm import constants as c
 
 
 class IEXCloudAPI(API):
 
-    def __init__(self, token, market, response_format="json"):
+    def __init__(self, token, market, response_format="json", response_cache=None, base_url=c.IEX_CLOUD_BASE_URL):
         if market == 'tsx':
             raise ValueError("TSX is not supported by IEX cloud API!")
-        super().__init__(c.IEX_CLOUD_BASE_URL, token, market, response_format)
+        super().__init__(base_url, token, market, response_format, response_cache)
         self._date_key = "date"
         self._symbol_key = "symbol"
         self._exchange_key = "exchange"
@@ -23,7 +24,8 @@ class IEXCloudAPI(API):
         self._previous_close_key = "close"
         self._quote_key = "quote"
 
-    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
+    def get_daily_historical_per_symbol(self, symbol, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                                        as_columns=False):
         days_diff = date_difference(start_date, get_current_datetime())
         if days_diff < 5:
             date_range = "5d"
@@ -49,14 +51,23 @@ class IEXCloudAPI(API):
         logging.info("Successfully loaded all the daily data for symbol {}".format(symbol))
 
         try:
-            response = self.convert_historical_response(raw_response, start_date, end_date)
-            logging.info("Symbol {} has {} entries loaded".format(symbol, len(response)))
+            response = self.convert_historical_response(raw_response, start_date, end_date, as_columns)
+            logging.info("Symbol {} has {} entries loaded".format(
+                symbol, column_length(response) if as_columns else len(response)))
         except self.InvalidSymbolError:
             logging.error("    FAILED to load URL: " + self.get_url(suffix))
             return None
 
         return {symbol: response}
 
+    def _get_cache_ttl(self, suffix):
+        if suffix.startswith("ref-data/symbols"):
+            return c.RESPONSE_CACHE_SYMBOL_LIST_TTL
+        # The chart ranges are relative to today, so they change every day like the previous day prices
+        if suffix.startswith("stock/market/previous") or "/chart/" in suffix:
+            return c.RESPONSE_CACHE_RECENT_TTL
+        return 0
+
     def get_previous_day_full_price(self):
         """
         Get the full price for previous day on all symbols in the market.
@@ -121,45 +132,49 @@ class IEXCloudAPI(API):
 
     def get_realtime_quote_all(self):
         market_symbol_list = self.get_symbol_list()
-        all_raw_responses = {}
-        batch_num = 0
-        batch_symbols = ""
-        for symbol in market_symbol_list:
-            batch_symbols += symbol + ","
-            batch_num += 1
-            if batch_num == c.IEX_CLOUD_BATCH_LIMIT:
-                suffix = "stock/market/batch?symbols={}&types=quote&token={}".format(batch_symbols[:-1], self._token)
-                raw_response = super()._call_url(suffix)
-                all_raw_responses.update(raw_response)
-                batch_num = 0
-                batch_symbols = ""
-        return self.convert_realtime_quote_response(all_raw_responses)
+        batches = [",".join(market_symbol_list[i:i + c.IEX_CLOUD_BATCH_LIMIT])
+                   for i in range(0, len(market_symbol_list), c.IEX_CLOUD_BATCH_LIMIT)]
+        realtime_response = {}
+        if len(batches) == 0:
+            return realtime_response
+        with ThreadPoolExecutor(max_workers=min(c.IEX_CLOUD_MAX_CONCURRENT_BATCHES, len(batches))) as executor:
+            for raw_response in executor.map(self._get_realtime_quote_batch, batches):
+                self._merge_realtime_quote_response(raw_response, realtime_response)
+        return realtime_response
+
+    def _get_realtime_quote_batch(self, batch_symbols):
+        suffix = "stock/market/batch?symbols={}&types=quote&token={}".format(batch_symbols, self._token)
+        return super()._call_url(suffix)
 
     def convert_realtime_quote_response(self, data):
         realtime_response = {}
+        self._merge_realtime_quote_response(data, realtime_response)
+        return realtime_response
+
+    def _merge_realtime_quote_response(self, data, realtime_response):
         for (symbol, symbol_data) in data.items():
             if self._quote_key not in symbol_data:
                 continue
             self._remove_kv_pairs_from_dict(symbol_data[self._quote_key], [self._symbol_key])
             realtime_response[symbol] = symbol_data[self._quote_key]
-        return realtime_response
 
-    def convert_historical_response(self, data, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
-        result = {}
-        for record in data:
-            if self._date_key in record:
-                date = string_to_date(record[self._date_key], c.IEX_CLOUD_DATE_FORMAT)
-                # For historical data we can only do it for one symbol each call, so there cannot be two entries with
-                # the same date
-                if date in result:
-                    logging.warning("Duplicate date {} found in the IEX Cloud Historical Data for symbol {}. "
-                                    "Skipping this record.".format(record[self._date_key], record["symbol"]))
-                elif start_date <= date <= end_date:
-                    date_values = dict(record)
-                    del date_values[self._date_key]
-                    self._remove_kv_pairs_from_dict(date_values, ["id", "key", "subkey", "label", self._symbol_key])
-                    result[date] = date_values
-        return OrderedDict(sorted(result.items()))
+    def convert_historical_response(self, data, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE, as_columns=False):
+        # For historical data we can only do it for one symbol each call, so there cannot be two entries with the same
+        # date
+        if as_columns:
+            result, duplicates = records_to_columns(data, self._date_key, start_date, end_date,
+                                                    date_format=c.IEX_CLOUD_DATE_FORMAT)
+        else:
+            result, duplicates = records_to_historical(data, self._date_key, start_date, end_date,
+                                                       drop_keys=["id", "key", "subkey", "label", self._symbol_key],
+                                                       date_format=c.IEX_CLOUD_DATE_FORMAT)
+        for record in duplicates:
+            logging.warning("Duplicate date {} found in the IEX Cloud Historical Data for symbol {}. "
+                            "Skipping this record.".format(record[self._date_key], record.get(self._symbol_key)))
+        return result
+
+    def get_daily_eod_price_all_bulk(self, date_string):
+        raise NotImplementedError("Getting bulk end of day prices is not supported by IEX Cloud!")
 
     @staticmethod
     def _remove_kv_pairs_from_dict(dict_obj, key_list):
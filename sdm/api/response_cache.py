@@ -0,0 +1,109 @@
+"""
+This module is the on-disk cache for the responses of API calls, so the same request does not need to be sent twice
+
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from sdm import constants as c
+
+# Query parameters holding the API token, which are removed from the cache key
+TOKEN_PARAMETERS = ["apikey", "token"]
+
+
+class ResponseCache:
+
+    def __init__(self, directory, file_name=c.RESPONSE_CACHE_FILE, max_size=c.RESPONSE_CACHE_MAX_SIZE):
+        """
+        Initializer
+        :param directory: the directory to save the cache file
+        :param file_name: the name of the SQLite file where the compressed responses are saved
+        :param max_size: the maximum total size in bytes of the compressed responses. The least recently used
+        responses are removed when the size goes over this limit
+        """
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, file_name), check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS response_cache (
+                                  url text PRIMARY KEY,
+                                  expires real,
+                                  accessed real NOT NULL,
+                                  size integer NOT NULL,
+                                  body blob NOT NULL);""")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_url(url):
+        """
+        Normalize the url to be used as the cache key, so that the same request with a different token or a different
+        order of parameters is still found in the cache.
+        """
+        parts = urlsplit(url)
+        query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if key.lower() not in TOKEN_PARAMETERS)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+    def get(self, url):
+        """
+        :return: the response text cached for the url, or None if it is not cached or has expired
+        """
+        key = self.normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT expires, body FROM response_cache WHERE url = ?", (key,)).fetchone()
+            if row is None or (row[0] is not None and row[0] < now):
+                if row is not None:
+                    self._conn.execute("DELETE FROM response_cache WHERE url = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed = ? WHERE url = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[1]).decode("utf-8")
+
+    def put(self, url, text, ttl=None):
+        """
+        Save the response text for the url.
+        :param ttl: seconds the response stays valid. None if it never expires, and 0 to not cache it at all
+        """
+        if ttl == 0:
+            return
+        body = zlib.compress(text.encode("utf-8"))
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO response_cache VALUES (?,?,?,?,?)",
+                               (self.normalize_url(url), expires, now, len(body), body))
+            self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT coalesce(sum(size), 0) FROM response_cache").fetchone()[0]
+        if total_size <= self._max_size:
+            return
+        evicted = []
+        for url, size in self._conn.execute("SELECT url, size FROM response_cache ORDER BY accessed"):
+            if total_size <= self._max_size:
+                break
+            evicted.append((url,))
+            total_size -= size
+        self._conn.executemany("DELETE FROM response_cache WHERE url = ?", evicted)
+        logging.info("Removed {} responses from the cache to keep it under {} bytes".format(
+            len(evicted), self._max_size))
@@ -0,0 +1,66 @@
+"""
+This module measures how long it takes to import the modules of SDM, each in a new python process so nothing is cached
+from a previous import. The heavy dependencies (pandas, plotly, matplotlib and pydantic) should only be imported when
+the features that need them are used, so a worker loading data and running detectors starts quickly.
+
+    python -m sdm.benchmark.import_time --target 0.5
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules needed to download, load, validate and scan data, and to run a simulation
+CORE_MODULES = ["sdm.master", "sdm.api.fmp", "sdm.api.iex_cloud", "sdm.persistence.csv_operator",
+                "sdm.persistence.sql_operator", "sdm.operation.validation", "sdm.candlestick.pattern.basic_shapes",
+                "sdm.candlestick.pattern.advanced_shapes", "sdm.candlestick.evaluate", "sdm.metrics.eratio",
+                "sdm.simulation.market", "sdm.simulation.trader", "sdm.simulation.transaction",
+                "sdm.util.market_utils"]
+
+# Dependencies that must not be imported by the core modules
+HEAVY_MODULES = ["pandas", "plotly", "matplotlib", "pydantic"]
+
+# Seconds the import of all the core modules should take at most
+DEFAULT_TARGET = 0.5
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy_modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import_time(modules=None):
+    """
+    Import the modules in a new python process.
+    :param modules: the names of the modules to import. Default is CORE_MODULES
+    :return: a dict with seconds taken by the imports, and heavy_modules listing the ones of HEAVY_MODULES imported
+    """
+    script = _SCRIPT.format(modules=list(modules or CORE_MODULES), heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the time to import the core modules of SDM")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="maximum seconds allowed")
+    parser.add_argument("--repeat", type=int, default=3, help="number of measures, the fastest one is kept")
+    args = parser.parse_args()
+
+    results = [measure_import_time() for _ in range(args.repeat)]
+    seconds = min(result["seconds"] for result in results)
+    heavy_modules = results[0]["heavy_modules"]
+    print("Imported {} core modules in {:.3f} seconds (target {:.3f})".format(len(CORE_MODULES), seconds,
+                                                                              args.target))
+    if len(heavy_modules) > 0:
+        print("Heavy modules imported: {}".format(", ".join(heavy_modules)))
+    if seconds > args.target or len(heavy_modules) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
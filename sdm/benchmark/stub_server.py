@@ -0,0 +1,216 @@
+"""
+This module is a local stand-in for the FMP and IEX Cloud APIs, serving synthetic data over HTTP so the API classes can
+be tested and load-tested without a token or network. Latency, rate limiting and errors can be injected to see how
+concurrent downloads, retries and the response cache behave.
+
+    with StubProviderServer(symbols=500, latency=0.05, rate_limit=100) as server:
+        fmp = FMPAPI("any token", "nasdaq", base_url=server.fmp_base_url)
+        iex = IEXCloudAPI("any token", "nasdaq", base_url=server.iex_base_url)
+"""
+import datetime as dt
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import sdm.constants as c
+from sdm.benchmark.synthetic import generate_historical_data, generate_realtime_quotes
+from sdm.util.date_utils import date_to_string, string_to_date, trunc_today, datetime_to_timestamp
+
+FMP_PATH = "/fmp/api/v3/"
+IEX_PATH = "/iex/v1/"
+
+# Exchange names of the markets in the symbol lists
+EXCHANGES = {"nasdaq": "NASDAQ", "nyse": "NYSE", "tsx": "TSX"}
+
+# Calendar days covered by each range of the IEX Cloud chart endpoint. None is all the data
+IEX_CHART_RANGE_DAYS = {"5d": 7, "1m": 31, "3m": 92, "6m": 183, "1y": 366, "2y": 731, "5y": 1827, "max": None}
+
+
+class StubProviderServer:
+
+    def __init__(self, market="nasdaq", symbols=100, years=2, latency=0, rate_limit=None, retry_after=1,
+                 error_rate=0, seed=0, port=0):
+        """
+        Initializer
+        :param market: 'nyse', 'nasdaq', or 'tsx'. All the symbols served belong to this market
+        :param symbols: the number of symbols served
+        :param years: the years of daily data of each symbol, ending yesterday
+        :param latency: seconds to wait before answering each request
+        :param rate_limit: the maximum number of requests answered per second. The others get status 429 with a
+        Retry-After header. None for no limit
+        :param retry_after: the seconds sent in the Retry-After header of the rate limited and failed requests
+        :param error_rate: the probability of answering a request with status 503, as if the provider is overloaded
+        :param seed: the seed of the synthetic data and of the errors injected
+        :param port: the port to listen on. Default is any free port
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self.rate_limited = 0
+        self.errors = 0
+
+        self._market = market
+        self._exchange = EXCHANGES[market]
+        self._historical_data = generate_historical_data(symbols, years, market, trunc_today() - dt.timedelta(days=1),
+                                                         seed=seed)
+        self._quotes = generate_realtime_quotes(symbols, seed=seed)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_times = deque()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _StubRequestHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def fmp_base_url(self):
+        return "http://127.0.0.1:{}{}".format(self.port, FMP_PATH)
+
+    @property
+    def iex_base_url(self):
+        return "http://127.0.0.1:{}{}".format(self.port, IEX_PATH)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logging.info("Stub provider server started on port {}".format(self.port))
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_symbols(self):
+        return list(self._historical_data.keys())
+
+    def handle(self, url):
+        """
+        Answer a request to the url.
+        :return: a tuple (status, headers, body) where body is the object to send as json
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            now = time.monotonic()
+            while len(self._request_times) > 0 and self._request_times[0] <= now - 1:
+                self._request_times.popleft()
+            if self.rate_limit is not None and len(self._request_times) >= self.rate_limit:
+                self.rate_limited += 1
+                return 429, {"Retry-After": str(self.retry_after)}, {"Error Message": "Limit Reach"}
+            self._request_times.append(now)
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                self.errors += 1
+                return 503, {"Retry-After": str(self.retry_after)}, {"Error Message": "Injected error"}
+
+        parts = urlsplit(url)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        if parts.path.startswith(FMP_PATH):
+            endpoint, body = self._handle_fmp(parts.path[len(FMP_PATH):].split("/"), query)
+        elif parts.path.startswith(IEX_PATH):
+            endpoint, body = self._handle_iex(parts.path[len(IEX_PATH):].split("/"), query)
+        else:
+            endpoint, body = None, None
+        with self._lock:
+            self.requests[endpoint] += 1
+        if body is None:
+            return 404, {}, {"Error Message": "Unknown endpoint {}".format(parts.path)}
+        return 200, {}, body
+
+    def _handle_fmp(self, path, query):
+        if path == ["stock", "list"]:
+            return "fmp_symbol_list", [{"symbol": symbol, "name": symbol, "exchange": self._exchange, "type": "stock",
+                                        "price": self._quotes[symbol]["price"]} for symbol in self.get_symbols()]
+        if path == ["symbol", "available-tsx"]:
+            return "fmp_symbol_list", [{"symbol": symbol, "name": symbol} for symbol in self.get_symbols()]
+        if len(path) == 2 and path[0] == "historical-price-full":
+            symbol_data = self._historical_data.get(path[1])
+            if symbol_data is None:
+                return "fmp_historical", {}
+            start_date = string_to_date(query.get("from", date_to_string(c.EARLIEST_DATE)), c.FMP_DATE_FORMAT)
+            end_date = string_to_date(query.get("to", date_to_string(trunc_today())), c.FMP_DATE_FORMAT)
+            # FMP returns the latest date first
+            historical = [dict(record, date=date_to_string(datetime, c.FMP_DATE_FORMAT), adjClose=record["close"])
+                          for datetime, record in reversed(symbol_data.items()) if start_date <= datetime <= end_date]
+            return "fmp_historical", {"symbol": path[1], "historical": historical}
+        if len(path) == 2 and path[0] == "quote":
+            return "fmp_quote", [self._fmp_quote(path[1])] if path[1] in self._quotes else []
+        if len(path) == 2 and path[0] == "quotes":
+            return "fmp_quotes", [self._fmp_quote(symbol) for symbol in self._quotes]
+        if path == ["batch-request-end-of-day-prices"]:
+            date = string_to_date(query["date"], c.FMP_DATE_FORMAT)
+            return "fmp_batch_eod", [dict(symbol_data[date], symbol=symbol, date=query["date"])
+                                     for symbol, symbol_data in self._historical_data.items() if date in symbol_data]
+        return None, None
+
+    def _handle_iex(self, path, query):
+        if path == ["ref-data", "symbols"]:
+            return "iex_symbol_list", [{"symbol": symbol, "exchange": self._exchange} for symbol in self.get_symbols()]
+        if path == ["stock", "market", "previous"]:
+            return "iex_previous", [dict(next(reversed(symbol_data.values())), symbol=symbol,
+                                         date=date_to_string(next(reversed(symbol_data.keys())),
+                                                             c.IEX_CLOUD_DATE_FORMAT))
+                                    for symbol, symbol_data in self._historical_data.items()]
+        if path == ["stock", "market", "batch"]:
+            return "iex_batch", {symbol: {"quote": self._iex_quote(symbol)}
+                                 for symbol in query.get("symbols", "").split(",") if symbol in self._quotes}
+        if len(path) == 3 and path[0] == "stock" and path[2] == "quote":
+            return "iex_quote", self._iex_quote(path[1]) if path[1] in self._quotes else None
+        if len(path) == 4 and path[0] == "stock" and path[2] == "chart" and path[3] in IEX_CHART_RANGE_DAYS:
+            symbol_data = self._historical_data.get(path[1], {})
+            days = IEX_CHART_RANGE_DAYS[path[3]]
+            start_date = c.EARLIEST_DATE if days is None else trunc_today() - dt.timedelta(days=days)
+            return "iex_chart", [dict(record, date=date_to_string(datetime, c.IEX_CLOUD_DATE_FORMAT), symbol=path[1],
+                                      id="HISTORICAL_PRICES", key=path[1], subkey="", label=date_to_string(datetime))
+                                 for datetime, record in symbol_data.items() if datetime >= start_date]
+        return None, None
+
+    def _fmp_quote(self, symbol):
+        quote = self._quotes[symbol]
+        return {"symbol": symbol, "price": quote["price"], "open": quote["open"], "dayHigh": quote["high"],
+                "dayLow": quote["low"], "previousClose": quote["open"], "volume": quote["volume"],
+                "exchange": self._exchange, "timestamp": datetime_to_timestamp(quote[c.DATETIME_KEY])}
+
+    def _iex_quote(self, symbol):
+        quote = self._quotes[symbol]
+        return {"symbol": symbol, "companyName": symbol, "primaryExchange": self._exchange,
+                "latestPrice": quote["price"], "open": quote["open"], "high": quote["high"], "low": quote["low"],
+                "close": quote["close"], "previousClose": quote["open"], "volume": quote["volume"],
+                "isUSMarketOpen": True, "iexLastUpdated": datetime_to_timestamp(quote[c.DATETIME_KEY]) * 1000}
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    # keep the connections open, the same as the real providers, so the connection pool of the API is used
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, headers, body = self.server.stub.handle(self.path)
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logging.debug("Stub provider server: " + format % args)
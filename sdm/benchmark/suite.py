@@ -0,0 +1,217 @@
+"""
+This module is the benchmark suite of SDM. Each benchmark runs one step of a pipeline on synthetic data, and reports
+the rows processed per second and the peak memory allocated, so a performance regression shows up as a drop in the
+numbers between two runs with the same parameters.
+
+    python -m sdm.benchmark.suite --symbols 100 --years 5 --output report.json
+"""
+import argparse
+import csv
+import datetime as dt
+import inspect
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+
+import sdm.constants as c
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.evaluate import eval_gain_loss
+from sdm.candlestick.pattern import basic_shapes, advanced_shapes
+from sdm.candlestick.pattern.trend import is_down_trend
+from sdm.candlestick.scanner import scan_arrays
+from sdm.candlestick.streaming import get_call, call_detector
+from sdm.metrics.eratio import average_e_ratio
+from sdm.operation.validation import find_historical_violations
+from sdm.persistence.csv_operator import CSVOperator
+from sdm.persistence.sql_operator import SQLOperator
+from sdm.simulation.market import Market
+from sdm.simulation.trader import Trader
+from sdm.simulation.transaction import Transaction
+from sdm.util.misc_utils import transpose_dict
+
+# Number of days looked ahead by eval_gain_loss and average_e_ratio
+DAYS_AFTER = 10
+
+# Number of symbols traded by the strategy in the simulation benchmark, and the shares of each trade
+SIMULATION_SYMBOLS = 10
+SIMULATION_SHARES = 10
+
+# Columns of the csv report
+REPORT_COLUMNS = ["name", "rows", "seconds", "rows_per_second", "peak_memory_mb"]
+
+
+def measure(name, func, rows, measure_memory=True):
+    """
+    Time one call of the function, and optionally call it again under tracemalloc to find the peak memory allocated.
+    Memory is measured in a second call since tracemalloc slows down the code being traced.
+    :param name: the name of the benchmark
+    :param func: a function without any parameter
+    :param rows: the number of rows processed by one call of the function
+    :return: a dict with name, rows, seconds, rows_per_second and peak_memory_mb (None if memory is not measured)
+    """
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    peak_memory_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    result = {"name": name, "rows": rows, "seconds": seconds,
+              "rows_per_second": rows / seconds if seconds > 0 else None, "peak_memory_mb": peak_memory_mb}
+    logging.info("Benchmark {} processed {} rows in {:.3f} seconds".format(name, rows, seconds))
+    return result
+
+
+def get_candlestick_detectors():
+    """
+    :return: a dict with the name of every candlestick detector as the key, and the function as the value. A detector
+    takes curr and optionally prev_1, prev_2 or prev_9_list, with all the other parameters having a default value.
+    """
+    detectors = {}
+    for module in [basic_shapes, advanced_shapes]:
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if not name.startswith("is_") or func.__module__ != module.__name__:
+                continue
+            params = inspect.signature(func).parameters.values()
+            if all(param.name in ("curr", "prev_1", "prev_2", "prev_9_list") or param.default is not param.empty
+                   for param in params):
+                detectors[name] = func
+    return detectors
+
+
+def scan_detector(data, detector):
+    """
+    Run the detector on every day of every symbol, the same way as eval_gain_loss calls it.
+    :return: the number of days detected
+    """
+    call = get_call(detector)
+    detected = 0
+    for symbol_data in data.values():
+        days = list(symbol_data.values())
+        for i in range(10, len(days)):
+            detected += bool(call_detector(detector, days, i, call))
+    return detected
+
+
+def buy_and_sell_strategy(market_data_cumulative, current_day, position, cash, **kwargs):
+    """
+    A strategy for the simulation benchmark, buying the first symbols at the close price when not holding them, and
+    selling them the next day.
+    """
+    today_data = market_data_cumulative[current_day]
+    for symbol in sorted(today_data)[:SIMULATION_SYMBOLS]:
+        price = today_data[symbol]["close"]
+        if position.get(symbol, 0) > 0:
+            yield Transaction(action=-1, symbol=symbol, amount=position[symbol], price=price, datetime=current_day)
+        elif cash > price * SIMULATION_SHARES:
+            cash -= price * SIMULATION_SHARES
+            yield Transaction(action=1, symbol=symbol, amount=SIMULATION_SHARES, price=price, datetime=current_day)
+
+
+def simulate(data, market, batch=False):
+    datetimes = sorted({datetime for symbol_data in data.values() for datetime in symbol_data})
+    start_date, end_date = datetimes[0], datetimes[-1]
+    simulated_market = Market(data, market, start_date, end_date)
+    simulated_market.add_trader(Trader(buy_and_sell_strategy, 1e9, start_date, end_date))
+    while not simulated_market.is_the_end():
+        simulated_market.trade_and_forward(batch=batch)
+
+
+def run_suite(symbols=100, years=5, market="nasdaq", measure_memory=True, seed=0):
+    """
+    Run all the benchmarks on the same synthetic data.
+    :param symbols: the number of symbols in the synthetic data
+    :param years: the number of years of data for each symbol
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :param measure_memory: whether to find the peak memory of each benchmark, which runs each of them twice
+    :return: a list of results of each benchmark, see measure
+    """
+    data = generate_historical_data(symbols, years, market, seed=seed)
+    rows = sum(len(symbol_data) for symbol_data in data.values())
+    logging.info("Generated {} rows of {} symbols for the benchmarks".format(rows, symbols))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for file_type, operator, file_name in [("csv", CSVOperator(directory), "benchmark.csv"),
+                                               ("sql", SQLOperator(directory), "benchmark.db")]:
+            results.append(measure("{}_save".format(file_type),
+                                   lambda: operator.save_to_file(data, file_name, "historical", append=False),
+                                   rows, measure_memory))
+            results.append(measure("{}_load".format(file_type),
+                                   lambda: operator.load_from_file(file_name, "historical"), rows, measure_memory))
+            operator.close_connection()
+
+    results.append(measure("transpose_dict", lambda: transpose_dict(data), rows, measure_memory))
+    for level in range(1, 4):
+        results.append(measure("validation_level_{}".format(level),
+                               lambda: find_historical_violations(data, market, level), rows, measure_memory))
+    for name, detector in get_candlestick_detectors().items():
+        results.append(measure("detector_{}".format(name), lambda: scan_detector(data, detector), rows,
+                               measure_memory))
+    # every registered pattern and trend on every day at once, to compare with the detectors run one by one above
+    days = max(len(symbol_data) for symbol_data in data.values())
+    results.append(measure("pattern_scan", lambda: scan_arrays(data, days), rows, measure_memory))
+    results.append(measure("eval_gain_loss",
+                           lambda: eval_gain_loss(data, basic_shapes.is_hammer, is_down_trend, days_after=DAYS_AFTER),
+                           rows, measure_memory))
+    results.append(measure("average_e_ratio",
+                           lambda: average_e_ratio(data, lambda curr, prev: basic_shapes.is_doji(curr), DAYS_AFTER,
+                                                   market=market),
+                           rows, measure_memory))
+    for batch in [False, True]:
+        results.append(measure("simulation_batch" if batch else "simulation", lambda: simulate(data, market, batch),
+                               rows, measure_memory))
+    return results
+
+
+def export_results(results, file_path):
+    """
+    Save the results to a json file, or a csv file if the file name ends with .csv.
+    """
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, "w", newline='') as f:
+            writer = csv.DictWriter(f, REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(file_path, "w") as f:
+            json.dump({"created": dt.datetime.now().strftime(c.DATETIME_FORMAT), "results": results}, f, indent=2)
+
+
+def format_results(results):
+    lines = ["{:<40}{:>12}{:>12}{:>16}{:>12}".format("benchmark", "rows", "seconds", "rows/s", "peak MB")]
+    for result in results:
+        lines.append("{:<40}{:>12}{:>12.3f}{:>16.0f}{:>12}".format(
+            result["name"], result["rows"], result["seconds"], result["rows_per_second"] or 0,
+            "" if result["peak_memory_mb"] is None else "{:.1f}".format(result["peak_memory_mb"])))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SDM benchmarks on synthetic data")
+    parser.add_argument("--symbols", type=int, default=100, help="number of symbols")
+    parser.add_argument("--years", type=int, default=5, help="years of data for each symbol")
+    parser.add_argument("--market", default="nasdaq", choices=c.MARKETS)
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring the peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json or csv file to save the results")
+    args = parser.parse_args()
+
+    # the benchmarks log every transaction and validation error, which would distort the timing
+    logging.disable(logging.WARNING)
+    results = run_suite(args.symbols, args.years, args.market, not args.no_memory, args.seed)
+    logging.disable(logging.NOTSET)
+    print(format_results(results))
+    if args.output is not None:
+        export_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
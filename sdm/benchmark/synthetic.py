@@ -0,0 +1,88 @@
+"""
+This module generates synthetic stock data in the same format as the data downloaded from the API providers, so the
+performance of SDM can be measured offline and reproduced with the same seed.
+"""
+import datetime as dt
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.util.columnar import columns_to_historical
+from sdm.util.market_utils import get_open_days
+
+# Daily volatility of the close price, and of the open price against the previous close
+DAILY_VOLATILITY = 0.02
+OPEN_VOLATILITY = 0.005
+
+# Range of the first close price of a symbol
+START_PRICE_RANGE = (5, 500)
+
+
+def get_symbols(symbols):
+    """
+    :return: the list of synthetic symbol names, e.g. S0000, S0001, ...
+    """
+    return ["S{:04d}".format(i) for i in range(symbols)]
+
+
+def generate_historical_data(symbols=100, years=5, market="nasdaq", end_date=dt.datetime(2020, 12, 31), gap_rate=0.1,
+                             missing_rate=0.01, seed=0):
+    """
+    Generate daily OHLCV data following a random walk on the open days of the market, so weekends and holidays are
+    skipped the same as real data.
+    :param symbols: the number of symbols
+    :param years: the number of years of data for each symbol, ending on end_date
+    :param market: 'nyse', 'nasdaq', or 'tsx', deciding the holidays
+    :param end_date: the last date of the data
+    :param gap_rate: the fraction of symbols with some open days missing, as if the provider skipped them
+    :param missing_rate: the fraction of open days missing for the symbols with gaps
+    :param seed: the seed of the random numbers
+    :return: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order, with open, high, low, close and volume of the day as the value
+    """
+    rng = np.random.default_rng(seed)
+    open_days = get_open_days(end_date.replace(year=end_date.year - years) + dt.timedelta(days=1), end_date, market)
+    datetimes = open_days.astype("datetime64[s]")
+    result = {}
+    for symbol in get_symbols(symbols):
+        keep = np.ones(len(open_days), dtype=bool)
+        if rng.random() < gap_rate:
+            # the first and last days are kept so the date range of the symbol stays the same
+            keep[1:-1] = rng.random(len(open_days) - 2) >= missing_rate
+        result[symbol] = columns_to_historical(_generate_columns(rng, datetimes[keep]))
+    return result
+
+
+def generate_realtime_quotes(symbols=100, datetime=None, seed=0):
+    """
+    Generate a realtime quote for each symbol, with the same keys as the historical data plus price.
+    :return: the realtime data used in sdm. A dict with symbol as the key, and the value is the quote as another dict
+    """
+    rng = np.random.default_rng(seed)
+    datetime = datetime or dt.datetime.today().replace(microsecond=0)
+    columns = _generate_columns(rng, np.full(symbols, np.datetime64(datetime, "s")))
+    result = {}
+    for i, symbol in enumerate(get_symbols(symbols)):
+        quote = {key: columns[key][i].item() for key in c.BASE_COLUMNS}
+        quote["price"] = quote["close"]
+        quote[c.DATETIME_KEY] = datetime
+        result[symbol] = quote
+    return result
+
+
+def _generate_columns(rng, datetimes):
+    days = len(datetimes)
+    close = rng.uniform(*START_PRICE_RANGE) * np.exp(np.cumsum(rng.normal(0, DAILY_VOLATILITY, days)))
+    previous_close = np.r_[close[0], close[:-1]]
+    open_price = previous_close * np.exp(rng.normal(0, OPEN_VOLATILITY, days))
+    high = np.maximum(open_price, close) * (1 + np.abs(rng.normal(0, DAILY_VOLATILITY / 2, days)))
+    low = np.minimum(open_price, close) * (1 - np.abs(rng.normal(0, DAILY_VOLATILITY / 2, days)))
+    volume = rng.lognormal(13, 1, days).astype(np.int64)
+    # high and low are rounded away from the open and close, so the rounded data still passes the validation
+    precision = 10 ** c.FLOAT_PRECISION
+    return {c.DATETIME_KEY: datetimes,
+            "open": np.round(open_price, c.FLOAT_PRECISION),
+            "high": np.ceil(high * precision) / precision,
+            "low": np.floor(low * precision) / precision,
+            "close": np.round(close, c.FLOAT_PRECISION),
+            "volume": volume}
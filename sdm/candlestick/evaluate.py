@@ -3,16 +3,10 @@ This module evaluate the pattern detection in historical data
 """
 import logging
 
-from sdm.util.date_utils import date_to_string
-from sdm.candlestick.parameters import RSI_N
-
-import plotly.graph_objects as go
-from inspect import signature
-
-
-def make_plot_dict(datetime):
-    date_text = date_to_string(datetime)
-    return dict(x0=date_text, x1=date_text, y0=0, y1=1, xref='x', yref='paper', line_width=2)
+from sdm.util import instrumentation
+from sdm.util.columnar import historical_to_columns
+from sdm.candlestick.render import build_candlestick_figure
+from sdm.candlestick.streaming import get_call, call_detector
 
 
 def plot_candlestick(symbol, input_dict, detection_func, pattern_name="Candlestick Pattern", y_range=[0,100]):
@@ -25,46 +19,31 @@ def plot_candlestick(symbol, input_dict, detection_func, pattern_name="Candlesti
     :param y_range: the upper and lower range for the y axis. Default is to display $0 to $100
     :return: None
     """
+    # plotly takes a long time to import, so it is only imported when plotting
+    import plotly.graph_objects as go
+
     if len(input_dict) < 2:
         raise ValueError("The input data should have at lease 3 days but only has {} days instead".format(
             len(input_dict)))
 
-    result_list = []
-    params = signature(detection_func).parameters
+    hit_datetimes = []
+    call = get_call(detection_func)
     data_list = list(input_dict.values())
     datetime_list = list(input_dict.keys())
-    for i in range(len(data_list)):
-        if i > 1:
-            if "prev_9_list" in params:
-                found = detection_func(data_list[i], data_list[i - 10:i - 1]) if i > 9 else False
-            elif "prev_2" in params:
-                found = detection_func(data_list[i], data_list[i-1], data_list[i-2])
-            elif "prev_1" in params:
-                found = detection_func(data_list[i], data_list[i-1])
-            else:
-                found = detection_func(data_list[i])
-
-            if found:
-                result_list.append(make_plot_dict(datetime_list[i]))
-
-    logging.info("Found {} {} in stock price history".format(len(result_list), pattern_name, symbol))
-
-    fig = go.Figure(data=[go.Candlestick(x=datetime_list,
-                                         open=[entry["open"] for entry in data_list],
-                                         high=[entry["high"] for entry in data_list],
-                                         low=[entry["low"] for entry in data_list],
-                                         close=[entry["close"] for entry in data_list],
-                                         increasing_line_color='white', decreasing_line_color='black')])
-    fig.update_layout(
-        title=f'{pattern_name} Charts',
-        plot_bgcolor='grey',
-        yaxis_title=f'{symbol} Stock',
-        shapes=result_list,
-        yaxis1={"range": y_range}
-    )
+    with instrumentation.span(instrumentation.SPAN_PATTERN_SCAN):
+        for i in range(len(data_list)):
+            if call_detector(detection_func, data_list, i, call):
+                hit_datetimes.append(datetime_list[i])
+
+    logging.info("Found {} {} in stock price history".format(len(hit_datetimes), pattern_name, symbol))
+
+    # every day and every pattern found are drawn, see render.render_charts to write many charts to files instead
+    fig = go.Figure(build_candlestick_figure(symbol, historical_to_columns(input_dict), hit_datetimes, pattern_name,
+                                             y_range, max_points=None, max_shapes=None))
     fig.show()
 
 
+@instrumentation.timed(instrumentation.SPAN_PATTERN_SCAN)
 def eval_gain_loss(input_data, shape_func, trend_func, threshold_tuple=(), trend_tuple=(),
                    days_after=20, gain_loss_threshold=0.15):
     """
@@ -95,8 +74,8 @@ def eval_gain_loss(input_data, shape_func, trend_func, threshold_tuple=(), trend
     if shape_func is None and trend_func is None:
         raise ValueError("You must pick at least one function for either candlestick detection or trend detection!")
 
-    shape_params = signature(shape_func).parameters if shape_func is not None else None
-    trend_params = signature(trend_func).parameters if trend_func is not None else None
+    shape_call = get_call(shape_func) if shape_func is not None else None
+    trend_call = get_call(trend_func) if trend_func is not None else None
 
     for symbol in input_data:
         symbol_data = list(input_data[symbol].values())
@@ -105,32 +84,15 @@ def eval_gain_loss(input_data, shape_func, trend_func, threshold_tuple=(), trend
         if len(symbol_data) > 20 + days_after:
             for i in range(20, len(symbol_data) - days_after):
                 curr = symbol_data[i]
-                prev_1 = symbol_data[i - 1]
-                prev_2 = symbol_data[i - 2]
-                prev_5 = symbol_data[i - 5]
-                prev_10 = symbol_data[i - 10]
-                prev_20 = symbol_data[i - 20]
-
                 if shape_func is None:
                     shape_match = True
                 else:
-                    if "prev_9_list" in shape_params:
-                        shape_match = shape_func(curr, symbol_data[i-10:i-1], *threshold_tuple)
-                    elif "prev_2" in shape_params:
-                        shape_match = shape_func(curr, prev_1, prev_2, *threshold_tuple)
-                    elif "prev_1" in shape_params:
-                        shape_match = shape_func(curr, prev_1, *threshold_tuple)
-                    else:
-                        shape_match = shape_func(curr, *threshold_tuple)
+                    shape_match = call_detector(shape_func, symbol_data, i, shape_call, threshold_tuple)
 
                 if trend_func is None:
                     trend_match = True
                 else:
-                    # We only support simple and RSI approaches here
-                    if "prev_5" in trend_params and "prev_10" in trend_params and "prev_20" in trend_params:
-                        trend_match = trend_func(curr, prev_5, prev_10, prev_20, *trend_tuple)
-                    else:
-                        trend_match = trend_func(curr, symbol_data[i - RSI_N:i], *trend_tuple)
+                    trend_match = call_detector(trend_func, symbol_data, i, trend_call, trend_tuple)
 
                 if shape_match and trend_match:
                     detected += 1
@@ -0,0 +1,203 @@
+"""
+This module keeps the feature table of each symbol in a npy file, so the candlestick features are computed once and
+read by the following scans instead of being computed again. The files of the symbols saved by StockDataMaster are
+removed when their data changes. A scan of a range of the days takes that range from the table, and a table is only
+computed again if it does not have all the days of the data. It then replaces the saved one only if it has all the days
+of it as well, so a scan of fewer days does not replace a longer table.
+
+A table is saved as a 2-D float array with one row per day and one column for each of TABLE_COLUMNS. The datetimes are
+saved as seconds since the epoch and the flags as 0 or 1. The files are memory mapped when read, so taking the latest
+days of a symbol only reads the end of its file.
+
+    cache = sdm.get_feature_cache("nasdaq_historical.db")
+    hits = scan(nasdaq_data, days=5, feature_cache=cache)
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.candlestick.features import compute_feature_table, TABLE_FEATURES, TABLE_FLAGS
+from sdm.util.columnar import to_datetime64, DATETIME_UNIT
+from sdm.util.io_utils import write_atomically
+
+# Columns of the saved tables, in order
+TABLE_COLUMNS = [c.DATETIME_KEY] + c.BASE_COLUMNS + TABLE_FEATURES
+
+# File listing the columns of the tables saved in a directory
+COLUMNS_FILE = "columns.json"
+
+
+class FeatureCache:
+
+    def __init__(self, directory):
+        """
+        Initializer
+        :param directory: the directory to save the feature tables in, one file per symbol
+        """
+        self._directory = directory
+        self._checked = False
+        # symbol -> table read or computed, so the following scans in the same process do not read the file again
+        self._tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def get_table(self, symbol, symbol_data):
+        """
+        Take the days of the data from the saved feature table of the symbol, or compute the table if the saved one does
+        not have all of them. The computed table is saved if it has all the days of the saved one.
+        :param symbol_data: an OrderedDict with datetime object as the key in ascending order, and the value is the
+        stock data of the date as another dict
+        :return: the feature table as a 2-D float array with a column for each of TABLE_COLUMNS. See table_to_columns
+        to convert it to the columnar format
+        """
+        self._check_columns()
+        saved = self._tables.get(symbol)
+        if saved is None:
+            saved = self._read_table(symbol)
+        table = None if saved is None else _take_days(saved, symbol_data)
+        if table is not None:
+            self.hits += 1
+            self._tables[symbol] = saved
+            return table
+        self.misses += 1
+        table = _columns_to_table(compute_feature_table(symbol_data))
+        if saved is None or (len(table) >= len(saved) and np.isin(saved[:, 0], table[:, 0]).all()):
+            self._write_table(symbol, table)
+            self._tables[symbol] = table
+        return table
+
+    def get_tables(self, data):
+        """
+        :param data: the historical data used in sdm
+        :return: a dict with symbol as the key, and the feature table of the symbol as the value
+        """
+        hits, misses = self.hits, self.misses
+        tables = {symbol: self.get_table(symbol, symbol_data) for symbol, symbol_data in data.items()}
+        logging.info("Feature tables of {} symbols have been read, and {} have been computed".format(
+            self.hits - hits, self.misses - misses))
+        return tables
+
+    def invalidate(self, symbols=None):
+        """
+        Remove the feature tables of the symbols, or all of them if symbols is None.
+        """
+        if symbols is None:
+            self._tables.clear()
+        else:
+            for symbol in symbols:
+                self._tables.pop(symbol, None)
+        if not os.path.isdir(self._directory):
+            return
+        if symbols is None:
+            file_names = [name for name in os.listdir(self._directory) if name.endswith(".npy")]
+        else:
+            file_names = [self._file_name(symbol) for symbol in symbols]
+        removed = 0
+        for file_name in file_names:
+            try:
+                os.remove(os.path.join(self._directory, file_name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed > 0:
+            logging.info("{} feature tables have been removed from {}".format(removed, self._directory))
+
+    def _check_columns(self):
+        # tables saved with other columns, e.g. by an older version, are all removed
+        if self._checked:
+            return
+        columns_path = os.path.join(self._directory, COLUMNS_FILE)
+        if os.path.isfile(columns_path):
+            with open(columns_path) as f:
+                if json.load(f) != TABLE_COLUMNS:
+                    self.invalidate()
+        os.makedirs(self._directory, exist_ok=True)
+        with open(columns_path, "w") as f:
+            json.dump(TABLE_COLUMNS, f)
+        self._checked = True
+
+    def _file_name(self, symbol):
+        return "{}.npy".format(symbol.replace(os.sep, "_"))
+
+    def _read_table(self, symbol):
+        path = os.path.join(self._directory, self._file_name(symbol))
+        if not os.path.isfile(path):
+            return None
+        try:
+            table = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logging.warning("Feature table {} cannot be read and will be computed again: {}".format(path, e))
+            return None
+        if table.ndim != 2 or table.shape[1] != len(TABLE_COLUMNS):
+            return None
+        return table
+
+    def _write_table(self, symbol, table):
+        path = os.path.join(self._directory, self._file_name(symbol))
+        write_atomically(path, lambda f: np.save(f, table), "wb")
+
+
+def _columns_to_table(columns):
+    table = np.empty((len(columns[c.DATETIME_KEY]), len(TABLE_COLUMNS)))
+    table[:, 0] = columns[c.DATETIME_KEY].astype(DATETIME_UNIT).astype(np.int64)
+    for i, name in enumerate(TABLE_COLUMNS[1:], 1):
+        table[:, i] = columns[name]
+    return table
+
+
+def _to_datetimes(seconds):
+    return np.where(np.isnan(seconds), np.datetime64("NaT"),
+                    np.nan_to_num(seconds).astype(np.int64).astype(DATETIME_UNIT))
+
+
+def table_to_columns(table):
+    """
+    Convert a feature table to the columnar format of sdm.util.columnar, with a column for each feature as well.
+    """
+    table = np.asarray(table)
+    result = {c.DATETIME_KEY: _to_datetimes(table[:, 0])}
+    for i, name in enumerate(TABLE_COLUMNS[1:], 1):
+        result[name] = table[:, i] == 1 if name in TABLE_FLAGS else table[:, i]
+    return result
+
+
+def recent_rows(tables, days):
+    """
+    The same as features.recent_prices, but taking the latest days from the feature tables of the symbols.
+    :param tables: a dict with symbol as the key, and the feature table of the symbol as the value
+    :return: a tuple (symbols, datetimes, values, positions) where values has all the columns of TABLE_COLUMNS
+    """
+    symbols = list(tables.keys())
+    block = np.full((len(symbols), days, len(TABLE_COLUMNS)), np.nan)
+    positions = np.tile(np.arange(-days, 0), (len(symbols), 1))
+    for row, symbol in enumerate(symbols):
+        table = tables[symbol]
+        taken = min(len(table), days)
+        if taken > 0:
+            block[row, days - taken:] = table[len(table) - taken:]
+        positions[row] += len(table)
+    values = table_to_columns(block.reshape(-1, len(TABLE_COLUMNS)))
+    values = {name: column.reshape(len(symbols), days) for name, column in values.items()}
+    return symbols, values.pop(c.DATETIME_KEY), values, positions
+
+
+def _take_days(table, symbol_data):
+    # the rows of the days of the data, or None if the table does not have all of them. Comparing the number of days and
+    # the first and last ones is enough since the tables of the symbols saved are removed, and it avoids reading the
+    # whole data
+    if len(symbol_data) == 0:
+        return table[:0]
+    first = to_datetime64(next(iter(symbol_data))).astype(np.int64)
+    last = to_datetime64(next(reversed(symbol_data))).astype(np.int64)
+    start = np.searchsorted(table[:, 0], first, side="left")
+    end = np.searchsorted(table[:, 0], last, side="right")
+    if end - start != len(symbol_data) or table[start, 0] != first or table[end - 1, 0] != last:
+        return None
+    return table[start:end]
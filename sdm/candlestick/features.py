@@ -0,0 +1,156 @@
+"""
+This module computes the features of the candlesticks shared by the pattern detectors, such as the body and day length,
+the shadows and the windows between two days. They are computed on numpy arrays holding many days at once, and
+optionally many symbols with one row per symbol and the days along the last axis, so each feature is computed only once
+no matter how many patterns use it.
+"""
+from itertools import islice
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.candlestick.parameters import RSI_N, FEATURE_RETURN_DAYS
+from sdm.util.columnar import to_float_array, historical_to_columns, DATETIME_UNIT
+
+
+def shift(values, days):
+    """
+    Shift an array along its last axis, so each day holds the value of the given number of days before. The first days
+    without any day before them are NaN, or False for a boolean array.
+    """
+    result = np.full(values.shape, False if values.dtype == bool else np.nan, dtype=values.dtype)
+    if days < values.shape[-1]:
+        result[..., days:] = values[..., :values.shape[-1] - days]
+    return result
+
+
+def ratio(numerator, denominator):
+    """
+    Divide the arrays without warnings, giving inf or NaN where the denominator is 0.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return numerator / denominator
+
+
+def rsi(features, n=RSI_N):
+    """
+    The RSI of the last n days of each day, the same as the simple method of trend.rsi, adding the changes of the last
+    n days one by one in the same order.
+    :param features: the CandleFeatures with at least the close
+    :return: a float array of the same shape as the close
+    """
+    avg_up = np.zeros(features["close"].shape)
+    avg_down = np.zeros(features["close"].shape)
+    for days in range(n, 0, -1):
+        prev_closing = features.prev("close", days)
+        next_closing = features.prev("close", days - 1) if days > 1 else features["close"]
+        avg_up += np.where(next_closing > prev_closing, next_closing - prev_closing, 0)
+        avg_down += np.where(prev_closing > next_closing, prev_closing - next_closing, 0)
+    total = avg_up + avg_down
+    # rounded one by one with the builtin round as trend.rsi does, since np.round rounds some of the halves differently
+    values = ratio(100 * avg_up, total)
+    rounded = np.array([round(value, 2) for value in values.ravel().tolist()]).reshape(values.shape)
+    return np.where(total > 0, rounded, 50)
+
+
+# Functions computing each feature from the other ones
+FEATURES = {
+    "body": lambda f: np.abs(f["close"] - f["open"]),
+    "day": lambda f: f["high"] - f["low"],
+    "body_top": lambda f: np.maximum(f["open"], f["close"]),
+    "body_bottom": lambda f: np.minimum(f["open"], f["close"]),
+    "upper_shadow": lambda f: f["high"] - f["body_top"],
+    "lower_shadow": lambda f: f["body_bottom"] - f["low"],
+    "body_ratio": lambda f: ratio(f["body"], f["day"]),
+    "shadow_ratio": lambda f: ratio(f["day"] - f["body"], f["day"]),
+    "upper_shadow_ratio": lambda f: ratio(f["upper_shadow"], f["day"]),
+    "lower_shadow_ratio": lambda f: ratio(f["lower_shadow"], f["day"]),
+    "white": lambda f: f["close"] > f["open"],
+    "black": lambda f: f["close"] < f["open"],
+    "up_window": lambda f: f["low"] >= f.prev("high", 1),
+    "down_window": lambda f: f["high"] <= f.prev("low", 1),
+    "rsi": rsi,
+}
+for _days in FEATURE_RETURN_DAYS:
+    FEATURES["return_{}".format(_days)] = lambda f, days=_days: ratio(f["close"], f.prev("close", days)) - 1
+
+# Features saved in the feature table of each symbol, and the ones of them that are boolean flags
+TABLE_FLAGS = ["white", "black", "up_window", "down_window"]
+TABLE_FEATURES = ["body", "day", "body_top", "body_bottom", "upper_shadow", "lower_shadow", "body_ratio",
+                  "shadow_ratio", "upper_shadow_ratio", "lower_shadow_ratio"] + TABLE_FLAGS + \
+                 ["return_{}".format(days) for days in FEATURE_RETURN_DAYS]
+
+
+class CandleFeatures:
+
+    def __init__(self, prices):
+        """
+        Initializer. The features are computed when first used, and kept for the following uses.
+        :param prices: a dict with at least open, high, low and close, each mapped to a float numpy array of the same
+        shape with the days in ascending order along the last axis
+        """
+        self._values = dict(prices)
+        self._shifted = {}
+
+    def __getitem__(self, name):
+        value = self._values.get(name)
+        if value is None:
+            if name not in FEATURES:
+                raise ValueError("Unknown feature {}! Must be one of these: {}".format(name, list(FEATURES)))
+            value = FEATURES[name](self)
+            self._values[name] = value
+        return value
+
+    def prev(self, name, days):
+        """
+        :return: the feature of the given number of days before each day
+        """
+        key = (name, days)
+        value = self._shifted.get(key)
+        if value is None:
+            value = shift(self[name], days)
+            self._shifted[key] = value
+        return value
+
+
+def recent_prices(data, days, columns=c.BASE_COLUMNS):
+    """
+    Take the latest days of every symbol into arrays with one row per symbol. Symbols with fewer days are padded at the
+    start with NaN prices.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order
+    :param days: the number of latest days to take
+    :param columns: the keys of the stock data to take
+    :return: a tuple (symbols, datetimes, prices, positions). datetimes is a datetime64[s] array of the days with one
+    row per symbol and NaT for padding. prices is a dict mapping each column to a float array of the same shape.
+    positions is an int array of the same shape with the index of each day in the data of its symbol, negative for
+    padding.
+    """
+    symbols = list(data.keys())
+    datetimes = np.full((len(symbols), days), np.datetime64("NaT"), dtype=DATETIME_UNIT)
+    prices = {column: np.full((len(symbols), days), np.nan) for column in columns}
+    positions = np.tile(np.arange(-days, 0), (len(symbols), 1))
+    for row, symbol in enumerate(symbols):
+        symbol_data = data[symbol]
+        recent = list(islice(reversed(symbol_data.items()), days))[::-1]
+        if len(recent) == 0:
+            continue
+        datetimes[row, days - len(recent):] = [datetime for datetime, _ in recent]
+        for column in columns:
+            prices[column][row, days - len(recent):] = to_float_array([record.get(column) for _, record in recent])
+        positions[row] += len(symbol_data)
+    return symbols, datetimes, prices, positions
+
+
+def compute_feature_table(symbol_data):
+    """
+    Compute all the features of TABLE_FEATURES for every day of one symbol.
+    :param symbol_data: an OrderedDict with datetime object as the key in ascending order, and the value is the stock
+    data of the date as another dict
+    :return: the data in the columnar format of sdm.util.columnar, with a column for each feature as well
+    """
+    table = historical_to_columns(symbol_data)
+    features = CandleFeatures(table)
+    for name in TABLE_FEATURES:
+        table[name] = features[name]
+    return table
@@ -73,3 +73,10 @@ RSI_UPPER_BOUND = 80
 
 # the lower bound for RSI to determine a downtrend
 RSI_LOWER_BOUND = 20
+
+# ----------------------------------------------------------------------------------------------------------------
+# Parameters for the feature table
+
+# The returns over these numbers of days are computed for each day in the feature table, e.g. return_5 is the change of
+# the close price from 5 days before
+FEATURE_RETURN_DAYS = [1, 5, 10, 20]
@@ -0,0 +1,158 @@
+"""
+This module renders candlestick charts to files without a browser, to review the patterns found by a scan. The charts
+of many symbols are written in parallel, long histories are downsampled and the number of patterns marked is capped,
+so each chart stays small and quick to write. HTML charts share one copy of plotly.js in the output directory, and PNG
+charts need the kaleido package.
+
+    hits = scan(nasdaq_data, days=5)
+    render_charts(nasdaq_data, hits, "/tmp/charts", formats=["html", "png"], processes=8)
+"""
+import importlib.util
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from itertools import islice
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.util.columnar import historical_to_columns, to_datetime64
+
+CHART_FORMATS = ["html", "png"]
+
+# Size in pixels of the PNG charts
+CHART_WIDTH = 1200
+CHART_HEIGHT = 600
+
+
+def downsample_columns(columns, max_points):
+    """
+    Merge consecutive days into one stick, so there are at most max_points sticks. Each stick opens at the open of its
+    first day, closes at the close of its last day, and has the highest high and lowest low of its days.
+    :param columns: the data of one symbol in the columnar format of sdm.util.columnar
+    :return: the downsampled data in the same format, with the datetime of the first day of each stick
+    """
+    length = len(columns[c.DATETIME_KEY])
+    if max_points is None or length <= max_points:
+        return columns
+    size = math.ceil(length / max_points)
+    starts = np.arange(0, length, size)
+    ends = np.minimum(starts + size, length) - 1
+    result = {c.DATETIME_KEY: columns[c.DATETIME_KEY][starts],
+              "open": columns["open"][starts],
+              "high": np.maximum.reduceat(columns["high"], starts),
+              "low": np.minimum.reduceat(columns["low"], starts),
+              "close": columns["close"][ends]}
+    if "volume" in columns:
+        result["volume"] = np.add.reduceat(columns["volume"], starts)
+    return result
+
+
+def _to_strings(datetimes):
+    datetimes = np.asarray(datetimes, dtype="datetime64[s]")
+    daily = len(datetimes) == 0 or np.all(datetimes == datetimes.astype("datetime64[D]"))
+    return np.datetime_as_string(datetimes, unit="D" if daily else "s").tolist()
+
+
+def build_candlestick_figure(symbol, columns, hit_datetimes=(), pattern_name="Candlestick Pattern", y_range=None,
+                             max_points=c.CHART_MAX_POINTS, max_shapes=c.CHART_MAX_SHAPES):
+    """
+    Build the candlestick chart of one symbol with a vertical line on each day a pattern is found.
+    :param columns: the data of one symbol in the columnar format of sdm.util.columnar
+    :param hit_datetimes: the datetimes the patterns are found on
+    :param pattern_name: the name of the patterns shown in the title
+    :param y_range: the lower and upper range of the y axis. Default is to fit the prices
+    :param max_points: the maximum number of sticks, see downsample_columns. None for no limit
+    :param max_shapes: the maximum number of patterns marked, keeping the latest ones. None for no limit
+    :return: the figure as a dict, to be used by plotly with go.Figure(figure) or plotly.io functions
+    """
+    chart = downsample_columns(columns, max_points)
+    datetimes = chart[c.DATETIME_KEY]
+    hits = np.array([to_datetime64(datetime) for datetime in hit_datetimes], dtype="datetime64[s]")
+    if len(datetimes) > 0:
+        hits = hits[(hits >= datetimes[0]) & (hits <= columns[c.DATETIME_KEY][-1])]
+        # each pattern is marked on the stick holding its day, once per stick
+        hits = np.unique(datetimes[np.searchsorted(datetimes, hits, side="right") - 1])
+    if max_shapes is not None:
+        hits = hits[len(hits) - min(max_shapes, len(hits)):]
+    shapes = [dict(x0=text, x1=text, y0=0, y1=1, xref='x', yref='paper', line_width=2) for text in _to_strings(hits)]
+
+    layout = dict(title=dict(text='{} Charts'.format(pattern_name)), plot_bgcolor='grey',
+                  yaxis=dict(title=dict(text='{} Stock'.format(symbol))), shapes=shapes)
+    if y_range is not None:
+        layout["yaxis"]["range"] = list(y_range)
+    trace = dict(type="candlestick", x=_to_strings(datetimes), open=chart["open"].tolist(),
+                 high=chart["high"].tolist(), low=chart["low"].tolist(), close=chart["close"].tolist(),
+                 increasing=dict(line=dict(color='white')), decreasing=dict(line=dict(color='black')))
+    return dict(data=[trace], layout=layout)
+
+
+def _render_chart(directory, symbol, columns, hit_datetimes, pattern_name, formats, max_points, max_shapes):
+    import plotly.io as pio
+
+    figure = build_candlestick_figure(symbol, columns, hit_datetimes, pattern_name, max_points=max_points,
+                                      max_shapes=max_shapes)
+    file_name = symbol.replace(os.sep, "_")
+    paths = []
+    for chart_format in formats:
+        path = os.path.join(directory, "{}.{}".format(file_name, chart_format))
+        if chart_format == "html":
+            pio.write_html(figure, path, include_plotlyjs="directory", validate=False, auto_open=False)
+        else:
+            pio.write_image(figure, path, format=chart_format, width=CHART_WIDTH, height=CHART_HEIGHT, validate=False)
+        paths.append(path)
+    return paths
+
+
+def render_charts(data, hits, directory, formats=("html",), days=c.CHART_DAYS, processes=None,
+                  max_points=c.CHART_MAX_POINTS, max_shapes=c.CHART_MAX_SHAPES):
+    """
+    Write the chart of each symbol of the hits, marking the days its patterns are found on.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order
+    :param hits: the symbols to draw, as a dict with symbol as the key and the value is a dict with the name of each
+    pattern found as the key and the list of datetime objects it is found on, e.g. the result of scanner.scan
+    :param directory: the directory to write the charts in, one file per symbol and format named after the symbol
+    :param formats: html and/or png
+    :param days: the number of latest days drawn for each symbol. None for all of them
+    :param processes: the number of processes writing the charts. None is to use as many processes as CPUs
+    :return: a list of the files written
+    """
+    unknown = [chart_format for chart_format in formats if chart_format not in CHART_FORMATS]
+    if len(unknown) > 0:
+        raise ValueError("Unknown chart formats {}! Must be some of these: {}".format(unknown, CHART_FORMATS))
+    if "png" in formats and importlib.util.find_spec("kaleido") is None:
+        raise ValueError("Writing png charts needs the kaleido package. Please install it with pip install kaleido")
+    os.makedirs(directory, exist_ok=True)
+    if "html" in formats:
+        # written once here, otherwise every process would try to write it for its first chart
+        from plotly.offline import get_plotlyjs
+        bundle_path = os.path.join(directory, "plotly.min.js")
+        if not os.path.isfile(bundle_path):
+            with open(bundle_path, "w", encoding="utf-8") as f:
+                f.write(get_plotlyjs())
+
+    symbols = [symbol for symbol in hits if symbol in data]
+    columns = []
+    for symbol in symbols:
+        symbol_data = data[symbol]
+        if days is not None and len(symbol_data) > days:
+            symbol_data = OrderedDict(list(islice(reversed(symbol_data.items()), days))[::-1])
+        columns.append(historical_to_columns(symbol_data))
+    count = len(symbols)
+    arguments = [[directory] * count, symbols, columns,
+                 [[datetime for datetimes in hits[symbol].values() for datetime in datetimes] for symbol in symbols],
+                 [", ".join(hits[symbol]) or "Candlestick Pattern" for symbol in symbols], [list(formats)] * count,
+                 [max_points] * count, [max_shapes] * count]
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or count <= 1:
+        written = list(map(_render_chart, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            written = list(executor.map(_render_chart, *arguments, chunksize=max(1, count // (processes * 4))))
+    paths = [path for chart_paths in written for path in chart_paths]
+    logging.info("{} charts of {} symbols have been written to directory {}".format(len(paths), count, directory))
+    return paths
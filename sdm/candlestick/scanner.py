@@ -0,0 +1,337 @@
+"""
+This module scans the latest days of all the symbols for every candlestick pattern and trend in one pass. The patterns
+of basic_shapes and advanced_shapes, and the trends of trend, are registered here as detectors working on the
+CandleFeatures of all the symbols at once, and give the same results as the original functions with their default
+parameters, called the same way as in evaluate.
+
+    hits = scan(nasdaq_data, days=5)
+    symbols = find_symbols(hits, BULLISH, trend="down_trend")
+"""
+import logging
+import os
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sdm.candlestick.feature_cache import recent_rows
+from sdm.candlestick.features import CandleFeatures, recent_prices, shift
+from sdm.candlestick.parameters import *
+from sdm.util import instrumentation
+
+# Signals given by a pattern
+BULLISH = "bullish"
+BEARISH = "bearish"
+NEUTRAL = "neutral"
+TREND = "trend"
+
+# name: the name of the pattern. detect: a function taking a CandleFeatures and returning a boolean array of the days
+# printing the pattern. days: the number of days before needed to detect the pattern. signal: one of the signals above
+Pattern = namedtuple("Pattern", ["name", "detect", "days", "signal"])
+
+# All the patterns and trends scanned, by name
+PATTERNS = OrderedDict()
+
+
+def register_pattern(name, days, signal=NEUTRAL):
+    """
+    Decorator to register a detector taking a CandleFeatures, so it is scanned with all the other patterns. The
+    detector must be defined at the module level to be used with more than one process.
+    """
+    def decorator(func):
+        PATTERNS[name] = Pattern(name, func, days, signal)
+        return func
+
+    return decorator
+
+
+"""
+Following are the patterns of basic_shapes
+"""
+
+
+def long_body(f):
+    return (f["day"] > 0) & (f["body_ratio"] > LONG_BODY_THRESHOLD) & \
+           (f["body"] > LONG_BODY_MULTIPLIER * f.prev("body", 1))
+
+
+def long_shadow(f):
+    return (f["day"] > 0) & (f["shadow_ratio"] > LONG_SHADOW_THRESHOLD)
+
+
+def long_lower_shadow(f):
+    return long_shadow(f) & (f["upper_shadow_ratio"] < SHORT_SHADOW_THRESHOLD)
+
+
+@register_pattern("doji", 0)
+def doji(f):
+    return (f["day"] > 0) & (f["body_ratio"] < DOJI_THRESHOLD)
+
+
+@register_pattern("long_white", 1, BULLISH)
+def long_white(f):
+    return f["white"] & long_body(f)
+
+
+@register_pattern("long_black", 1, BEARISH)
+def long_black(f):
+    return f["black"] & long_body(f)
+
+
+@register_pattern("gravestone", 0, BEARISH)
+def gravestone(f):
+    return doji(f) & long_shadow(f) & (f["lower_shadow_ratio"] < SHORT_SHADOW_THRESHOLD)
+
+
+@register_pattern("hammer", 1, BULLISH)
+def hammer(f):
+    return long_lower_shadow(f) & (f["day"] > f.prev("day", 1) * HAMMER_MULTIPLIER)
+
+
+@register_pattern("hanging_man", 1, BEARISH)
+def hanging_man(f):
+    return shift(long_lower_shadow(f), 1) & (f["close"] < f.prev("body_bottom", 1))
+
+
+"""
+Following are the patterns of advanced_shapes
+"""
+
+
+@register_pattern("dark_cloud", 1, BEARISH)
+def dark_cloud(f):
+    return f.prev("white", 1) & (f.prev("day", 1) > 0) & (f.prev("body_ratio", 1) > DARK_CLOUD_PIERCING_BODY_THRES) \
+        & (f["open"] > f.prev("close", 1)) & f["black"] & (f["close"] < (f.prev("open", 1) + f.prev("close", 1)) / 2)
+
+
+@register_pattern("piercing", 1, BULLISH)
+def piercing(f):
+    return f.prev("black", 1) & (f.prev("day", 1) > 0) & (f.prev("body_ratio", 1) > DARK_CLOUD_PIERCING_BODY_THRES) \
+        & (f["open"] < f.prev("close", 1)) & f["white"] & (f["close"] > (f.prev("open", 1) + f.prev("close", 1)) / 2)
+
+
+def engulf(f):
+    return (f["body"] >= f.prev("body", 1) * ENGULF_REAL_BODY_RATIO) & (f["body"] > f.prev("day", 1)) \
+        & (f.prev("day", 1) > 0) & (f["body_ratio"] > ENGULF_SECOND_BODY_THRES) \
+        & (f["body_top"] > f.prev("body_top", 1)) & (f["body_bottom"] < f.prev("body_bottom", 1))
+
+
+@register_pattern("bullish_engulf", 1, BULLISH)
+def bullish_engulf(f):
+    return f["white"] & f.prev("black", 1) & engulf(f)
+
+
+@register_pattern("bearish_engulf", 1, BEARISH)
+def bearish_engulf(f):
+    return f["black"] & f.prev("white", 1) & engulf(f)
+
+
+def harami(f):
+    return (f.prev("body", 1) > 0) & (f.prev("body_top", 1) > f["high"]) & (f.prev("body_bottom", 1) < f["low"])
+
+
+@register_pattern("bearish_harami", 1, BEARISH)
+def bearish_harami(f):
+    return harami(f) & f.prev("black", 1)
+
+
+@register_pattern("bullish_harami", 1, BULLISH)
+def bullish_harami(f):
+    return harami(f) & f.prev("white", 1)
+
+
+@register_pattern("bearish_doji_harami", 1, BEARISH)
+def bearish_doji_harami(f):
+    return bearish_harami(f) & doji(f)
+
+
+@register_pattern("bullish_doji_harami", 1, BULLISH)
+def bullish_doji_harami(f):
+    return bullish_harami(f) & doji(f)
+
+
+@register_pattern("up_window", 1, BULLISH)
+def up_window(f):
+    return f["up_window"]
+
+
+@register_pattern("down_window", 1, BEARISH)
+def down_window(f):
+    return f["down_window"]
+
+
+def three_window(f, window):
+    # the same as is_three_window with prev_9_list being the 9 days from 10 days before to 2 days before, which is
+    # how evaluate calls it. The windows between those days are counted, and the last one is from 2 days before to today
+    count = sum(f.prev(window, days).astype(int) for days in range(2, 10))
+    return (count >= 3) | ((count == 2) & _window_from(f, window, 2))
+
+
+def _window_from(f, window, days):
+    if window == "up_window":
+        return f["low"] >= f.prev("high", days)
+    return f["high"] <= f.prev("low", days)
+
+
+@register_pattern("three_up_window", 10, BULLISH)
+def three_up_window(f):
+    return three_window(f, "up_window")
+
+
+@register_pattern("three_down_window", 10, BEARISH)
+def three_down_window(f):
+    return three_window(f, "down_window")
+
+
+@register_pattern("two_black_gapping", 2, BEARISH)
+def two_black_gapping(f):
+    return f.prev("down_window", 1) & f.prev("black", 1) & f["black"]
+
+
+@register_pattern("bearish_gapping_doji", 2, BEARISH)
+def bearish_gapping_doji(f):
+    return f["black"] & shift(doji(f), 1) & f.prev("down_window", 1)
+
+
+@register_pattern("bullish_gapping_doji", 2, BULLISH)
+def bullish_gapping_doji(f):
+    return f["white"] & shift(doji(f), 1) & f.prev("up_window", 1)
+
+
+@register_pattern("evening_star", 2, BEARISH)
+def evening_star(f):
+    # the first day is a long white compared with the star, not with the day before it
+    first_long_white = f.prev("white", 2) & (f.prev("day", 2) > 0) & \
+        (f.prev("body_ratio", 2) > LONG_BODY_THRESHOLD) & (f.prev("body", 2) > LONG_BODY_MULTIPLIER * f.prev("body", 1))
+    return first_long_white & (f.prev("body_bottom", 1) > f.prev("close", 2)) & f["black"] \
+        & (f.prev("body_bottom", 1) > f["open"])
+
+
+@register_pattern("evening_doji_star", 2, BEARISH)
+def evening_doji_star(f):
+    return evening_star(f) & shift(doji(f), 1)
+
+
+@register_pattern("morning_star", 2, BULLISH)
+def morning_star(f):
+    first_long_black = f.prev("black", 2) & (f.prev("day", 2) > 0) & \
+        (f.prev("body_ratio", 2) > LONG_BODY_THRESHOLD) & (f.prev("body", 2) > LONG_BODY_MULTIPLIER * f.prev("body", 1))
+    return first_long_black & (f.prev("body_top", 1) < f.prev("close", 2)) & f["white"] \
+        & (f.prev("body_top", 1) < f["open"])
+
+
+@register_pattern("morning_doji_star", 2, BULLISH)
+def morning_doji_star(f):
+    return morning_star(f) & shift(doji(f), 1)
+
+
+"""
+Following are the trends of trend
+"""
+
+
+@register_pattern("down_trend", 20, TREND)
+def down_trend(f):
+    return (f["close"] < f.prev("close", 5) * (1 - DOWN_AFTER_5_DAYS_THRES)) \
+        | (f["close"] < f.prev("close", 10) * (1 - DOWN_AFTER_10_DAYS_THRES)) \
+        | (f["close"] < f.prev("close", 20) * (1 - DOWN_AFTER_20_DAYS_THRES))
+
+
+@register_pattern("up_trend", 20, TREND)
+def up_trend(f):
+    return (f["close"] > f.prev("close", 5) * (1 + UP_AFTER_5_DAYS_THRES)) \
+        | (f["close"] > f.prev("close", 10) * (1 + UP_AFTER_10_DAYS_THRES)) \
+        | (f["close"] > f.prev("close", 20) * (1 + UP_AFTER_20_DAYS_THRES))
+
+
+@register_pattern("down_trend_rsi", RSI_N, TREND)
+def down_trend_rsi(f):
+    return f["rsi"] < RSI_LOWER_BOUND
+
+
+@register_pattern("up_trend_rsi", RSI_N, TREND)
+def up_trend_rsi(f):
+    return f["rsi"] > RSI_UPPER_BOUND
+
+
+def get_lookback(patterns):
+    return max(pattern.days for pattern in patterns)
+
+
+def _detect(prices, positions, patterns, days):
+    features = CandleFeatures(prices)
+    hits = np.zeros((len(positions), len(patterns), days), dtype=bool)
+    for i, pattern in enumerate(patterns):
+        # days without enough days before them are never detected, the same as the original functions never called
+        hits[:, i, :] = (pattern.detect(features) & (positions >= pattern.days))[..., -days:]
+    return hits
+
+
+def scan_arrays(data, days=1, patterns=None, processes=1, feature_cache=None):
+    """
+    Evaluate the patterns on the latest days of every symbol.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order
+    :param days: the number of latest days of each symbol to scan
+    :param patterns: the names of the registered patterns to evaluate. Default is all of them
+    :param processes: the number of processes the symbols are split between. None is to use as many processes as CPUs
+    :param feature_cache: optionally a FeatureCache to read the features from instead of computing them
+    :return: a tuple (symbols, datetimes, names, hits). datetimes is a datetime64[s] array of the days scanned with one
+    row per symbol, and NaT for the days a symbol does not have. hits is a boolean array with the shape (symbols,
+    patterns, days)
+    """
+    names = list(PATTERNS) if patterns is None else list(patterns)
+    unknown = [name for name in names if name not in PATTERNS]
+    if len(unknown) > 0:
+        raise ValueError("Unknown patterns {}! Must be some of these: {}".format(unknown, list(PATTERNS)))
+    selected = [PATTERNS[name] for name in names]
+
+    with instrumentation.span(instrumentation.SPAN_PATTERN_SCAN):
+        if feature_cache is None:
+            symbols, datetimes, prices, positions = recent_prices(data, days + get_lookback(selected))
+        else:
+            symbols, datetimes, prices, positions = recent_rows(feature_cache.get_tables(data),
+                                                                days + get_lookback(selected))
+        processes = processes or os.cpu_count() or 1
+        if processes == 1 or len(symbols) <= 1:
+            hits = _detect(prices, positions, selected, days)
+        else:
+            chunks = np.array_split(np.arange(len(symbols)), min(processes, len(symbols)))
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                hits = np.concatenate(list(executor.map(
+                    _detect, [{column: values[rows] for column, values in prices.items()} for rows in chunks],
+                    [positions[rows] for rows in chunks], [selected] * len(chunks), [days] * len(chunks))))
+    logging.info("Scanned {} patterns on the latest {} days of {} symbols".format(len(names), days, len(symbols)))
+    return symbols, datetimes[:, -days:], names, hits
+
+
+def scan(data, days=1, patterns=None, processes=1, feature_cache=None):
+    """
+    Find the patterns printed by each symbol in its latest days. See scan_arrays for the parameters.
+    :return: a dict with symbol as the key, and the value is a dict with the name of each pattern found as the key and
+    the list of datetime objects it is found on in ascending order. Symbols without any pattern found are not included.
+    """
+    symbols, datetimes, names, hits = scan_arrays(data, days, patterns, processes, feature_cache)
+    result = {}
+    for row, col in zip(*np.nonzero(hits.any(axis=2))):
+        dates = datetimes[row][hits[row, col]].astype("datetime64[s]").tolist()
+        result.setdefault(symbols[row], {})[names[col]] = dates
+    return result
+
+
+def find_symbols(hits, signal=BULLISH, trend=None):
+    """
+    Find the symbols printing any pattern giving the signal.
+    :param hits: the result of scan
+    :param signal: bullish, bearish or neutral
+    :param trend: optionally the name of a trend the symbol must also be in on the day of the pattern, e.g. down_trend
+    :return: the list of symbols in ascending order
+    """
+    result = []
+    for symbol, patterns in hits.items():
+        trend_dates = None if trend is None else set(patterns.get(trend, []))
+        for name, dates in patterns.items():
+            if PATTERNS[name].signal == signal and (trend_dates is None or not trend_dates.isdisjoint(dates)):
+                result.append(symbol)
+                break
+    return sorted(result)
@@ -0,0 +1,199 @@
+"""
+This module detects the candlestick patterns and trends of live bars as they complete. The latest bars of each symbol
+are kept in a small ring buffer, so each new bar is checked against every pattern in constant time without scanning the
+history again.
+
+    detector = StreamingPatternDetector(patterns=["hammer", "bullish_engulf", "morning_star"])
+    detector.load_history(nasdaq_data)
+    events = detector.add_snapshot(fmp.get_realtime_quote_all(), datetime=trunc_today())
+"""
+import logging
+from collections import namedtuple, deque, OrderedDict
+from inspect import signature
+from itertools import islice
+
+import sdm.constants as c
+from sdm.candlestick.pattern import basic_shapes, advanced_shapes, trend
+from sdm.candlestick.parameters import RSI_N
+from sdm.candlestick.scanner import PATTERNS, NEUTRAL
+
+# A pattern printed by the latest bar of a symbol
+PatternEvent = namedtuple("PatternEvent", ["symbol", "datetime", "pattern", "signal"])
+
+# Keys of the quotes of each provider holding the prices of a bar, in the order they are looked for
+QUOTE_KEYS = {"open": ["open"], "high": ["high", "dayHigh"], "low": ["low", "dayLow"],
+              "close": ["close", "price", "latestPrice"], "volume": ["volume"]}
+
+# Ways a detector is called by call_detector, and the number of bars needed before the bar detected on
+_CALL_TREND, _CALL_RSI, _CALL_PREV_9_LIST, _CALL_PREV_2, _CALL_PREV_1, _CALL_CURR = range(6)
+_BARS_BEFORE = {_CALL_TREND: 20, _CALL_RSI: RSI_N, _CALL_PREV_9_LIST: 10, _CALL_PREV_2: 2, _CALL_PREV_1: 1,
+                _CALL_CURR: 0}
+
+
+def get_detectors(names=None):
+    """
+    Find the original functions of the registered patterns and trends of the scanner.
+    :param names: the names of the patterns. Default is all the registered ones having an original function
+    :return: an OrderedDict with the name of each pattern as the key, and the function as the value
+    """
+    result = OrderedDict()
+    for name in (PATTERNS if names is None else names):
+        for module in [basic_shapes, advanced_shapes, trend]:
+            func = getattr(module, "is_" + name, None)
+            if func is not None:
+                result[name] = func
+                break
+        else:
+            if names is not None:
+                raise ValueError("No detector function is_{} found for pattern {}".format(name, name))
+    return result
+
+
+def get_call(func):
+    """
+    :return: the way call_detector calls the detector, found from the names of its parameters
+    """
+    params = signature(func).parameters
+    if "prev_20" in params:
+        return _CALL_TREND
+    if "prev_n_list" in params:
+        return _CALL_RSI
+    if "prev_9_list" in params:
+        return _CALL_PREV_9_LIST
+    if "prev_2" in params:
+        return _CALL_PREV_2
+    if "prev_1" in params:
+        return _CALL_PREV_1
+    return _CALL_CURR
+
+
+def call_detector(func, bars, i=None, call=None, args=()):
+    """
+    Call a detector on a bar with the bars before it that the detector takes. This is how the detectors are called
+    everywhere, e.g. by evaluate, the streaming detector and the benchmark.
+    :param func: a detector function, e.g. from get_detectors
+    :param bars: a list of the bars in ascending order of datetime
+    :param i: the index of the bar to detect on. Default is the latest bar
+    :param call: the way to call func found by get_call, so its signature is not inspected again for every bar
+    :param args: the parameters passed to func after the bars, e.g. its thresholds
+    :return: the result of func, or False if there are not enough bars before the bar
+    """
+    i = len(bars) - 1 if i is None else i
+    call = get_call(func) if call is None else call
+    if i < _BARS_BEFORE[call]:
+        return False
+    if call == _CALL_TREND:
+        return func(bars[i], bars[i - 5], bars[i - 10], bars[i - 20], *args)
+    if call == _CALL_RSI:
+        return func(bars[i], bars[i - RSI_N:i], *args)
+    if call == _CALL_PREV_9_LIST:
+        return func(bars[i], bars[i - 10:i - 1], *args)
+    if call == _CALL_PREV_2:
+        return func(bars[i], bars[i - 1], bars[i - 2], *args)
+    if call == _CALL_PREV_1:
+        return func(bars[i], bars[i - 1], *args)
+    return func(bars[i], *args)
+
+
+def quote_to_bar(quote):
+    """
+    Convert a realtime quote of any provider to a bar with open, high, low, close and volume.
+    :return: the bar as a dict, or None if any of the prices is missing
+    """
+    bar = {}
+    for key, quote_keys in QUOTE_KEYS.items():
+        bar[key] = next((quote[quote_key] for quote_key in quote_keys if quote.get(quote_key) is not None), None)
+        if bar[key] is None and key != "volume":
+            return None
+    return bar
+
+
+class StreamingPatternDetector:
+
+    def __init__(self, patterns=None, detectors=None, on_event=None):
+        """
+        Initializer
+        :param patterns: the names of the registered patterns and trends of the scanner to detect. Default is all of
+        them
+        :param detectors: optionally a dict of other detector functions by name, taking curr and prev_1, prev_2,
+        prev_9_list, or prev_5, prev_10 and prev_20, or prev_n_list, the same as the functions of the pattern modules
+        :param on_event: optionally a function called with each PatternEvent as it is detected
+        """
+        detectors = OrderedDict(get_detectors(patterns)) if detectors is None else OrderedDict(detectors)
+        if len(detectors) == 0:
+            raise ValueError("At least one pattern must be detected!")
+        self._detectors = [(name, func, get_call(func), PATTERNS[name].signal if name in PATTERNS else NEUTRAL)
+                           for name, func in detectors.items()]
+        self._bars_kept = max(_BARS_BEFORE[call] for _, _, call, _ in self._detectors) + 1
+        self._on_event = on_event
+        # symbol -> deque of (datetime, bar) of the latest bars in ascending order
+        self._buffers = {}
+
+    def get_pattern_names(self):
+        return [name for name, _, _, _ in self._detectors]
+
+    def get_latest_bars(self, symbol):
+        """
+        :return: an OrderedDict with the datetime of the latest bars of the symbol as the key, and the bar as the value
+        """
+        return OrderedDict(self._buffers.get(symbol, ()))
+
+    def load_history(self, data):
+        """
+        Fill the buffers with the latest bars of the historical data, without detecting any pattern on them.
+        :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict
+        with datetime object as the key in ascending order
+        """
+        for symbol, symbol_data in data.items():
+            latest = list(islice(reversed(symbol_data.items()), self._bars_kept))[::-1]
+            self._buffers[symbol] = deque(latest, maxlen=self._bars_kept)
+        logging.info("Latest {} bars of {} symbols have been loaded for pattern detection".format(
+            self._bars_kept, len(data)))
+
+    def add_bar(self, symbol, datetime, bar):
+        """
+        Add a completed bar of the symbol and detect the patterns it prints. A bar with the same datetime as the
+        latest one of the symbol replaces it, for a bar updated before it completes.
+        :param bar: a dict with at least open, high, low and close
+        :return: a list of PatternEvent, one for each pattern printed
+        """
+        buffer = self._buffers.get(symbol)
+        if buffer is None:
+            buffer = deque(maxlen=self._bars_kept)
+            self._buffers[symbol] = buffer
+        elif len(buffer) > 0 and datetime <= buffer[-1][0]:
+            if datetime < buffer[-1][0]:
+                raise ValueError("Bar of {} at {} is older than the latest bar at {}".format(
+                    symbol, datetime, buffer[-1][0]))
+            buffer.pop()
+        buffer.append((datetime, bar))
+
+        bars = [buffer_bar for _, buffer_bar in buffer]
+        events = []
+        for name, func, call, signal in self._detectors:
+            if call_detector(func, bars, call=call):
+                event = PatternEvent(symbol, datetime, name, signal)
+                events.append(event)
+                if self._on_event is not None:
+                    self._on_event(event)
+        return events
+
+    def add_snapshot(self, quotes, datetime=None):
+        """
+        Add a bar for every symbol from a snapshot of the market, e.g. from get_realtime_quote_all.
+        :param quotes: the realtime data used in sdm. A dict with symbol as the key, and the quote as the value
+        :param datetime: the datetime of the bars. Default is the datetime of each quote
+        :return: a list of PatternEvent of all the symbols
+        """
+        events = []
+        skipped = 0
+        for symbol, quote in quotes.items():
+            bar = quote_to_bar(quote)
+            bar_datetime = datetime or quote.get(c.DATETIME_KEY)
+            if bar is None or bar_datetime is None:
+                skipped += 1
+                continue
+            events.extend(self.add_bar(symbol, bar_datetime, bar))
+        if skipped > 0:
+            logging.warning("{} quotes without a complete bar or a datetime have been skipped".format(skipped))
+        return events
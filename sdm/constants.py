@@ -34,12 +34,58 @@ VERBOSE = False
 # Float precision to be saved in files
 FLOAT_PRECISION = 3
 
+# File name of the on-disk cache for API responses, saved in the directory given to the cache
+RESPONSE_CACHE_FILE = "response_cache.db"
+
+# Maximum total size in bytes of the compressed responses in the cache. Least recently used ones are removed first
+RESPONSE_CACHE_MAX_SIZE = 512 * 1024 * 1024
+
+# Seconds a cached symbol list stays valid
+RESPONSE_CACHE_SYMBOL_LIST_TTL = 24 * 60 * 60
+
+# Seconds a cached response stays valid if it covers recent dates that could still change
+RESPONSE_CACHE_RECENT_TTL = 60 * 60
+
+# Interval in seconds between two polls of the realtime quotes when collecting them continuously
+REALTIME_POLL_INTERVAL = 60
+
+# Lengths in minutes of the intraday bars aggregated from the realtime quotes
+INTRADAY_BAR_MINUTES = [1, 5, 15]
+
+# Number of rows read from a sql file at a time when going through it in order, and of bars saved at a time
+SQL_FETCH_SIZE = 10000
+
+# Number of latest days drawn in each chart rendered in a batch
+CHART_DAYS = 250
+
+# Maximum number of candlesticks in a chart. Longer histories are downsampled by merging consecutive days into one stick
+CHART_MAX_POINTS = 500
+
+# Maximum number of patterns marked in a chart. Only the latest ones are marked
+CHART_MAX_SHAPES = 50
+
+# Relative change of the ratio of the adjusted close to the close from one day to the next, over which a split or
+# dividend is found on the later day. Smaller changes are taken as the rounding of the prices
+ADJUSTMENT_TOLERANCE = 0.001
+
+# A corporate action whose ratio is a fraction n/m of whole numbers up to this, e.g. 1/2 for a 2 for 1 split or 4/5 for
+# a 5 for 4 split, or the ratio of whole numbers like 1/10 or 20, is taken as a split, and any other one as a dividend.
+# Only splits change the volume
+SPLIT_MAX_TERM = 8
+
+# Relative difference between the ratio of an action and its nearest split fraction, within which it is a split. The
+# prices are rounded to cents, so the ratio found from them is not exact
+SPLIT_RATIO_TOLERANCE = 0.005
+
 # ----------------------------------------------------------------------------------------------------------------
 # The following section is for some global parameters used by the program, and are not advised to be modified. Any
 # modification could cause the program to run in an unexpected behaviour
 # Date format saved in database and used elsewhere in the program for historical data, e.g. 2019-01-20
 DATE_FORMAT = "%Y-%m-%d"
 
+# Timezone of the markets. Naive datetimes in sdm are the local time of this timezone
+TIMEZONE = "America/Toronto"
+
 # Date time format saved in db or csv for real time data, e.g. 2020-02-14 13:47:00
 DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
@@ -73,8 +119,30 @@ TIMESTAMP_COLUMN = "timestamp"
 # Column name used to save stock data as json in SQL
 DATA_COLUMN = "jsondata"
 
+# Index on the timestamp column in SQL, so the data of a date range is read without scanning all the symbols
+TIMESTAMP_INDEX_NAME = "stock_data_timestamp"
+
 # File operator types supported
-FILE_TYPE = ["csv", "sql"]
+FILE_TYPE = ["csv", "partitioned_csv", "sql"]
+
+# Ways to partition a dataset saved as partitioned_csv: one file per symbol, or one file per symbol per year
+PARTITIONS = ["symbol", "symbol_year"]
+DEFAULT_PARTITION = "symbol"
+
+# Name of the file indexing the partitions of a partitioned_csv dataset
+PARTITION_MANIFEST_FILE = "manifest.json"
+
+# Suffix of the directory saving the feature tables of the symbols of a dataset, next to the dataset file
+FEATURE_CACHE_SUFFIX = ".features"
+
+# Suffix of the directory saving the feature tables of the data adjusted for splits and dividends
+ADJUSTED_FEATURE_CACHE_SUFFIX = ".adjusted.features"
+
+# Suffix of the file saving the splits and dividends of the symbols of a dataset, next to the dataset file
+ADJUSTMENT_FILE_SUFFIX = ".adjustments.json"
+
+# Key of the close price adjusted for splits and dividends in the historical data, as provided by FMP
+ADJUSTED_CLOSE_KEY = "adjClose"
 
 # Data types
 DATA_TYPES = ["historical", "realtime"]
@@ -88,6 +156,15 @@ BASE_COLUMNS = ["open", "high", "low", "close", "volume"]
 # time gap in seconds between API calls to not exceed limit. 0 if no such limit
 PAUSE_BETWEEN_API_CALLS = 0
 
+# Number of connections kept open to the API provider for reuse
+API_CONNECTION_POOL_SIZE = 10
+
+# Number of times an API call is retried when the provider is rate limiting or failing, and the seconds to wait before
+# the first retry, doubled for each of the following ones unless the provider asks for a delay with Retry-After
+API_MAX_RETRIES = 3
+API_RETRY_BACKOFF = 1
+API_RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
 # The special days that US market closed such as 9-1-1 attack, mourning for former presidents, hurricane, etc.
 US_SPECIAL_CLOSED_DAYS = [dt.datetime(2001, 9, 11), dt.datetime(2001, 9, 12), dt.datetime(2001, 9, 13),
                             dt.datetime(2001, 9, 14), dt.datetime(2004, 6, 11), dt.datetime(2007, 1, 2),
@@ -122,3 +199,6 @@ IEX_CLOUD_DATE_FORMAT = '%Y-%m-%d'
 
 # IEX Cloud batch limit
 IEX_CLOUD_BATCH_LIMIT = 100
+
+# Maximum number of IEX Cloud batch requests sent at the same time
+IEX_CLOUD_MAX_CONCURRENT_BATCHES = 8
@@ -1,28 +1,203 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
 import sdm.constants as c
-from sdm.operation.validation import validate_historical_data, validate_realtime_data
+from sdm.candlestick.feature_cache import FeatureCache
+from sdm.util import instrumentation
+from sdm.operation.adjustment import AdjustmentStore
+from sdm.operation.intraday import aggregate_quotes
+from sdm.operation.resampling import parse_frequency, get_resampled_file_name, resample_historical
+from sdm.operation.screening import screen, get_lookback_days, DEFAULT_METRICS
+from sdm.operation.validation import validate_historical_data, validate_realtime_data, \
+    validate_historical_data_parallel
 from sdm.persistence.csv_operator import CSVOperator
+from sdm.persistence.partitioned_csv_operator import PartitionedCSVOperator
 from sdm.persistence.sql_operator import SQLOperator
+from sdm.util.date_utils import trunc_date
+from sdm.util.market_utils import get_trading_calendar
 
 
 class StockDataMaster:
 
-    def __init__(self, file_path, file_type="sql", data_type="historical", response_format="json"):
+    def __init__(self, file_path, file_type="sql", data_type="historical", response_format="json",
+                 partition=c.DEFAULT_PARTITION):
         self.file_path = file_path
         self.data_type = data_type
+        self._partition = partition
         self.file_type = file_type
         self._symbol_list = None
         self._response_format = response_format
+        self._feature_caches = {}
+        self._adjustment_stores = {}
 
     def save_data(self, data, file_name, data_type=None, append=True):
         if data_type is None:
             data_type = self.data_type
-        self._file_operator.save_to_file(data, file_name, data_type, append)
+        with instrumentation.span(instrumentation.SPAN_PERSIST):
+            self._file_operator.save_to_file(data, file_name, data_type, append)
+        self._after_save(data, file_name, data_type, append)
+
+    def upsert_data(self, data, file_name, data_type=None):
+        """
+        Save the data, replacing the records saved before for the same symbol and datetime, all in one transaction.
+        Only supported by sql files.
+        """
+        if data_type is None:
+            data_type = self.data_type
+        with instrumentation.span(instrumentation.SPAN_PERSIST):
+            self._file_operator.upsert_to_file(data, file_name, data_type)
+        self._after_save(data, file_name, data_type, True)
+
+    def _after_save(self, data, file_name, data_type, append):
+        if data_type == "historical":
+            # the raw and adjusted feature tables of the symbols saved no longer cover their data
+            for adjusted in [False, True]:
+                self.get_feature_cache(file_name, adjusted).invalidate(list(data.keys()) if append else None)
+            adjustment_store = self.get_adjustment_store(file_name)
+            if not append:
+                adjustment_store.clear()
+            adjustment_store.update(data)
+        if instrumentation.is_enabled():
+            instrumentation.count(instrumentation.COUNTER_ROWS_SAVED, _count_records(data, data_type))
 
     def load_data(self, file_name, data_type=None, symbol=None, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
-                  datetime_format=c.DATETIME_FORMAT):
+                  datetime_format=c.DATETIME_FORMAT, adjusted=False):
+        """
+        Load the data saved in the file.
+        :param adjusted: whether to adjust the prices and volume of historical data for the splits and dividends found
+        when it was saved. See get_adjustment_store
+        """
         if data_type is None:
             data_type = self.data_type
-        return self._file_operator.load_from_file(file_name, data_type, symbol, start_date, end_date, datetime_format)
+        with instrumentation.span(instrumentation.SPAN_LOAD):
+            data = self._file_operator.load_from_file(file_name, data_type, symbol, start_date, end_date,
+                                                      datetime_format)
+            if adjusted and data_type == "historical" and len(data) > 0:
+                data = self.get_adjustment_store(file_name).adjust(data)
+        if instrumentation.is_enabled():
+            instrumentation.count(instrumentation.COUNTER_ROWS_LOADED, _count_records(data, data_type))
+        return data
+
+    def screen(self, file_name, date, market, metrics=None, filters=None, sort_by="return_20", ascending=False,
+               top=None):
+        """
+        Rank the symbols of the dataset on the date, loading only the open days the metrics need before it instead of
+        the whole dataset. With sql files, these days are read by the index on the timestamp. See screening.screen for
+        the details of the other parameters.
+        :param market: the market of the dataset, to find the open days before the date
+        :return: an OrderedDict in ranked order with symbol as the key, and the value is a dict of the metrics
+        """
+        needed = list(DEFAULT_METRICS if metrics is None else metrics) + list(filters or {}) + [sort_by]
+        date = trunc_date(date)
+        start_date = np.busday_offset(np.datetime64(date, "D"), -get_lookback_days(needed), roll="backward",
+                                      busdaycal=get_trading_calendar(market))
+        data = self.load_data(file_name, "historical", start_date=start_date.astype("datetime64[s]").astype(object),
+                              end_date=date)
+        return screen(data, date, metrics, filters, sort_by, ascending, top)
+
+    def load_resampled_data(self, file_name, frequency, market, symbol=None, start_date=c.EARLIEST_DATE,
+                            end_date=c.LATEST_DATE):
+        """
+        Load the data of the file resampled to another timeframe, saved as a derived dataset next to it with the same
+        file type, e.g. nasdaq_historical_weekly.db. The derived dataset is resampled again from the whole file when it
+        does not exist or the file has been saved after it.
+        :param file_name: a historical dataset for weekly or monthly bars, or a realtime dataset for minute bars
+        :param frequency: weekly, monthly, or <n>min like 5min. See sdm.operation.resampling
+        :param market: the market of the dataset, to date the weekly and monthly bars on open days
+        :return: the bars in the historical data format
+        """
+        minutes = parse_frequency(frequency)
+        resampled_file_name = get_resampled_file_name(file_name, frequency)
+        source_path = os.path.join(self.file_path, file_name)
+        resampled_path = os.path.join(self.file_path, resampled_file_name)
+        if not os.path.exists(resampled_path) or os.path.getmtime(resampled_path) < os.path.getmtime(source_path):
+            if minutes is None:
+                resampled = resample_historical(self.load_data(file_name, "historical"), frequency, market)
+                self.save_data(resampled, resampled_file_name, "historical", append=False)
+            else:
+                self.aggregate_intraday_bars(file_name, [minutes])
+        return self.load_data(resampled_file_name, "historical", symbol, start_date, end_date)
+
+    def iterate_records(self, file_name, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                        batch_size=c.SQL_FETCH_SIZE):
+        """
+        Go through the records of all the symbols in the file in ascending order of datetime. sql files are read
+        batch_size rows at a time, and the other file types are loaded first.
+        :return: a generator of tuples (symbol, datetime, record)
+        """
+        return self._file_operator.iterate_records(file_name, start_date, end_date, batch_size)
+
+    def aggregate_intraday_bars(self, file_name, minutes=c.INTRADAY_BAR_MINUTES, start_date=c.EARLIEST_DATE,
+                                end_date=c.LATEST_DATE, batch_size=c.SQL_FETCH_SIZE):
+        """
+        Aggregate the realtime quotes saved in the file into intraday bars in one pass, and save the bars of each length
+        as a historical dataset next to the file, e.g. nasdaq_realtime_5min.db, replacing the one saved before. The
+        bars are saved batch_size at a time, so the memory used does not grow with the number of quotes.
+        :param minutes: the lengths of the bars in minutes
+        :return: a dict with the length of the bars as the key, and the file name of their dataset as the value
+        """
+        file_names = {length: get_resampled_file_name(file_name, "{}min".format(length)) for length in minutes}
+        buffers = {length: {} for length in minutes}
+        counts = dict.fromkeys(minutes, 0)
+        appending = dict.fromkeys(minutes, False)
+
+        def save(length):
+            self.save_data(buffers[length], file_names[length], "historical", append=appending[length])
+            buffers[length].clear()
+            counts[length] = 0
+            appending[length] = True
+
+        for length, symbol, datetime, bar in aggregate_quotes(
+                self.iterate_records(file_name, start_date, end_date, batch_size), minutes):
+            buffers[length].setdefault(symbol, OrderedDict())[datetime] = bar
+            counts[length] += 1
+            if counts[length] >= batch_size:
+                save(length)
+        for length in minutes:
+            if counts[length] > 0 or not appending[length]:
+                save(length)
+        return file_names
+
+    def get_feature_cache(self, file_name, adjusted=False):
+        """
+        :param adjusted: whether the tables are of the data loaded with adjusted=True, kept in a separate directory
+        from the tables of the raw data. If the splits and dividends of a symbol are updated outside of save_data, its
+        adjusted tables must be invalidated
+        :return: the FeatureCache keeping the feature tables of the symbols of the dataset, next to the dataset file
+        """
+        suffix = c.ADJUSTED_FEATURE_CACHE_SUFFIX if adjusted else c.FEATURE_CACHE_SUFFIX
+        directory = os.path.join(self.file_path, file_name + suffix)
+        if directory not in self._feature_caches:
+            self._feature_caches[directory] = FeatureCache(directory)
+        return self._feature_caches[directory]
+
+    def get_adjustment_store(self, file_name):
+        """
+        :return: the AdjustmentStore keeping the splits and dividends of the symbols of the dataset, found from the
+        adjusted close of the historical data saved to it, in a file next to the dataset file
+        """
+        file_path = os.path.join(self.file_path, file_name + c.ADJUSTMENT_FILE_SUFFIX)
+        if file_path not in self._adjustment_stores:
+            self._adjustment_stores[file_path] = AdjustmentStore(file_path)
+        return self._adjustment_stores[file_path]
+
+    def copy(self):
+        """
+        :return: a new StockDataMaster on the same files with its own file operator, so a connection kept open by one of
+        them, e.g. in another thread, is not closed by the loads and saves of the other
+        """
+        return StockDataMaster(self.file_path, self.file_type, self.data_type, self._response_format, self._partition)
+
+    def open_connection(self, file_name):
+        """
+        Keep the file open so repeated saves and loads on it reuse the same handle. Only SQLite keeps a handle open.
+        """
+        self._file_operator.open_connection(file_name)
+
+    def close_connection(self):
+        self._file_operator.close_connection()
 
     def validate_data(self, data, market, data_type=None, validation_level=2):
         if data_type is None:
@@ -36,6 +211,13 @@ class StockDataMaster:
         elif data_type == "realtime":
             return validate_realtime_data(data, validation_level)
 
+    def validate_data_with_report(self, data, market, validation_level=2, processes=None, clean_method=None):
+        """
+        Validate historical data using a pool of processes, and return a summary of the violations found instead of
+        only True/False. See validate_historical_data_parallel for the details.
+        """
+        return validate_historical_data_parallel(data, market, validation_level, processes, clean_method)
+
     def get_symbol_list(self, file_name=None):
         if self._symbol_list is None and file_name is None:
             raise ValueError("Symbol list is empty. Must load it from a file first! Please specify the file name.")
@@ -72,5 +254,13 @@ class StockDataMaster:
         self._file_type = file_type.lower()
         if self._file_type == "csv":
             self._file_operator = CSVOperator(self.file_path)
+        elif self._file_type == "partitioned_csv":
+            self._file_operator = PartitionedCSVOperator(self.file_path, self._partition)
         elif self._file_type == "sql":
             self._file_operator = SQLOperator(self.file_path)
+
+
+def _count_records(data, data_type):
+    if data_type == "historical":
+        return sum(len(symbol_data) for symbol_data in data.values())
+    return len(data)
@@ -1,7 +1,8 @@
 import logging
 
-from sdm.util.market_utils import CATradingCalendar, shift_open_days
-import sdm.constants as c
+import numpy as np
+
+from sdm.util.market_utils import find_missing_dates, get_trading_calendar
 
 # E-ratio calculation
 DEFAULT_ATR_DAYS = 14
@@ -31,23 +32,24 @@ def mae(curr, next_n_list):
     return max(curr["close"] - price["low"] if price["low"] < curr["close"] else 0 for price in next_n_list)
 
 
-def average_e_ratio(market_data, func, E_RATIO_N, ATR_N=DEFAULT_ATR_DAYS):
+def _has_closed_day(symbol_prices, calendar):
+    dates = np.array(list(symbol_prices.keys()), dtype="datetime64[D]")
+    return not np.all(np.is_busday(dates, busdaycal=calendar))
+
+
+def average_e_ratio(market_data, func, E_RATIO_N, ATR_N=DEFAULT_ATR_DAYS, market="tsx"):
     # func must be a function that takes the current price and cumulative prices as input, and retunr a boolean to
     # decide whether to buy or not
     mfe_list = []
     mae_list = []
     skipped_count = 0
-    holidays = CATradingCalendar().holidays(c.EARLIEST_DATE, c.LATEST_DATE)
+    # Symbols with a missing open day or data on a closed day are skipped
+    symbols_with_gap = set(find_missing_dates(market_data, market).keys())
+    calendar = get_trading_calendar(market)
     for symbol, symbol_prices in market_data.items():
         daily_price_list = list(symbol_prices.values())
-        dates_list = list(symbol_prices.keys())
-        date_gap = False
-        for i in range(len(dates_list) - 1):
-            if shift_open_days(dates_list[i], 1, "tsx", holidays) != dates_list[i + 1]:
-                skipped_count += 1
-                date_gap = True
-                break
-        if date_gap:
+        if symbol in symbols_with_gap or _has_closed_day(symbol_prices, calendar):
+            skipped_count += 1
             continue
         if len(daily_price_list) <= E_RATIO_N + ATR_N + 1:
             continue
@@ -0,0 +1,259 @@
+"""
+This module adjusts the historical prices for splits and dividends. The corporate actions are found where the ratio of
+the adjusted close given by the provider (adjClose of FMP) to the close changes from one day to the next, and are saved
+per symbol in a json file next to the dataset. The raw prices are kept as they are in the dataset, and the cumulative
+factors of the actions are applied to them when loaded, so a new action only changes the actions of its own symbol
+instead of every price saved before it.
+
+The ratio of an action is the factor applied to the prices of the days before it, e.g. 0.5 for a 2 for 1 split, and
+the volume of those days is divided by the ratio of the splits. An action is a split when its ratio is a simple
+fraction like 1/2, 4/5 or 1/10 (see find_split_fraction), and a dividend otherwise.
+
+    store = sdm.get_adjustment_store("nasdaq_historical.db")
+    store.update(fmp.get_daily_historical_per_symbol("AAPL"))
+    data = store.adjust(sdm.load_data("nasdaq_historical.db"))
+"""
+import json
+import logging
+import os
+from collections import namedtuple, OrderedDict
+from fractions import Fraction
+from itertools import islice
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.util.columnar import historical_to_columns, datetimes_to_datetime64, DATETIME_UNIT
+from sdm.util.date_utils import date_to_string, string_to_date
+from sdm.util.io_utils import write_atomically
+
+ACTION_SPLIT = "split"
+ACTION_DIVIDEND = "dividend"
+
+# A split or dividend of a symbol, taking effect on the datetime
+Action = namedtuple("Action", ["datetime", "ratio", "kind"])
+
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+
+def find_factors(symbol_data, adjusted_close_key=c.ADJUSTED_CLOSE_KEY):
+    """
+    :param symbol_data: an OrderedDict with datetime object as the key in ascending order, and the value is the stock
+    data of the date with the close and the adjusted close
+    :return: a tuple (datetimes, factors). datetimes is a datetime64[s] array of the days with both the close and the
+    adjusted close, and factors is a float array of the ratio of the adjusted close to the close on each of them
+    """
+    columns = historical_to_columns(symbol_data, ["close", adjusted_close_key])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = columns[adjusted_close_key] / columns["close"]
+    valid = np.isfinite(factors) & (factors > 0)
+    return columns[c.DATETIME_KEY][valid], factors[valid]
+
+
+def _find_actions(datetimes, factors, tolerance):
+    ratios = factors[:-1] / factors[1:]
+    return [_make_action(datetimes[i + 1].tolist(), float(ratios[i]))
+            for i in np.flatnonzero(np.abs(ratios - 1) > tolerance)]
+
+
+def derive_actions(symbol_data, adjusted_close_key=c.ADJUSTED_CLOSE_KEY, tolerance=c.ADJUSTMENT_TOLERANCE):
+    """
+    Find the splits and dividends of one symbol from its adjusted close.
+    :param symbol_data: an OrderedDict with datetime object as the key in ascending order, and the value is the stock
+    data of the date with the close and the adjusted close
+    :param adjusted_close_key: the key of the adjusted close in the stock data
+    :param tolerance: the relative change of the ratio of the adjusted close to the close, over which an action is found
+    :return: a tuple (actions, start, end). actions is a list of Action in ascending order, found between start and end,
+    the first and last datetime with both the close and the adjusted close. start and end are None if there is none
+    """
+    datetimes, factors = find_factors(symbol_data, adjusted_close_key)
+    if len(datetimes) == 0:
+        return [], None, None
+    return _find_actions(datetimes, factors, tolerance), datetimes[0].tolist(), datetimes[-1].tolist()
+
+
+def find_split_fraction(ratio, max_term=c.SPLIT_MAX_TERM, tolerance=c.SPLIT_RATIO_TOLERANCE):
+    """
+    Match the ratio of an action to the ratio of a split, e.g. 0.8 to a 5 for 4 split.
+    :param ratio: the factor applied to the prices of the days before the action
+    :return: the Fraction of the split, or None if the ratio is not the one of a split
+    """
+    # match the ratio above 1 so the reverse splits are found the same way, e.g. 20 for a 1 for 20 split
+    inverted = ratio < 1
+    fraction = Fraction(1 / ratio if inverted else ratio).limit_denominator(max_term)
+    if fraction == 1 or (fraction.denominator > 1 and fraction.numerator > max_term) or \
+            abs(float(fraction) * (ratio if inverted else 1 / ratio) - 1) > tolerance:
+        return None
+    return 1 / fraction if inverted else fraction
+
+
+def _make_action(datetime, ratio):
+    fraction = find_split_fraction(ratio)
+    if fraction is None:
+        return Action(datetime, round(ratio, 6), ACTION_DIVIDEND)
+    # the exact ratio of the split, instead of the one of the rounded prices
+    return Action(datetime, round(float(fraction), 6), ACTION_SPLIT)
+
+
+class AdjustmentStore:
+
+    def __init__(self, file_path):
+        """
+        Initializer. The file is read when first needed.
+        :param file_path: the json file saving the actions of the symbols
+        """
+        self._file_path = file_path
+        self._actions = None
+        # symbol -> (datetime, factor) of the latest day seen with both the close and the adjusted close
+        self._latest = None
+        # symbol -> (datetimes of the actions, price factor and volume factor of the days before each action)
+        self._factors = {}
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def get_actions(self, symbol):
+        """
+        :return: the list of Action of the symbol in ascending order
+        """
+        return list(self._load().get(symbol, []))
+
+    def update(self, data, adjusted_close_key=c.ADJUSTED_CLOSE_KEY, tolerance=c.ADJUSTMENT_TOLERANCE):
+        """
+        Find the actions of each symbol of the data, replacing the saved ones in the date range of its data. The actions
+        of the other symbols, and the ones outside of that range, are kept. The ratio of the adjusted close to the close
+        on the latest day seen of each symbol is kept as well, so new data starting after that day, e.g. only the day
+        appended, finds an action on its first day by comparing with it.
+        :param data: the historical data used in sdm, with the adjusted close in the stock data
+        :return: the list of symbols whose actions have changed
+        """
+        actions = self._load()
+        changed = []
+        latest_changed = False
+        for symbol, symbol_data in data.items():
+            if adjusted_close_key not in next(reversed(symbol_data.values()), {}):
+                continue
+            datetimes, factors = find_factors(symbol_data, adjusted_close_key)
+            if len(datetimes) == 0:
+                continue
+            start, end = datetimes[0].tolist(), datetimes[-1].tolist()
+            latest = self._latest.get(symbol)
+            if latest is not None and latest[0] < start:
+                datetimes = np.concatenate([np.array([latest[0]], dtype=DATETIME_UNIT), datetimes])
+                factors = np.concatenate([[latest[1]], factors])
+                start = latest[0]
+            if latest is None or latest[0] <= end:
+                self._latest[symbol] = (end, float(factors[-1]))
+                latest_changed = True
+
+            found = _find_actions(datetimes, factors, tolerance)
+            # an action on the first day cannot be found from this data, so the saved one is kept
+            kept = [action for action in actions.get(symbol, []) if not start < action.datetime <= end]
+            updated = sorted(kept + found)
+            if updated != actions.get(symbol, []):
+                actions[symbol] = updated
+                self._factors.pop(symbol, None)
+                changed.append(symbol)
+        if len(changed) > 0 or latest_changed:
+            self._save()
+        if len(changed) > 0:
+            logging.info("Splits and dividends of {} symbols have been updated in {}".format(len(changed),
+                                                                                            self._file_path))
+        return changed
+
+    def clear(self):
+        """
+        Remove the actions of all the symbols.
+        """
+        self._actions = {}
+        self._latest = {}
+        self._factors.clear()
+        if os.path.isfile(self._file_path):
+            os.remove(self._file_path)
+
+    def get_factors(self, symbol, datetimes):
+        """
+        :param datetimes: a numpy datetime64 array
+        :return: a tuple (price_factors, volume_factors), the float arrays of the factors applied on each datetime
+        """
+        action_datetimes, price_factors, volume_factors = self._get_cumulative_factors(symbol)
+        positions = np.searchsorted(action_datetimes, datetimes.astype(DATETIME_UNIT), side="right")
+        return price_factors[positions], volume_factors[positions]
+
+    def adjust_columns(self, symbol, columns):
+        """
+        :param columns: the data of the symbol in the columnar format of sdm.util.columnar
+        :return: a new dict of the columns with the prices and volume adjusted
+        """
+        price_factors, volume_factors = self.get_factors(symbol, columns[c.DATETIME_KEY])
+        result = dict(columns)
+        for column in PRICE_COLUMNS:
+            if column in result:
+                result[column] = result[column] * price_factors
+        if "volume" in result:
+            result["volume"] = result["volume"] * volume_factors
+        return result
+
+    def adjust(self, data):
+        """
+        Adjust the prices and volume of the historical data. Only the days before the latest action of each symbol are
+        changed.
+        :param data: the historical data used in sdm. It is not changed
+        :return: a copy of the data with the prices and volume adjusted
+        """
+        result = {}
+        adjusted = 0
+        for symbol, symbol_data in data.items():
+            result[symbol] = OrderedDict((datetime, dict(record)) for datetime, record in symbol_data.items())
+            action_datetimes = self._get_cumulative_factors(symbol)[0]
+            if len(action_datetimes) == 0 or len(symbol_data) == 0:
+                continue
+            datetimes = datetimes_to_datetime64(list(symbol_data.keys()))
+            count = np.searchsorted(datetimes, action_datetimes[-1], side="left")
+            price_factors, volume_factors = self.get_factors(symbol, datetimes[:count])
+            for record, price_factor, volume_factor in zip(islice(result[symbol].values(), count),
+                                                           price_factors.tolist(), volume_factors.tolist()):
+                for column in PRICE_COLUMNS:
+                    if record.get(column) is not None:
+                        record[column] = record[column] * price_factor
+                if record.get("volume") is not None:
+                    record["volume"] = record["volume"] * volume_factor
+            adjusted += count
+        logging.info("{} records have been adjusted for splits and dividends".format(adjusted))
+        return result
+
+    def _get_cumulative_factors(self, symbol):
+        factors = self._factors.get(symbol)
+        if factors is None:
+            actions = self._load().get(symbol, [])
+            ratios = np.array([action.ratio for action in actions])
+            split_ratios = np.array([action.ratio if action.kind == ACTION_SPLIT else 1 for action in actions])
+            # the factor of a day is the product of the ratios of all the actions after it
+            price_factors = np.append(np.cumprod(ratios[::-1])[::-1], 1)
+            volume_factors = 1 / np.append(np.cumprod(split_ratios[::-1])[::-1], 1)
+            factors = (np.array([action.datetime for action in actions], dtype=DATETIME_UNIT), price_factors,
+                       volume_factors)
+            self._factors[symbol] = factors
+        return factors
+
+    def _load(self):
+        if self._actions is None:
+            self._actions = {}
+            self._latest = {}
+            if os.path.isfile(self._file_path):
+                with open(self._file_path, "r") as f:
+                    saved = json.load(f)
+                self._actions = {symbol: [Action(string_to_date(date), ratio, kind) for date, ratio, kind in actions]
+                                 for symbol, actions in saved["actions"].items()}
+                self._latest = {symbol: (string_to_date(date), factor)
+                                for symbol, (date, factor) in saved["latest"].items()}
+        return self._actions
+
+    def _save(self):
+        saved = {"actions": {symbol: [[date_to_string(action.datetime), action.ratio, action.kind]
+                                      for action in actions]
+                             for symbol, actions in sorted(self._actions.items()) if len(actions) > 0},
+                 "latest": {symbol: [date_to_string(date), factor] for symbol, (date, factor) in
+                            sorted(self._latest.items())}}
+        write_atomically(self._file_path, lambda f: json.dump(saved, f, indent=1))
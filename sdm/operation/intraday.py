@@ -0,0 +1,105 @@
+"""
+This module aggregates the realtime quotes into intraday bars as they come, in one pass over the quotes in ascending
+order of datetime. Only the bar still open of each symbol is kept, so the memory used does not grow with the number of
+quotes. The volume of the quotes is the total of the day so far, so each quote adds the change of it since the
+previous quote of the same day to its bar, and the first quote of the day adds the total so far.
+
+    for minutes, symbol, datetime, bar in aggregate_quotes(sdm.iterate_records("nasdaq_realtime.db"), [1, 5, 15]):
+        ...
+"""
+import datetime as dt
+
+import sdm.constants as c
+from sdm.util.columnar import EPOCH
+
+# Keys of the last price in the realtime quotes of each provider, in the order they are looked for
+SNAPSHOT_PRICE_KEYS = ["price", "latestPrice", "close"]
+
+
+class IntradayBarAggregator:
+
+    def __init__(self, minutes=1):
+        """
+        Initializer
+        :param minutes: the length of each bar in minutes
+        """
+        if not isinstance(minutes, int) or minutes <= 0:
+            raise ValueError("The length of the bars must be a positive number of minutes but given {}".format(minutes))
+        self._length = dt.timedelta(minutes=minutes)
+        # symbol -> [start datetime, bar] of the bar still open
+        self._bars = {}
+        # symbol -> (date, volume) of the latest quote with a volume
+        self._volumes = {}
+
+    @property
+    def minutes(self):
+        return self._length // dt.timedelta(minutes=1)
+
+    def add_quote(self, symbol, datetime, quote):
+        """
+        Add a quote of the symbol to its bar.
+        :return: a tuple (symbol, datetime, bar) of the bar completed by this quote, or None if the quote is in the same
+        bar as the previous one or has no price
+        """
+        price = next((quote[key] for key in SNAPSHOT_PRICE_KEYS if quote.get(key) is not None), None)
+        if price is None:
+            return None
+        start = EPOCH + (datetime - EPOCH) // self._length * self._length
+        current = self._bars.get(symbol)
+        if current is not None and start < current[0]:
+            raise ValueError("Quote of {} at {} is older than its bar at {}".format(symbol, datetime, current[0]))
+        volume = self._get_volume_change(symbol, datetime, quote.get("volume"))
+
+        completed = None
+        if current is not None and start != current[0]:
+            completed = (symbol, current[0], current[1])
+            current = None
+        if current is None:
+            self._bars[symbol] = [start, {"open": price, "high": price, "low": price, "close": price, "volume": volume}]
+        else:
+            bar = current[1]
+            bar["high"] = max(bar["high"], price)
+            bar["low"] = min(bar["low"], price)
+            bar["close"] = price
+            bar["volume"] += volume
+        return completed
+
+    def flush(self):
+        """
+        Complete the bars still open of all the symbols.
+        :return: a list of tuples (symbol, datetime, bar)
+        """
+        bars = [(symbol, start, bar) for symbol, (start, bar) in self._bars.items()]
+        self._bars.clear()
+        return bars
+
+    def _get_volume_change(self, symbol, datetime, volume):
+        if volume is None:
+            return 0
+        date = datetime.date()
+        previous = self._volumes.get(symbol)
+        self._volumes[symbol] = (date, volume)
+        if previous is None or previous[0] != date:
+            return volume
+        # the total of the day never goes down, unless the provider corrects it
+        return max(volume - previous[1], 0)
+
+
+def aggregate_quotes(records, minutes=c.INTRADAY_BAR_MINUTES):
+    """
+    Aggregate the quotes into bars of each length at once, in one pass over them.
+    :param records: the quotes in ascending order of datetime as tuples (symbol, datetime, quote), e.g. from
+    StockDataMaster.iterate_records on a realtime dataset
+    :param minutes: the lengths of the bars in minutes
+    :return: a generator of tuples (minutes, symbol, datetime, bar) of each bar as it completes, and of the bars still
+    open after the last quote
+    """
+    aggregators = [IntradayBarAggregator(length) for length in minutes]
+    for symbol, datetime, quote in records:
+        for aggregator in aggregators:
+            completed = aggregator.add_quote(symbol, datetime, quote)
+            if completed is not None:
+                yield (aggregator.minutes,) + completed
+    for aggregator in aggregators:
+        for completed in aggregator.flush():
+            yield (aggregator.minutes,) + completed
@@ -0,0 +1,111 @@
+"""
+This module collects the realtime quotes of a market continuously and saves them to a file
+"""
+import logging
+import threading
+import time
+
+import sdm.constants as c
+from sdm.util.market_utils import is_open_now
+
+
+class RealtimeCollector:
+
+    def __init__(self, api, stock_data_master, file_name, poll_interval=c.REALTIME_POLL_INTERVAL,
+                 only_when_open=True):
+        """
+        Initializer
+        :param api: the API object (e.g. FMPAPI or IEXCloudAPI) to poll the realtime quotes from
+        :param stock_data_master: the StockDataMaster of the file. The quotes are saved through a copy of it owning its
+        own connection, so the loads and saves of other files on it do not change the file the quotes are saved to
+        :param file_name: the file to save the realtime quotes to
+        :param poll_interval: seconds between the start of two polls
+        :param only_when_open: if True, the quotes will only be polled when the market is open
+        """
+        if poll_interval <= 0:
+            raise ValueError("Poll interval must be a positive number but given {}".format(poll_interval))
+        self._api = api
+        self._sdm = stock_data_master.copy()
+        self._file_name = file_name
+        self._poll_interval = poll_interval
+        self._only_when_open = only_when_open
+        self._latest_snapshot = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def get_latest_snapshot(self):
+        """
+        :return: the latest realtime quotes as a dict with symbol as the key, and the quote data dict as the value
+        """
+        with self._lock:
+            return self._latest_snapshot
+
+    def poll_once(self):
+        """
+        Poll the realtime quotes for all symbols once, and save only the quotes that changed since the previous poll.
+        :return: a dict of the changed quotes with symbol as the key
+        """
+        snapshot = self._api.get_realtime_quote_all()
+        changed = self.diff_snapshots(self._latest_snapshot, snapshot)
+        with self._lock:
+            self._latest_snapshot = snapshot
+        if len(changed) > 0:
+            # The file operators remove keys from the records they save, so we save a copy of the quotes instead
+            self._sdm.save_data({symbol: dict(quote) for symbol, quote in changed.items()}, self._file_name,
+                                data_type="realtime")
+        logging.info("Polled {} realtime quotes, {} of them changed".format(len(snapshot), len(changed)))
+        return changed
+
+    def run(self, max_polls=None):
+        """
+        Keep polling the realtime quotes until stop() is called, or max_polls polls have been made.
+        :param max_polls: the maximum number of polls to make. None to poll until stopped
+        """
+        self._stop_event.clear()
+        self._sdm.open_connection(self._file_name)
+        polls = 0
+        try:
+            while not self._stop_event.is_set() and (max_polls is None or polls < max_polls):
+                start = time.time()
+                if not self._only_when_open or is_open_now(self._api.get_market()):
+                    try:
+                        self.poll_once()
+                    except Exception:
+                        logging.exception("Failed to poll the realtime quotes. Will retry in the next poll.")
+                    polls += 1
+                if max_polls is None or polls < max_polls:
+                    self._stop_event.wait(max(0, self._poll_interval - (time.time() - start)))
+        finally:
+            self._sdm.close_connection()
+
+    def start(self, max_polls=None):
+        """
+        Start polling the realtime quotes in a background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            raise ValueError("The realtime collector is already running!")
+        self._thread = threading.Thread(target=self.run, args=(max_polls,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @staticmethod
+    def diff_snapshots(previous, current):
+        """
+        Find the quotes that are new or changed between two snapshots. The datetime of the quote is not compared.
+        :param previous: the previous snapshot as a dict with symbol as the key
+        :param current: the current snapshot as a dict with symbol as the key
+        :return: a dict of the quotes in the current snapshot that are different from the previous one
+        """
+        changed = {}
+        for symbol, quote in current.items():
+            previous_quote = previous.get(symbol)
+            if previous_quote is None or any(value != previous_quote.get(key) for key, value in quote.items()
+                                             if key != c.DATETIME_KEY):
+                changed[symbol] = quote
+        return changed
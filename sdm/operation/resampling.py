@@ -0,0 +1,114 @@
+"""
+This module resamples the daily bars to weekly or monthly bars, so the candlestick detectors and the metrics can run on
+other timeframes. The bars are grouped by the calendar week (Monday to Sunday) or month of each day, and aggregated on
+whole columns at once: the open of the first day, the highest high, the lowest low, the close of the last day and the
+total volume. The minute bars of the realtime quotes are aggregated by sdm.operation.intraday.
+
+A weekly or monthly bar is dated on the first open day of its period in the market calendar, so the bars of all the
+symbols line up even if some of them miss that day.
+
+    weekly = resample_historical(nasdaq_data, "weekly", "nasdaq")
+"""
+import logging
+import os
+import re
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.util.columnar import historical_to_columns, columns_to_historical, DATETIME_UNIT
+from sdm.util.market_utils import get_trading_calendar
+
+# Frequencies the daily bars are resampled to. Minute bars of the realtime quotes are named like 1min or 5min
+FREQUENCIES = ["weekly", "monthly"]
+
+_MINUTES_PATTERN = re.compile(r"^([1-9][0-9]*)min$")
+
+
+def parse_frequency(frequency):
+    """
+    :return: the number of minutes of a minute frequency like 5min, or None for weekly and monthly
+    """
+    if frequency in FREQUENCIES:
+        return None
+    match = _MINUTES_PATTERN.match(frequency)
+    if match is None:
+        raise ValueError("Unknown frequency {}! Must be one of {} or <n>min like 5min".format(frequency, FREQUENCIES))
+    return int(match.group(1))
+
+
+def get_resampled_file_name(file_name, frequency):
+    """
+    :return: the file name of the resampled dataset, e.g. nasdaq_historical_weekly.db for nasdaq_historical.db
+    """
+    root, extension = os.path.splitext(file_name)
+    return "{}_{}{}".format(root, frequency, extension)
+
+
+def _aggregate(columns, keys):
+    # the data is in ascending order, so each group starts where its key changes
+    length = len(keys)
+    if length == 0:
+        return {name: values[:0] for name, values in columns.items()}, np.array([], dtype=int)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], length] - 1
+    # the missing volumes are left out of the total, which is only missing if the whole group is missing
+    missing = np.isnan(columns["volume"])
+    volume = np.add.reduceat(np.where(missing, 0, columns["volume"]), starts)
+    volume[np.logical_and.reduceat(missing, starts)] = np.nan
+    result = {"open": columns["open"][starts],
+              "high": np.maximum.reduceat(columns["high"], starts),
+              "low": np.minimum.reduceat(columns["low"], starts),
+              "close": columns["close"][ends],
+              "volume": volume}
+    # other columns, such as the adjusted close, take the value of the last day
+    for name in columns:
+        if name not in result and name != c.DATETIME_KEY:
+            result[name] = columns[name][ends]
+    return result, starts
+
+
+def resample_columns(columns, frequency, market):
+    """
+    Resample the daily bars of one symbol to weekly or monthly bars.
+    :param columns: the daily data of one symbol in the columnar format of sdm.util.columnar
+    :param frequency: weekly or monthly
+    :param market: 'nyse', 'nasdaq', or 'tsx', to date each bar on the first open day of its period
+    :return: the bars in the same columnar format
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError("Unknown frequency {}! Must be one of these: {}".format(frequency, FREQUENCIES))
+    days = columns[c.DATETIME_KEY].astype("datetime64[D]")
+    if frequency == "weekly":
+        # day 0 of numpy is Thursday 1970-01-01, so counting the days from 3 days before makes the weeks start on Monday
+        keys = (days.astype(np.int64) + 3) // 7
+        period_starts = (keys * 7 - 3).astype("datetime64[D]")
+    else:
+        keys = days.astype("datetime64[M]")
+        period_starts = keys.astype("datetime64[D]")
+    result, starts = _aggregate(columns, keys)
+    first_open_days = np.busday_offset(period_starts[starts], 0, roll="forward", busdaycal=get_trading_calendar(market))
+    # a period without any open day in the calendar keeps its first day with data
+    result[c.DATETIME_KEY] = np.minimum(first_open_days, days[starts]).astype(DATETIME_UNIT)
+    return result
+
+
+def resample_historical(data, frequency, market):
+    """
+    Resample the daily bars of every symbol to weekly or monthly bars.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order
+    :return: the resampled bars in the same format
+    """
+    result = {}
+    for symbol, symbol_data in data.items():
+        # the adjusted close is kept so the splits and dividends can still be found from the resampled bars
+        last_record = next(reversed(symbol_data.values()), {})
+        columns = c.BASE_COLUMNS + ([c.ADJUSTED_CLOSE_KEY] if c.ADJUSTED_CLOSE_KEY in last_record else [])
+        resampled = resample_columns(historical_to_columns(symbol_data, columns), frequency, market)
+        result[symbol] = columns_to_historical(resampled)
+        # a bar without any volume keeps it missing as in the daily bars
+        for datetime in resampled[c.DATETIME_KEY][np.isnan(resampled["volume"])].tolist():
+            result[symbol][datetime]["volume"] = None
+    logging.info("Daily bars of {} symbols have been resampled to {} bars".format(len(data), frequency))
+    return result
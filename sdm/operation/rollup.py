@@ -0,0 +1,103 @@
+"""
+This module rolls the realtime quotes collected over a day into a daily bar per symbol at the close of the market, so
+the historical data and the simulation are kept up to date without downloading the end of day prices of the whole
+market. A daily bar opens at the open of the day given by the quotes, has the highest and lowest prices of the day given
+by the quotes or seen in them, closes at the last price, and has the last total volume of the day.
+
+    collector = RealtimeCollector(fmp, sdm, "nasdaq_realtime.db")
+    collector.start()
+    # ... after the market closes
+    collector.stop()
+    bars = close_day(sdm, "nasdaq_realtime.db", "nasdaq_historical.db", "nasdaq", market=market)
+"""
+import datetime as dt
+import logging
+from collections import OrderedDict
+
+import sdm.constants as c
+from sdm.operation.intraday import SNAPSHOT_PRICE_KEYS
+from sdm.operation.validation import find_symbol_violations
+from sdm.util.date_utils import trunc_date, trunc_today
+from sdm.util.market_utils import is_open_day, is_after_market_close_now
+
+# Keys of the open, high and low of the day in the realtime quotes of each provider, in the order they are looked for
+DAY_OPEN_KEYS = ["open"]
+DAY_HIGH_KEYS = ["high", "dayHigh"]
+DAY_LOW_KEYS = ["low", "dayLow"]
+
+
+def _first_value(quote, keys):
+    return next((quote[key] for key in keys if quote.get(key) is not None), None)
+
+
+def rollup_quotes(records):
+    """
+    Roll the realtime quotes of one day into a daily bar per symbol.
+    :param records: the quotes of the day in ascending order of datetime as tuples (symbol, datetime, quote), e.g. from
+    StockDataMaster.iterate_records on a realtime dataset
+    :return: a dict with symbol as the key, and the daily bar with open, high, low, close and volume as the value.
+    Symbols without any price are skipped
+    """
+    bars = {}
+    for symbol, _, quote in records:
+        price = _first_value(quote, SNAPSHOT_PRICE_KEYS)
+        if price is None:
+            continue
+        high = max(price, _first_value(quote, DAY_HIGH_KEYS) or price)
+        low = min(price, _first_value(quote, DAY_LOW_KEYS) or price)
+        bar = bars.get(symbol)
+        if bar is None:
+            bars[symbol] = {"open": _first_value(quote, DAY_OPEN_KEYS) or price, "high": high, "low": low,
+                            "close": price, "volume": quote.get("volume")}
+            continue
+        bar["high"] = max(bar["high"], high)
+        bar["low"] = min(bar["low"], low)
+        bar["close"] = price
+        if quote.get("volume") is not None:
+            bar["volume"] = quote["volume"]
+    return bars
+
+
+def close_day(stock_data_master, realtime_file_name, historical_file_name, market_type, date=None, market=None,
+              validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL, force=False):
+    """
+    Roll the realtime quotes of the day into daily bars, validate them, and save them to the historical data replacing
+    any bar saved before for the day, all in one transaction. Symbols whose bar breaks a validation rule are skipped.
+    :param stock_data_master: the StockDataMaster of the files, with the sql file type
+    :param realtime_file_name: the file the realtime quotes of the day are saved in, e.g. by RealtimeCollector
+    :param historical_file_name: the file of the historical data
+    :param market_type: 'nyse', 'nasdaq', or 'tsx'
+    :param date: the day to roll up. Default is today
+    :param market: optionally the simulation.market.Market on the day, to forward one day with the bars
+    :param validation_level: the data validation level of the bars from 0 to 2
+    :param force: roll up today even if the market has not closed yet
+    :return: a dict with symbol as the key, and the daily bar saved as the value
+    """
+    # only sql files can replace the bars saved before, so the other file types fail before the quotes are read
+    if stock_data_master.file_type != "sql":
+        raise ValueError("The daily bars can only be saved to sql files but the file type is {}!".format(
+            stock_data_master.file_type))
+    date = trunc_today() if date is None else trunc_date(date)
+    if not is_open_day(date, market_type):
+        raise ValueError("Market {} is not open on {}!".format(market_type, date))
+    if date == trunc_today() and not force and not is_after_market_close_now(market_type):
+        raise ValueError("Market {} has not closed yet today!".format(market_type))
+    if market is not None and trunc_date(market.get_current_day()) != date:
+        raise ValueError("The market is on {}, not on the day rolled up {}!".format(market.get_current_day(), date))
+
+    records = stock_data_master.iterate_records(realtime_file_name, date, date + dt.timedelta(days=1, seconds=-1))
+    bars = rollup_quotes(records)
+    invalid = {violation.symbol for symbol, bar in bars.items()
+               for violation in find_symbol_violations(symbol, {date: bar}, market_type, validation_level)}
+    if len(invalid) > 0:
+        logging.warning("Daily bars of {} symbols break the validation rules and are not saved, e.g. {}".format(
+            len(invalid), sorted(invalid)[:10]))
+    bars = OrderedDict((symbol, bar) for symbol, bar in sorted(bars.items()) if symbol not in invalid)
+
+    # the file operators remove keys from the records they save, so a copy of the bars is saved instead
+    stock_data_master.upsert_data({symbol: {date: dict(bar)} for symbol, bar in bars.items()}, historical_file_name,
+                                  "historical")
+    logging.info("Realtime quotes of {} symbols on {} have been rolled up into daily bars".format(len(bars), date))
+    if market is not None:
+        market.forward_one_day(bars)
+    return bars
@@ -0,0 +1,137 @@
+"""
+This module ranks and screens the symbols on a given date by metrics computed across all of them at once, such as the
+return over some days, the average true range, RSI and the volume compared to its average. Only the days needed by the
+metrics are taken from each symbol, and each metric is computed with numpy on one array holding all the symbols.
+
+A metric is named after what it computes and the number of days it covers:
+    close, volume           the close price and volume on the date
+    return_<n>              the change of the close price from n open days before, e.g. return_20 = 0.05 for 5% up
+    atr_<n>                 the average true range of the last n days, in price
+    rsi_<n>                 the RSI of the last n days, computed by candlestick.features.rsi
+    volume_ratio_<n>        the volume on the date over the average volume of the n days before
+
+    top = screen(nasdaq_data, dt.datetime(2021, 1, 4), sort_by="return_20", filters={"volume": (1000000, None)}, top=50)
+"""
+import logging
+import re
+from collections import OrderedDict
+from itertools import dropwhile, islice
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.candlestick.features import CandleFeatures, ratio, rsi
+from sdm.util.columnar import to_float_array, to_datetime64
+from sdm.util.date_utils import trunc_date
+
+# Metrics computed when none is given
+DEFAULT_METRICS = ["close", "volume", "return_20", "atr_14", "rsi_14", "volume_ratio_20"]
+
+_METRIC_PATTERN = re.compile(r"^(return|atr|rsi|volume_ratio)_([1-9][0-9]*)$")
+
+
+def _parse_metric(metric):
+    if metric in ["close", "volume"]:
+        return metric, 0
+    match = _METRIC_PATTERN.match(metric)
+    if match is None:
+        raise ValueError("Unknown metric {}! Must be close, volume, or one of return_<n>, atr_<n>, rsi_<n> and "
+                         "volume_ratio_<n>".format(metric))
+    return match.group(1), int(match.group(2))
+
+
+def get_lookback_days(metrics):
+    """
+    :return: the number of days before the date that the metrics need
+    """
+    return max(_parse_metric(metric)[1] for metric in metrics)
+
+
+def _mean(values):
+    # NaN if any of the days is missing, so a symbol without enough days is not ranked on the metric
+    return values.mean(axis=-1)
+
+
+def compute_metrics(prices, metrics):
+    """
+    Compute the metrics of the last day of each row.
+    :param prices: a dict with open, high, low, close and volume, each mapped to a float array with one row per symbol
+    and the days in ascending order along the last axis, with at least get_lookback_days + 1 days
+    :param metrics: the names of the metrics
+    :return: a dict with the name of each metric as the key, and a float array with the value of each symbol, NaN if it
+    has not enough days
+    """
+    result = {}
+    close = prices["close"]
+    for metric in metrics:
+        kind, n = _parse_metric(metric)
+        if kind in ["close", "volume"]:
+            values = prices[kind][:, -1]
+        elif kind == "return":
+            values = ratio(close[:, -1], close[:, -1 - n]) - 1
+        elif kind == "atr":
+            prev_close = close[:, -1 - n:-1]
+            high, low = prices["high"][:, -n:], prices["low"][:, -n:]
+            true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+            values = _mean(true_range)
+        elif kind == "rsi":
+            values = rsi(CandleFeatures({"close": close[:, -1 - n:]}), n)[:, -1]
+            values[np.isnan(close[:, -1 - n:]).any(axis=-1)] = np.nan
+        else:
+            values = ratio(prices["volume"][:, -1], _mean(prices["volume"][:, -1 - n:-1]))
+        result[metric] = values
+    return result
+
+
+def _take_window(data, date, days):
+    # the latest days of each symbol up to the date, only for the symbols having data on the date
+    symbols = []
+    windows = []
+    for symbol, symbol_data in data.items():
+        recent = list(islice(dropwhile(lambda item: item[0] > date, reversed(symbol_data.items())), days))[::-1]
+        if len(recent) > 0 and recent[-1][0] == date:
+            symbols.append(symbol)
+            windows.append(recent)
+    prices = {column: np.full((len(symbols), days), np.nan) for column in c.BASE_COLUMNS}
+    for row, recent in enumerate(windows):
+        for column in c.BASE_COLUMNS:
+            prices[column][row, days - len(recent):] = to_float_array([record.get(column) for _, record in recent])
+    return symbols, prices
+
+
+def screen(data, date, metrics=None, filters=None, sort_by="return_20", ascending=False, top=None):
+    """
+    Rank the symbols on the date by a metric, keeping only the ones within the bounds of the filters.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key in ascending order. Symbols without data on the date are skipped
+    :param date: the date to screen on
+    :param metrics: the names of the metrics in the result. Default is DEFAULT_METRICS. The metrics of the filters and
+    sort_by are always computed
+    :param filters: a dict with the name of a metric as the key, and a tuple (lower, upper) of the inclusive bounds as
+    the value. None is for no bound, e.g. {"volume": (1000000, None)}
+    :param sort_by: the metric to rank the symbols by. Symbols without a value of it are skipped
+    :param ascending: rank from the lowest value if True, otherwise from the highest one
+    :param top: the number of symbols to keep. None for all of them
+    :return: an OrderedDict in ranked order with symbol as the key, and the value is a dict of the metrics
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    filters = filters or {}
+    needed = list(OrderedDict.fromkeys(metrics + list(filters) + [sort_by]))
+    date = trunc_date(date)
+    symbols, prices = _take_window(data, date, get_lookback_days(needed) + 1)
+    values = compute_metrics(prices, needed)
+
+    selected = ~np.isnan(values[sort_by])
+    for metric, (lower, upper) in filters.items():
+        with np.errstate(invalid="ignore"):
+            if lower is not None:
+                selected &= values[metric] >= lower
+            if upper is not None:
+                selected &= values[metric] <= upper
+    rows = np.flatnonzero(selected)
+    order = np.argsort(values[sort_by][rows] if ascending else -values[sort_by][rows], kind="stable")
+    rows = rows[order][:top]
+    logging.info("{} of {} symbols with data on {} are kept by the screen".format(len(rows), len(symbols),
+                                                                               to_datetime64(date)))
+    columns = {metric: values[metric][rows].tolist() for metric in metrics}
+    return OrderedDict((symbols[row], {metric: columns[metric][i] for metric in metrics}) for i, row in enumerate(rows))
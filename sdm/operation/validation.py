@@ -1,10 +1,42 @@
 import sdm.constants as c
+from sdm.util import instrumentation
+from sdm.util.columnar import to_float_array
 from sdm.util.date_utils import date_to_string
-from sdm.util.market_utils import USTradingCalendar, shift_open_days, CATradingCalendar
-from sdm.util.misc_utils import is_float
+from sdm.util.market_utils import get_trading_calendar, find_missing_dates
 import logging
+import os
+from collections import namedtuple, Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 
+# Rules checked in validation. Level 1: a base column is missing, or its value is not a finite non-negative number
+RULE_MISSING_COLUMN = "missing_column"
+RULE_INVALID_VALUE = "invalid_value"
+# Level 2: low is higher than open or close, or high is lower than open or close
+RULE_HIGH_LOW = "high_low"
+# Level 3: an open day is missing (reported with the datetime of the missing day), the record is on a day the market
+# is closed, or the record is not on a later day than the record before it (out of order or duplicated)
+RULE_GAP = "gap"
+RULE_CLOSED_DAY = "closed_day"
+RULE_ORDER = "order"
+
+# Rules that are broken by a record itself, so the record can be dropped to clean the data. A gap is not one of them
+RECORD_RULES = [RULE_MISSING_COLUMN, RULE_INVALID_VALUE, RULE_HIGH_LOW, RULE_CLOSED_DAY, RULE_ORDER]
+
+# Ways to clean the data: drop all the records breaking a rule, or repair the high/low values and drop the others
+CLEAN_METHODS = ["drop", "repair"]
+
+# Number of violations logged as examples when the validation fails
+VIOLATIONS_TO_LOG = 10
+
+# Number of shards per process when validating in parallel, so that the processes finish around the same time
+SHARDS_PER_PROCESS = 4
+
+Violation = namedtuple("Violation", ["symbol", "datetime", "rule"])
+
+
+@instrumentation.timed(instrumentation.SPAN_VALIDATE)
 def validate_realtime_data(data, validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL):
     """
     Validate the realtime data. Since there is only one datetime for each record, we will not perform any level 3
@@ -18,15 +50,18 @@ def validate_realtime_data(data, validation_level=c.DEFAULT_DATA_VALIDATION_LEVE
     for symbol in data:
         if c.DATETIME_KEY not in data[symbol]:
             result = False
-            logging.error("Datetime key {} not found for symbol".format(c.DATETIME_KEY, symbol))
-        datetime = data[symbol][c.DATETIME_KEY]
-        result = _validate_single_record(data[symbol], symbol, datetime, validation_level) and result
+            logging.error("Datetime key {} not found for symbol {}".format(c.DATETIME_KEY, symbol))
 
-    if result:
-        logging.info("Passed validation level {}".format(validation_level))
-    return result
+    symbols = list(data.keys())
+    records = list(data.values())
+    instrumentation.count(instrumentation.COUNTER_ROWS_VALIDATED, len(records))
+    violations = [Violation(symbols[i], records[i].get(c.DATETIME_KEY), rule)
+                  for rows, rule in _find_record_violations(records, validation_level)
+                  for i in np.flatnonzero(rows)]
+    return _log_violations(violations, validation_level) and result
 
 
+@instrumentation.timed(instrumentation.SPAN_VALIDATE)
 def validate_historical_data(data, market, validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL):
     """
 
@@ -36,63 +71,188 @@ def validate_historical_data(data, market, validation_level=c.DEFAULT_DATA_VALID
     intrusive validation.
     :return: True if there is not any error, else False.
     """
+    if instrumentation.is_enabled():
+        instrumentation.count(instrumentation.COUNTER_ROWS_VALIDATED,
+                              sum(len(symbol_data) for symbol_data in data.values()))
+    return _log_violations(find_historical_violations(data, market, validation_level), validation_level)
+
+
+def find_historical_violations(data, market, validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL):
+    """
+    Check the historical data against the rules of the validation level, one whole column of a symbol at a time.
+    :param data: the historical data used in sdm, same as validate_historical_data
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :param validation_level: the data validation level from 0 to 3
+    :return: a list of Violation(symbol, datetime, rule) for all the records breaking a rule, grouped by symbol and
+    sorted by datetime. The rule is one of the RULE_* constants in this module.
+    """
     if market not in c.MARKETS:
         raise ValueError("Market must be provided for historical data validation and must be one of the following: {}"
                          .format(c.MARKETS))
 
-    result = True
+    violations = []
+    for symbol in data:
+        violations.extend(find_symbol_violations(symbol, data[symbol], market, validation_level))
+    return violations
 
-    if validation_level >= 3:
-        if market in ["nasdaq", "nyse"]:
-            holidays = USTradingCalendar().holidays(c.EARLIEST_DATE, c.LATEST_DATE)
-        if market == "tsx":
-            holidays = CATradingCalendar().holidays(c.EARLIEST_DATE, c.LATEST_DATE)
 
-    for symbol in data:
-        symbol_data = data[symbol]
-        previous_datetime = None
-        for datetime in symbol_data:
-            # First validate level 1 & 2
-            result = _validate_single_record(symbol_data[datetime], symbol, datetime, validation_level) and result
-
-            if validation_level >= 3:
-                # for validation level >= 3, we check for gap or closed day in dates
-                if previous_datetime is not None:
-                    next_open_date = shift_open_days(previous_datetime, 1, market, holidays)
-                    if next_open_date.date() != datetime.date():
-                        logging.warning("Gap or closed date found! The next open date after {} should be {}, "
-                                        "but is {} instead for symbol {}".format(date_to_string(previous_datetime),
-                                                                                 date_to_string(next_open_date),
-                                                                                 date_to_string(datetime), symbol))
-                        result = False
-            previous_datetime = datetime
-    if result:
-        logging.info("Passed validation level {}".format(validation_level))
+def find_symbol_violations(symbol, symbol_data, market, validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL):
+    """
+    Check the historical data of one symbol against the rules of the validation level.
+    :param symbol: the symbol of the data
+    :param symbol_data: an OrderedDict with datetime object as ordered key, with its own value being the stock data
+    :return: a list of Violation(symbol, datetime, rule) sorted by datetime
+    """
+    datetimes = list(symbol_data.keys())
+    violation_rows = _find_record_violations(list(symbol_data.values()), validation_level)
+    violations = [Violation(symbol, datetimes[i], rule) for rows, rule in violation_rows for i in np.flatnonzero(rows)]
+
+    if validation_level >= 3 and len(datetimes) > 0:
+        # for validation level >= 3, we check for gap, closed day or out of order dates
+        dates = np.array(datetimes, dtype="datetime64[D]")
+        closed_days = ~np.is_busday(dates, busdaycal=get_trading_calendar(market))
+        violations.extend(Violation(symbol, datetimes[i], RULE_CLOSED_DAY) for i in np.flatnonzero(closed_days))
+        out_of_order = np.r_[False, dates[1:] <= dates[:-1]]
+        violations.extend(Violation(symbol, datetimes[i], RULE_ORDER) for i in np.flatnonzero(out_of_order))
+        missing_dates = find_missing_dates({symbol: symbol_data}, market).get(symbol, [])
+        violations.extend(Violation(symbol, datetime, RULE_GAP) for datetime in missing_dates)
+
+    return sorted(violations, key=lambda violation: violation.datetime)
+
+
+@instrumentation.timed(instrumentation.SPAN_VALIDATE)
+def validate_historical_data_parallel(data, market, validation_level=c.DEFAULT_DATA_VALIDATION_LEVEL, processes=None,
+                                     clean_method=None):
+    """
+    Validate the historical data with the symbols split into shards checked by a pool of processes, and summarize
+    the violations found.
+    :param data: the historical data used in sdm, same as validate_historical_data
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :param validation_level: the data validation level from 0 to 3
+    :param processes: the number of processes to use. Default is the number of CPUs
+    :param clean_method: None to only validate, or one of CLEAN_METHODS to also return a cleaned copy of the data
+    :return: a dict with the following keys. passed - True if there is not any violation. records - the number of
+    records validated. violations - the total number of violations. by_rule - a dict with the number of violations
+    per rule. by_symbol - a dict with the number of violations per symbol, only for symbols with violations. If
+    clean_method is given, cleaned_data is the data with the bad records dropped or repaired.
+    """
+    if market not in c.MARKETS:
+        raise ValueError("Market must be provided for historical data validation and must be one of the following: {}"
+                         .format(c.MARKETS))
+    if clean_method is not None and clean_method not in CLEAN_METHODS:
+        raise ValueError("Clean method must be one of the following: {}".format(CLEAN_METHODS))
+
+    processes = processes or os.cpu_count() or 1
+    symbols = list(data.keys())
+    if processes == 1 or len(symbols) <= 1:
+        violations = find_historical_violations(data, market, validation_level)
+    else:
+        shard_count = min(len(symbols), processes * SHARDS_PER_PROCESS)
+        shards = [{symbol: data[symbol] for symbol in symbols[i::shard_count]} for i in range(shard_count)]
+        violations = []
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for shard_violations in executor.map(find_historical_violations, shards, [market] * shard_count,
+                                                 [validation_level] * shard_count):
+                violations.extend(shard_violations)
+
+    _log_violations(violations, validation_level)
+    by_rule, by_symbol = summarize_violations(violations)
+    records = sum(len(symbol_data) for symbol_data in data.values())
+    instrumentation.count(instrumentation.COUNTER_ROWS_VALIDATED, records)
+    summary = {"passed": len(violations) == 0,
+               "records": records,
+               "violations": len(violations),
+               "by_rule": dict(by_rule),
+               "by_symbol": dict(by_symbol)}
+    if clean_method is not None:
+        summary["cleaned_data"] = clean_historical_data(data, violations, clean_method)
+    return summary
+
+
+def clean_historical_data(data, violations, clean_method="drop"):
+    """
+    Make a copy of the historical data without the records breaking a rule. The input data is not changed.
+    :param data: the historical data used in sdm
+    :param violations: a list of Violation(symbol, datetime, rule) found in the data
+    :param clean_method: "drop" to drop all the records breaking a rule, or "repair" to fix the high/low of the
+    records only breaking the high/low rule and drop the others
+    :return: the cleaned historical data in the same format
+    """
+    bad_records = {}
+    for violation in violations:
+        if violation.rule in RECORD_RULES:
+            bad_records.setdefault(violation.symbol, {}).setdefault(violation.datetime, set()).add(violation.rule)
+
+    result = {}
+    for symbol, symbol_data in data.items():
+        if symbol not in bad_records:
+            result[symbol] = symbol_data
+            continue
+        cleaned = OrderedDict()
+        for datetime, record in symbol_data.items():
+            rules = bad_records[symbol].get(datetime)
+            if rules is None:
+                cleaned[datetime] = record
+            elif clean_method == "repair" and rules == {RULE_HIGH_LOW}:
+                cleaned[datetime] = dict(record, high=max(record["high"], record["open"], record["close"]),
+                                         low=min(record["low"], record["open"], record["close"]))
+        result[symbol] = cleaned
+    logging.info("Cleaned {} records of {} symbols by {}".format(
+        sum(len(records) for records in bad_records.values()), len(bad_records), clean_method))
     return result
 
 
-def _validate_single_record(record, symbol, datetime, validation_level):
-    result = True
+def summarize_violations(violations):
+    """
+    :param violations: a list of Violation(symbol, datetime, rule)
+    :return: a tuple (by_rule, by_symbol) of Counter objects with the number of violations per rule and per symbol
+    """
+    return Counter(violation.rule for violation in violations), Counter(violation.symbol for violation in violations)
+
+
+def _find_record_violations(records, validation_level):
+    """
+    Check the records against the level 1 and level 2 rules, one column at a time.
+    :return: a list of (rows, rule) where rows is a boolean numpy array marking the records breaking the rule
+    """
+    if validation_level < 1 or len(records) == 0:
+        return []
+
+    # for validation level >= 1, we verify that the base columns (open, close, high, low, volume) are not None and are
+    # actually valid numbers
+    values = {}
+    missing = np.zeros(len(records), dtype=bool)
+    invalid = np.zeros(len(records), dtype=bool)
     for column in c.BASE_COLUMNS:
-        if validation_level >= 1:
-            # for validation level >= 1, we verify that the base columns (open, close, high, low, volume) are
-            # not None and are actually valid numbers
-            if column not in record:
-                logging.warning("Column {} for symbol {} on {} is not existing".format(
-                    column, symbol, date_to_string(datetime)))
-                result = False
-                break
-            if record[column] is None or not is_float(record[column]) or float(record[column]) < 0:
-                logging.warning("Column %s for symbol %s on %s has invalid value: {}".format(
-                    column, symbol, date_to_string(datetime), record[column]))
-                result = False
-                break
-
-        if validation_level >= 2:
-            # for validation level >= 2, we also verify that the number of high/low are actually the highest/lowest
-            if record["low"] > min(record["open"], record["close"]) or record["high"] < max(record["open"],
-                                                                                            record["close"]):
-                logging.warning("Incorrect low/high value in the data for symbol {} on date {}: {}".format(
-                    symbol, date_to_string(datetime), record))
-                result = False
+        values[column] = to_float_array([record.get(column) for record in records])
+        not_a_number = np.flatnonzero(np.isnan(values[column]))
+        if len(not_a_number) > 0:
+            missing[not_a_number[[column not in records[i] for i in not_a_number]]] = True
+        with np.errstate(invalid="ignore"):
+            invalid |= ~np.isfinite(values[column]) | (values[column] < 0)
+    invalid &= ~missing
+    result = [(missing, RULE_MISSING_COLUMN), (invalid, RULE_INVALID_VALUE)]
+
+    if validation_level >= 2:
+        # for validation level >= 2, we also verify that the number of high/low are actually the highest/lowest
+        with np.errstate(invalid="ignore"):
+            high_low = (values["low"] > np.minimum(values["open"], values["close"])) | \
+                       (values["high"] < np.maximum(values["open"], values["close"]))
+        result.append((high_low & ~missing & ~invalid, RULE_HIGH_LOW))
     return result
+
+
+def _log_violations(violations, validation_level):
+    if len(violations) == 0:
+        logging.info("Passed validation level {}".format(validation_level))
+        return True
+
+    by_rule, by_symbol = summarize_violations(violations)
+    logging.warning("Failed validation level {} with {} violations on {} symbols: {}".format(
+        validation_level, len(violations), len(by_symbol),
+        ", ".join("{} {}".format(count, rule) for rule, count in by_rule.items())))
+    for violation in violations[:VIOLATIONS_TO_LOG]:
+        logging.warning("Rule {} violated by symbol {} on {}".format(
+            violation.rule, violation.symbol,
+            date_to_string(violation.datetime) if violation.datetime is not None else None))
+    return False
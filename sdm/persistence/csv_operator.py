@@ -2,12 +2,21 @@ import os
 import csv
 from collections import OrderedDict
 import logging
+import re
+
+import numpy as np
 
 from sdm.persistence.file_operator import FileOperator
 import sdm.constants as c
 from sdm.util.date_utils import get_current_datetime, datetime_to_string, string_to_datetime
 from sdm.util.io_utils import is_non_empty_file
-from sdm.util.misc_utils import enforce_precision
+from sdm.util.columnar import round_column
+
+# Buffer size in bytes when writing to a csv file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Numbers in the form str() writes them. Other numeric-looking values, such as IDs with leading zeros, are not numbers
+_NUMBER_PATTERN = re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?(e[-+][0-9]+)?|-?inf|nan")
 
 
 class CSVOperator(FileOperator):
@@ -20,18 +29,21 @@ class CSVOperator(FileOperator):
         if data_type not in c.DATA_TYPES:
             raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
         if data_type == "historical":
-            csv_data = self.historical_data_to_csv_format(data)
+            header, row_chunks = self.historical_data_to_csv_rows(data)
         elif data_type == "realtime":
-            csv_data = self.realtime_data_to_csv_format(data)
+            header, row_chunks = self.realtime_data_to_csv_rows(data)
 
-        if len(csv_data) > 0:
-            keys = csv_data[0].keys()
-            with open(os.path.join(self._directory, file_name), file_mode, newline='') as csv_file:
-                dict_writer = csv.DictWriter(csv_file, keys)
+        if header is not None:
+            row_count = 0
+            with open(os.path.join(self._directory, file_name), file_mode, newline='',
+                      buffering=WRITE_BUFFER_SIZE) as csv_file:
+                writer = csv.writer(csv_file)
                 if not append or not is_non_empty_file(self._directory, file_name):
-                    dict_writer.writeheader()
-                dict_writer.writerows(csv_data)
-            logging.info("Data has been written to file {}".format(file_name))
+                    writer.writerow(header)
+                for rows in row_chunks:
+                    writer.writerows(rows)
+                    row_count += len(rows)
+            logging.info("{} records have been written to file {}".format(row_count, file_name))
         else:
             logging.warning("Data is empty so not writing to the file specified.")
 
@@ -40,31 +52,59 @@ class CSVOperator(FileOperator):
         if data_type not in c.DATA_TYPES:
             raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
 
-        with open(os.path.join(self._directory, file_name), "r") as f:
-            reader = csv.DictReader(f)
-            csv_data = list(reader)
-        logging.info("Total of {} records have been loaded from file {}.".format(len(csv_data), file_name))
+        with open(os.path.join(self._directory, file_name), "r", newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            symbols, datetimes, records = self.csv_rows_to_records(header, reader, symbol, start_date, end_date,
+                                                                   datetime_format)
+        logging.info("Total of {} records have been loaded from file {}.".format(len(records), file_name))
         if data_type == "historical":
-            return self.csv_data_to_historical(csv_data, symbol, start_date, end_date, datetime_format)
+            return self.records_to_historical(symbols, datetimes, records)
         elif data_type == "realtime":
-            return self.csv_data_to_realtime(csv_data, symbol, start_date, end_date, datetime_format)
+            return self.records_to_realtime(symbols, datetimes, records)
 
     @staticmethod
-    def historical_data_to_csv_format(raw_data):
-        result = []
-        for symbol in raw_data:
-            for datetime in raw_data[symbol]:
-                new_record= OrderedDict()
-                new_record[c.SYMBOL_KEY] = symbol
-                new_record[c.DATETIME_KEY] = datetime_to_string(datetime)
-                record = raw_data[symbol][datetime]
-                if c.SYMBOL_KEY in record:
-                    del record[c.SYMBOL_KEY]
-                if c.DATETIME_KEY in record:
-                    del record[c.DATETIME_KEY]
-                new_record.update(record)
-                result.append(enforce_precision(new_record))
-        return result
+    def historical_data_to_csv_rows(raw_data):
+        """
+        Convert the historical data to rows of a csv file without changing the data. The columns are symbol, datetime,
+        followed by the keys of the first record.
+        :return: a tuple (header, row_chunks). header is the list of column names, or None if there is no data.
+        row_chunks is an iterator of lists of rows, one list for each symbol.
+        """
+        first_record = next((next(iter(symbol_data.values())) for symbol_data in raw_data.values()
+                             if len(symbol_data) > 0), None)
+        if first_record is None:
+            return None, iter([])
+        header = _make_header(first_record)
+
+        def row_chunks():
+            formatted_datetimes = {}
+            for symbol, symbol_data in raw_data.items():
+                if len(symbol_data) == 0:
+                    continue
+                datetimes = list(symbol_data.keys())
+                for datetime in set(datetimes).difference(formatted_datetimes):
+                    formatted_datetimes[datetime] = datetime_to_string(datetime)
+                yield _make_rows(header, [symbol] * len(datetimes), list(map(formatted_datetimes.get, datetimes)),
+                                 list(symbol_data.values()))
+
+        return header, row_chunks()
+
+    @staticmethod
+    def realtime_data_to_csv_rows(raw_data):
+        """
+        Convert the realtime data to rows of a csv file without changing the data. Records without a datetime are
+        saved with the current datetime.
+        :return: a tuple (header, row_chunks), the same as historical_data_to_csv_rows
+        """
+        if len(raw_data) == 0:
+            return None, iter([])
+        header = _make_header(next(iter(raw_data.values())))
+        current_datetime = datetime_to_string(get_current_datetime())
+        records = list(raw_data.values())
+        datetimes = [datetime_to_string(record[c.DATETIME_KEY]) if c.DATETIME_KEY in record else current_datetime
+                     for record in records]
+        return header, iter([_make_rows(header, list(raw_data.keys()), datetimes, records)])
 
     def load_symbol_list(self, file_name):
         with open(os.path.join(self._directory, file_name), "r") as f:
@@ -73,66 +113,95 @@ class CSVOperator(FileOperator):
         return [csv_record[c.SYMBOL_KEY] for csv_record in csv_data]
 
     @staticmethod
-    def realtime_data_to_csv_format(raw_data):
-        result = []
-        for symbol in raw_data:
-            new_record = OrderedDict()
-            record = raw_data[symbol]
-            new_record[c.SYMBOL_KEY] = symbol
-            if c.SYMBOL_KEY in record:
-                del record[c.SYMBOL_KEY]
-            if c.DATETIME_KEY not in record:
-                new_record[c.DATETIME_KEY] = datetime_to_string(get_current_datetime())
-            else:
-                new_record[c.DATETIME_KEY] = datetime_to_string(record[c.DATETIME_KEY])
-                del record[c.DATETIME_KEY]
-            new_record.update(record)
-            result.append(enforce_precision(new_record))
-        return result
+    def csv_rows_to_records(header, rows, target_symbol=None, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                            csv_datetime_format=c.DATETIME_FORMAT):
+        """
+        Convert the rows of a csv file to records, skipping the rows of other symbols or out of the date range. Each
+        distinct datetime string is only parsed once, and the numeric columns are converted to floats one column at a
+        time.
+        :param header: the list of column names
+        :param rows: an iterable of rows, each a list of strings
+        :return: a tuple (symbols, datetimes, records) of lists with the same length. Each record is a dict of the
+        columns other than symbol and datetime.
+        """
+        if c.SYMBOL_KEY not in header or c.DATETIME_KEY not in header:
+            return [], [], []
+        symbol_index = header.index(c.SYMBOL_KEY)
+        datetime_index = header.index(c.DATETIME_KEY)
+        width = len(header)
+
+        if target_symbol is None:
+            rows = [row for row in rows if len(row) > 0]
+        else:
+            rows = [row for row in rows if len(row) > 0 and row[symbol_index] == target_symbol]
+        if any(len(row) != width for row in rows):
+            rows = [(row + [""] * width)[:width] for row in rows]
+        if len(rows) == 0:
+            return [], [], []
+        columns = list(zip(*rows))
+
+        parsed_datetimes = {string: string_to_datetime(string, csv_datetime_format)
+                            for string in set(columns[datetime_index])}
+        datetimes = list(map(parsed_datetimes.get, columns[datetime_index]))
+        if any(datetime > end_date or datetime < start_date for datetime in parsed_datetimes.values()):
+            selected = [i for i, datetime in enumerate(datetimes) if start_date <= datetime <= end_date]
+            datetimes = [datetimes[i] for i in selected]
+            columns = [[column[i] for i in selected] for column in columns]
+
+        keys = [key for i, key in enumerate(header) if i not in (symbol_index, datetime_index)]
+        values = [_parse_column(columns[i]) for i in range(width) if i not in (symbol_index, datetime_index)]
+        records = [dict(zip(keys, row)) for row in zip(*values)] if len(keys) > 0 else [{} for _ in datetimes]
+        return list(columns[symbol_index]), datetimes, records
 
     @staticmethod
-    def csv_data_to_historical(csv_data, target_symbol, start_date, end_date, csv_datetime_format=c.DATETIME_FORMAT):
-        if len(csv_data) == 0:
-            return csv_data
-
+    def records_to_historical(symbols, datetimes, records):
+        """
+        Group the records by symbol into the historical data format. The data of a symbol is only sorted if the rows
+        in the file are not already in ascending order of datetime.
+        """
         result = {}
-        for record in csv_data:
-            if c.SYMBOL_KEY not in record or c.DATETIME_KEY not in record:
-                continue
-            if target_symbol is not None and target_symbol != record[c.SYMBOL_KEY]:
-                continue
-            datetime = string_to_datetime(record[c.DATETIME_KEY], csv_datetime_format)
-            if datetime > end_date or datetime < start_date:
-                continue
-            symbol = record[c.SYMBOL_KEY]
-            del record[c.SYMBOL_KEY]
-            del record[c.DATETIME_KEY]
-
-            if symbol not in result:
-                result[symbol] = {}
-            result[symbol][datetime] = record
-
-        for symbol in result:
+        last_datetimes = {}
+        unsorted_symbols = set()
+        for symbol, datetime, record in zip(symbols, datetimes, records):
+            symbol_data = result.get(symbol)
+            if symbol_data is None:
+                symbol_data = result[symbol] = OrderedDict()
+            elif datetime <= last_datetimes[symbol]:
+                unsorted_symbols.add(symbol)
+            symbol_data[datetime] = record
+            last_datetimes[symbol] = datetime
+
+        for symbol in unsorted_symbols:
             result[symbol] = OrderedDict(sorted(result[symbol].items()))
-
         return result
 
     @staticmethod
-    def csv_data_to_realtime(csv_data, target_symbol, start_date, end_date, csv_datetime_format=c.DATETIME_FORMAT):
-        if len(csv_data) == 0:
-            return csv_data
-
+    def records_to_realtime(symbols, datetimes, records):
         result = {}
-        for record in csv_data:
-            if c.SYMBOL_KEY not in record or c.DATETIME_KEY not in record:
-                continue
-            if target_symbol is not None and target_symbol != record[c.SYMBOL_KEY]:
-                continue
-            datetime = string_to_datetime(record[c.DATETIME_KEY], csv_datetime_format)
-            if datetime > end_date or datetime < start_date:
-                continue
+        for symbol, datetime, record in zip(symbols, datetimes, records):
             record[c.DATETIME_KEY] = datetime
-            symbol = record[c.SYMBOL_KEY]
-            del record[c.SYMBOL_KEY]
             result[symbol] = record
         return result
+
+
+def _make_header(first_record):
+    return [c.SYMBOL_KEY, c.DATETIME_KEY] + [key for key in first_record if key not in (c.SYMBOL_KEY, c.DATETIME_KEY)]
+
+
+def _make_rows(header, symbols, datetimes, records):
+    # Same as csv.DictWriter, a record with a key that is not in the header is not allowed
+    extra_keys = set().union(*(record.keys() for record in records)).difference(header)
+    if len(extra_keys) > 0:
+        raise ValueError("Record contains fields not in the header: {}".format(", ".join(map(str, extra_keys))))
+    columns = [round_column([record.get(key) for record in records]) for key in header[2:]]
+    return list(zip(symbols, datetimes, *columns))
+
+
+def _parse_column(values):
+    # A column is numeric if all its non-empty values are numbers, and the empty values become None
+    if not all(value == "" or _NUMBER_PATTERN.fullmatch(value) for value in values):
+        return values
+    try:
+        return np.array(values, dtype=float).tolist()
+    except ValueError:
+        return [float(value) if value != "" else None for value in values]
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+import sdm.constants as c
+
 
 class FileOperator(ABC):
 
@@ -16,4 +18,33 @@ class FileOperator(ABC):
 
     @abstractmethod
     def load_symbol_list(self, file_name):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def upsert_to_file(self, data, file_name, data_type="historical"):
+        """
+        Save the data, replacing the records saved before for the same symbol and datetime, all in one transaction.
+        """
+        raise NotImplementedError("Replacing saved records is only supported by sql files")
+
+    def iterate_records(self, file_name, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                        batch_size=c.SQL_FETCH_SIZE):
+        """
+        Go through the records of all the symbols in ascending order of datetime, e.g. the realtime quotes collected
+        over a day. This default loads the whole file first, and the file types that can read it in order batch by
+        batch override it.
+        :return: a generator of tuples (symbol, datetime, record)
+        """
+        data = self.load_from_file(file_name, "historical", None, start_date, end_date, c.DATETIME_FORMAT)
+        records = sorted(((datetime, symbol, record) for symbol, symbol_data in data.items()
+                          for datetime, record in symbol_data.items()), key=lambda item: item[0])
+        for datetime, symbol, record in records:
+            yield symbol, datetime, record
+
+    def open_connection(self, file_name=None):
+        """
+        Keep a handle to the file open for the following saves and loads, if the file type supports it.
+        """
+        pass
+
+    def close_connection(self):
+        pass
@@ -0,0 +1,176 @@
+import os
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from sdm.persistence.csv_operator import CSVOperator
+import sdm.constants as c
+from sdm.util.date_utils import get_current_datetime, datetime_to_string, string_to_datetime
+from sdm.util.io_utils import write_atomically
+
+
+class PartitionedCSVOperator(CSVOperator):
+    """
+    Save the data as a directory of csv files instead of one file. The file name given to save and load is the name of
+    the directory, with one csv file per symbol (or per symbol per year), and a manifest file indexing the symbol and
+    the date range of each partition. Loading one symbol or one date range only reads the partitions needed, and
+    appending a day only touches the files of the symbols in the data.
+    """
+
+    def __init__(self, directory, partition=c.DEFAULT_PARTITION, processes=1):
+        """
+        Initializer
+        :param directory: the directory where the datasets are saved
+        :param partition: "symbol" for one file per symbol, or "symbol_year" for one file per symbol per year
+        :param processes: the number of processes used to load the partitions. Default is to load them one by one, and
+        None is to use as many processes as CPUs
+        """
+        super().__init__(directory)
+        if partition not in c.PARTITIONS:
+            raise ValueError("Partition must be one of these: {}".format(c.PARTITIONS))
+        self._partition = partition
+        self._processes = processes
+
+    def save_to_file(self, data, file_name, data_type="historical", append=True):
+        if data_type not in c.DATA_TYPES:
+            raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
+
+        manifest = self.load_manifest(file_name)
+        if not append:
+            for partition_file in manifest["partitions"]:
+                os.remove(os.path.join(self._directory, file_name, partition_file))
+            manifest = self._new_manifest()
+        elif manifest["partition"] != self._partition:
+            raise ValueError("Dataset {} is partitioned by {}, not {}".format(
+                file_name, manifest["partition"], self._partition))
+
+        if data_type == "historical":
+            partitions = self._split_historical_data(data)
+        elif data_type == "realtime":
+            partitions = self._split_realtime_data(data)
+
+        for (symbol, year), (partition_data, datetimes) in partitions.items():
+            partition_file = self._partition_file_name(symbol, year)
+            os.makedirs(os.path.dirname(os.path.join(self._directory, file_name, partition_file)), exist_ok=True)
+            super().save_to_file(partition_data, os.path.join(file_name, partition_file), data_type, append=True)
+            entry = manifest["partitions"].get(partition_file)
+            start, end = min(datetimes), max(datetimes)
+            if entry is not None:
+                start = min(start, string_to_datetime(entry["start"]))
+                end = max(end, string_to_datetime(entry["end"]))
+            manifest["partitions"][partition_file] = {
+                "symbol": symbol, "year": year, "start": datetime_to_string(start), "end": datetime_to_string(end),
+                "records": len(datetimes) + (entry["records"] if entry is not None else 0)}
+
+        self._save_manifest(manifest, file_name)
+        logging.info("Data of {} partitions has been written to dataset {}".format(len(partitions), file_name))
+
+    def load_from_file(self, file_name, data_type="historical", symbol=None, start_date=c.EARLIEST_DATE,
+                       end_date=c.LATEST_DATE, datetime_format=c.DATETIME_FORMAT):
+        if data_type not in c.DATA_TYPES:
+            raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
+
+        manifest = self.load_manifest(file_name)
+        partition_files = self.find_partitions(manifest, symbol, start_date, end_date)
+        paths = [os.path.join(file_name, partition_file) for partition_file in partition_files]
+        arguments = [[self._directory] * len(paths), paths, [data_type] * len(paths), [start_date] * len(paths),
+                     [end_date] * len(paths), [datetime_format] * len(paths)]
+        processes = self._processes or os.cpu_count() or 1
+        if processes == 1 or len(paths) <= 1:
+            loaded = list(map(_load_partition, *arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                loaded = list(executor.map(_load_partition, *arguments))
+
+        result = {}
+        for partition_data in loaded:
+            for loaded_symbol, symbol_data in partition_data.items():
+                if data_type == "historical" and loaded_symbol in result:
+                    result[loaded_symbol].update(symbol_data)
+                else:
+                    result[loaded_symbol] = symbol_data
+        logging.info("Data of {} symbols has been loaded from {} partitions of dataset {}".format(
+            len(result), len(paths), file_name))
+        return result
+
+    def load_symbol_list(self, file_name):
+        """
+        Load the symbols saved in a partitioned dataset, or the symbol list from a csv file if file_name is a file.
+        """
+        if os.path.isfile(os.path.join(self._directory, file_name)):
+            return super().load_symbol_list(file_name)
+        manifest = self.load_manifest(file_name)
+        return list(OrderedDict.fromkeys(entry["symbol"] for entry in manifest["partitions"].values()))
+
+    def load_manifest(self, file_name):
+        """
+        :return: the manifest of the dataset as a dict, with partition as the partition scheme, and partitions mapping
+        the file name of each partition to its symbol, year, start and end datetime, and number of records. A new empty
+        manifest is returned if the dataset does not exist yet.
+        """
+        manifest_path = os.path.join(self._directory, file_name, c.PARTITION_MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            return self._new_manifest()
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def find_partitions(manifest, symbol=None, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE):
+        """
+        :return: the file names of the partitions with data of the symbol in the date range, ordered by symbol and year
+        """
+        partition_files = [partition_file for partition_file, entry in manifest["partitions"].items()
+                           if (symbol is None or entry["symbol"] == symbol) and
+                           string_to_datetime(entry["start"]) <= end_date and
+                           string_to_datetime(entry["end"]) >= start_date]
+        return sorted(partition_files, key=lambda partition_file: (manifest["partitions"][partition_file]["symbol"],
+                                                                  manifest["partitions"][partition_file]["year"] or 0))
+
+    def _new_manifest(self):
+        return {"partition": self._partition, "partitions": {}}
+
+    def _save_manifest(self, manifest, file_name):
+        os.makedirs(os.path.join(self._directory, file_name), exist_ok=True)
+        manifest_path = os.path.join(self._directory, file_name, c.PARTITION_MANIFEST_FILE)
+        write_atomically(manifest_path, lambda f: json.dump(manifest, f, indent=1))
+
+    def _partition_file_name(self, symbol, year):
+        symbol = symbol.replace(os.sep, "_")
+        if year is None:
+            return "{}.csv".format(symbol)
+        return os.path.join(symbol, "{}.csv".format(year))
+
+    def _split_historical_data(self, data):
+        """
+        :return: a dict with (symbol, year) as the key, and the value is a tuple (data of the partition, list of
+        datetimes in the partition). year is None if the data is only partitioned by symbol.
+        """
+        partitions = {}
+        for symbol, symbol_data in data.items():
+            if len(symbol_data) == 0:
+                continue
+            if self._partition == "symbol":
+                partitions[(symbol, None)] = ({symbol: symbol_data}, list(symbol_data.keys()))
+                continue
+            for datetime, record in symbol_data.items():
+                partition_data, datetimes = partitions.setdefault((symbol, datetime.year),
+                                                                  ({symbol: OrderedDict()}, []))
+                partition_data[symbol][datetime] = record
+                datetimes.append(datetime)
+        return partitions
+
+    def _split_realtime_data(self, data):
+        partitions = {}
+        current_datetime = get_current_datetime()
+        for symbol, record in data.items():
+            datetime = record.get(c.DATETIME_KEY, current_datetime)
+            year = datetime.year if self._partition == "symbol_year" else None
+            partition_data, datetimes = partitions.setdefault((symbol, year), ({}, []))
+            partition_data[symbol] = record
+            datetimes.append(datetime)
+        return partitions
+
+
+def _load_partition(directory, file_name, data_type, start_date, end_date, datetime_format):
+    return CSVOperator(directory).load_from_file(file_name, data_type, None, start_date, end_date, datetime_format)
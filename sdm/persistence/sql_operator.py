@@ -6,7 +6,8 @@ from collections import OrderedDict
 
 from sdm.persistence.file_operator import FileOperator
 import sdm.constants as c
-from sdm.util.date_utils import get_current_datetime, datetime_to_timestamp, timestamp_to_datetime
+from sdm.util.date_utils import get_current_datetime, datetime_to_timestamp, datetimes_to_timestamps, \
+    timestamps_to_datetimes
 from sdm.util.misc_utils import enforce_precision
 
 
@@ -15,16 +16,31 @@ class SQLOperator(FileOperator):
     def __init__(self, directory, db_file_name=None):
         super().__init__(directory)
         self._db_file_name = db_file_name
+        self._connection = None
         if db_file_name is not None:
             self._init_db()
 
+    def open_connection(self, file_name=None):
+        """
+        Keep one connection open to the db file, so the following saves and loads reuse it instead of opening a new
+        connection every time. Call close_connection when it is no longer needed.
+        :param file_name: the db file to connect to. Default is the current db file
+        """
+        if file_name is not None:
+            self.switch_db_file(file_name)
+        if self._db_file_name is None:
+            raise ValueError("No db file to connect to. Please specify the file name.")
+        if self._connection is None:
+            self._connection = sqlite3.connect(os.path.join(self._directory, self._db_file_name),
+                                               check_same_thread=False)
+
+    def close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
     def save_to_file(self, data, file_name, data_type="historical", append="True"):
-        if data_type not in c.DATA_TYPES:
-            raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
-        if data_type == "historical":
-            sql_data = self._historical_data_to_sql_format(data)
-        elif data_type == "realtime":
-            sql_data = self._realtime_data_to_sql_format(data)
+        sql_data = self._to_sql_format(data, data_type)
 
         self.switch_db_file(file_name)
 
@@ -36,7 +52,29 @@ class SQLOperator(FileOperator):
         cur.executemany('INSERT INTO {} VALUES (?,?,?)'.format(c.TABLE_NAME), sql_data)
         conn.commit()
         logging.info("{} of records have been written to file {}".format(len(sql_data), file_name))
-        conn.close()
+        self._release_connection(conn)
+
+    def upsert_to_file(self, data, file_name, data_type="historical"):
+        """
+        Save the data, replacing the records saved before for the same symbol and datetime. All the records are written
+        in one transaction, so either all or none of them are saved.
+        """
+        sql_data = self._to_sql_format(data, data_type)
+        self.switch_db_file(file_name)
+        conn = self._get_connection()
+        try:
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO {} VALUES (?,?,?)'.format(c.TABLE_NAME), sql_data)
+        finally:
+            self._release_connection(conn)
+        logging.info("{} of records have been written or replaced in file {}".format(len(sql_data), file_name))
+
+    def _to_sql_format(self, data, data_type):
+        if data_type not in c.DATA_TYPES:
+            raise ValueError("Incorrect data type! Must be one of these: {}".format(c.DATA_TYPES))
+        if data_type == "historical":
+            return self._historical_data_to_sql_format(data)
+        return self._realtime_data_to_sql_format(data)
 
     def load_from_file(self, file_name, data_type, symbol=None, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
                        datetime_format=None):
@@ -55,7 +93,7 @@ class SQLOperator(FileOperator):
             cur.execute(select_stmt,
                         (datetime_to_timestamp(start_date), datetime_to_timestamp(end_date), symbol.upper()))
         sql_data = cur.fetchall()
-        conn.close()
+        self._release_connection(conn)
         logging.info("Total of {} records have been loaded from file {}.".format(len(sql_data), file_name))
 
         if data_type == "historical":
@@ -63,33 +101,64 @@ class SQLOperator(FileOperator):
         elif data_type == "realtime":
             return self._sql_data_to_realtime(sql_data)
 
+    def iterate_records(self, file_name, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                        batch_size=c.SQL_FETCH_SIZE):
+        """
+        Go through the records of all the symbols in ascending order of datetime, reading batch_size rows at a time
+        by the index on the timestamp, so only one batch is in memory at once.
+        :return: a generator of tuples (symbol, datetime, record)
+        """
+        self.switch_db_file(file_name)
+        # a connection of its own, so saving to another file while going through this one does not close it
+        conn = sqlite3.connect(os.path.join(self._directory, self._db_file_name), check_same_thread=False)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT {}, {}, {} FROM {} WHERE {} between ? and ? ORDER BY {}".format(
+                c.SYMBOL_COLUMN, c.TIMESTAMP_COLUMN, c.DATA_COLUMN, c.TABLE_NAME, c.TIMESTAMP_COLUMN,
+                c.TIMESTAMP_COLUMN), (datetime_to_timestamp(start_date), datetime_to_timestamp(end_date)))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                datetimes = timestamps_to_datetimes([row[1] for row in rows])
+                for row, datetime in zip(rows, datetimes):
+                    yield row[0], datetime, json.loads(row[2])
+        finally:
+            conn.close()
+
     def load_symbol_list(self, file_name):
         self.switch_db_file(file_name)
         conn = self._get_connection()
         cur = conn.cursor()
-        conn.row_factory = lambda cursor, row: row[0]
         sql_select_symbols = "SELECT distinct {} FROM {}".format(c.SYMBOL_COLUMN, c.TABLE_NAME)
         cur.execute(sql_select_symbols)
         symbol_list = cur.fetchall()
         logging.info("There are {} symbols found in the daily table".format(len(symbol_list)))
-        conn.close()
+        self._release_connection(conn)
         return [symbol[0] for symbol in symbol_list]
 
     def switch_db_file(self, file_name):
         if self._db_file_name != file_name:
+            self.close_connection()
             self._db_file_name = file_name
             if self._db_file_name is not None:
                 self._init_db()
 
     def _get_connection(self):
+        if self._connection is not None:
+            return self._connection
         return sqlite3.connect(os.path.join(self._directory, self._db_file_name))
 
+    def _release_connection(self, conn):
+        if conn is not self._connection:
+            conn.close()
+
     def _init_db(self):
         conn = self._get_connection()
         # Check if tables exist. If not create the base table.
         self._create_db_table(conn)
         logging.info("Database successfully initialized in file: " + self._db_file_name)
-        conn.close()
+        self._release_connection(conn)
 
     @staticmethod
     def _table_existing(conn):
@@ -108,6 +177,11 @@ class SQLOperator(FileOperator):
                 .format(c.TABLE_NAME, c.SYMBOL_COLUMN, c.TIMESTAMP_COLUMN, c.DATA_COLUMN,
                         c.SYMBOL_COLUMN, c.TIMESTAMP_COLUMN,)
             cur.execute(sql_create_daily_table)
+        # the primary key only helps the queries by symbol, this one helps the queries of a date range of all symbols.
+        # Also created for the files saved before the index was added
+        conn.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(c.TIMESTAMP_INDEX_NAME, c.TABLE_NAME,
+                                                                       c.TIMESTAMP_COLUMN))
+        conn.commit()
 
     def _truncate_table(self):
         conn = self._get_connection()
@@ -115,19 +189,19 @@ class SQLOperator(FileOperator):
             cur = conn.cursor()
             cur.execute("DELETE FROM {};".format(c.TABLE_NAME))
             conn.commit()
-        conn.close()
+        self._release_connection(conn)
 
     @staticmethod
     def _historical_data_to_sql_format(raw_data):
         result = []
         for symbol in raw_data:
-            for datetime in raw_data[symbol]:
-                record = raw_data[symbol][datetime]
+            timestamps = datetimes_to_timestamps(list(raw_data[symbol].keys()))
+            for timestamp, record in zip(timestamps, raw_data[symbol].values()):
                 if c.SYMBOL_KEY in record:
                     del record[c.SYMBOL_KEY]
                 if c.DATETIME_KEY in record:
                     del record[c.DATETIME_KEY]
-                result.append((symbol, datetime_to_timestamp(datetime), json.dumps(enforce_precision(record))))
+                result.append((symbol, timestamp, json.dumps(enforce_precision(record))))
         return result
 
     @staticmethod
@@ -149,9 +223,9 @@ class SQLOperator(FileOperator):
             return sql_data
 
         result = {}
-        for record in sql_data:
+        datetimes = timestamps_to_datetimes([record[1] for record in sql_data])
+        for record, datetime in zip(sql_data, datetimes):
             symbol = record[0]
-            datetime = timestamp_to_datetime(record[1])
             if symbol not in result:
                 result[symbol] = {}
             result[symbol][datetime] = json.loads(record[2])
@@ -166,8 +240,9 @@ class SQLOperator(FileOperator):
             return sql_data
 
         result = {}
-        for record in sql_data:
+        datetimes = timestamps_to_datetimes([record[1] for record in sql_data])
+        for record, datetime in zip(sql_data, datetimes):
             symbol = record[0]
             result[symbol] = json.loads(record[2])
-            result[symbol][c.DATETIME_KEY] = timestamp_to_datetime(record[1])
+            result[symbol][c.DATETIME_KEY] = datetime
         return result
@@ -1,8 +1,9 @@
 import logging
 from collections import OrderedDict
 
+from sdm.util import instrumentation
 from sdm.util.date_utils import date_to_string, trunc_today, trunc_date
-from sdm.util.market_utils import is_open_day, USTradingCalendar, CATradingCalendar
+from sdm.util.market_utils import is_open_day, get_holidays
 from sdm.util.misc_utils import transpose_dict
 
 import datetime as dt
@@ -28,11 +29,7 @@ class Market:
         self._current_day = start_date
 
         self._market_type = market_type
-        if market_type == "tsx":
-            inst = CATradingCalendar()
-        else:
-            inst = USTradingCalendar()
-        self._holidays = inst.holidays(self._start_date, self._end_date)
+        self._holidays = get_holidays(market_type)
 
         # In case the start date is not an open date, we forward it to the next open day
         while not is_open_day(self._current_day, self._market_type, self._holidays):
@@ -41,7 +38,8 @@ class Market:
         self._market_data_cumulative = OrderedDict()
         if market_historical_data is not None and len(market_historical_data) > 0:
             logging.info("Transposing historical data dict, this might take a while...")
-            self._historical_market_data_by_date = transpose_dict(market_historical_data)
+            with instrumentation.span(instrumentation.SPAN_TRANSPOSE):
+                self._historical_market_data_by_date = transpose_dict(market_historical_data)
             logging.info("Historical data dict has been transposed.")
 
         self._traders = []
@@ -99,13 +97,14 @@ class Market:
     def get_traders(self):
         return self._traders
 
-    def make_trades(self, real_time_price=None, force=False):
+    def make_trades(self, real_time_price=None, force=False, batch=False):
         if real_time_price is None:
             self.append_data_for_today()
         all_transactions = []
         for trader in self._traders:
-            transactions = trader.make_trades(self._market_data_cumulative, self._current_day, self._market_type,
-                                              real_time_price, force)
+            trade_func = trader.make_trades_batch if batch else trader.make_trades
+            transactions = trade_func(self._market_data_cumulative, self._current_day, self._market_type,
+                                      real_time_price, force)
             all_transactions.append(transactions)
         return all_transactions
 
@@ -137,6 +136,7 @@ class Market:
             raise ValueError("No data for today {} can be found from historical data provided!".format(
                 self._current_day))
 
-    def trade_and_forward(self, today_close_quote=None):
-        self.make_trades()
+    @instrumentation.timed(instrumentation.SPAN_SIMULATION_DAY)
+    def trade_and_forward(self, today_close_quote=None, batch=False):
+        self.make_trades(batch=batch)
         self.forward_one_day(today_close_quote)
@@ -2,12 +2,16 @@ import logging
 
 from sdm.util.date_utils import date_to_string
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 DEFAULT_COMMISSION_FLAT_FEE = 0
 REALTIME_PRICE_KEY = "price"
 
+# Reasons of skipping a transaction in a batch execution, indexed by the code used in Trader.execute_orders
+_SKIP_REASONS = [None, "without price data", "buying below the market price", "selling above the market price",
+                 "without enough cash", "without enough position"]
+_NO_PRICE_DATA, _BUY_BELOW_MARKET, _SELL_ABOVE_MARKET, _NOT_ENOUGH_CASH, _NOT_ENOUGH_POSITION = range(1, 6)
+
 
 def default_commission(transaction):
     if transaction.action < 0 and transaction.price * transaction.amount < DEFAULT_COMMISSION_FLAT_FEE:
@@ -102,43 +106,194 @@ class Trader:
                                   market_name=market_name, real_time_price=real_time_price)
         valid_transactions = []
         for transaction in transactions:
-            if real_time_price is not None:
-                # If we are checking against real market data
-                if transaction.symbol in real_time_price:
-                    current_price = real_time_price[transaction.symbol][REALTIME_PRICE_KEY]
-                else:
+            current_price = self._get_current_price(transaction.symbol, market_data_cumulative, current_day,
+                                                    real_time_price)
+            if current_price is None:
+                if real_time_price is not None:
                     logging.error("Trying to make a transaction on symbol {} on {} but cannot find it in realtime "
                                   "price data. Skipping this transaction".format(transaction.symbol, current_day))
-                    continue
-            else:
-                # If we are only simulating a trade, then use the previous close price as realtime price
-                if transaction.symbol in market_data_cumulative[current_day]:
-                    current_price = market_data_cumulative[current_day][transaction.symbol]["close"]
-                    self._latest_close_price[transaction.symbol] = current_price
-                elif transaction.symbol in self._latest_close_price:
-                    # In case we have gap in data, we will use the previous closing price for buy/sell
-                    current_price = self._latest_close_price[transaction.symbol]
                 else:
-                    logging.error("Trying to make a transaction on symbol {} on {} without any price data. Skipping "
-                                  "this transaction".format(transaction.symbol, current_day))
-                    continue
+                    logging.error("Trying to make a transaction on symbol {} on {} without any price data. "
+                                  "Skipping this transaction".format(transaction.symbol, current_day))
+                continue
 
             if force or self.is_valid_transaction(transaction, current_price):
                 logging.debug("{}ing amount {} on {} with price {}. Cash: {}".format(
                     transaction.get_action_name(), transaction.amount, transaction.symbol, transaction.price,
                     self._cash))
-                self.cash -= transaction.action * (transaction.amount * transaction.price + transaction.action *
-                                                   self.commission_calc_func(transaction))
-                if transaction.symbol not in self._position:
-                    self._position[transaction.symbol] = transaction.action * transaction.amount
-                else:
-                    self._position[transaction.symbol] += transaction.action * transaction.amount
-                self._transaction_history.append(transaction)
+                self._apply_transaction(transaction)
                 valid_transactions.append(transaction)
             else:
                 logging.error("Invalid transaction with reason shown above. Skipping this transaction.")
         return valid_transactions
 
+    def _apply_transaction(self, transaction):
+        self.cash -= transaction.action * (transaction.amount * transaction.price + transaction.action *
+                                           self.commission_calc_func(transaction))
+        if transaction.symbol not in self._position:
+            self._position[transaction.symbol] = transaction.action * transaction.amount
+        else:
+            self._position[transaction.symbol] += transaction.action * transaction.amount
+        self._transaction_history.append(transaction)
+
+    def make_trades_batch(self, market_data_cumulative, current_day, market_name, real_time_price=None, force=False):
+        """
+        Same as make_trades, but the transactions yielded by the strategy function for the day are collected first and
+        executed together by execute_orders. Use this when the strategy trades on many symbols every day.
+        Unlike make_trades, none of the transactions is executed while the strategy function is still yielding, so the
+        strategy only sees the position and the transaction history as they were at the start of the call. The result
+        is the same as make_trades only for strategies that do not read them again after yielding a transaction.
+        :return: the list of transactions that have been executed
+        """
+        if current_day < self._current_day:
+            raise ValueError("CAN NOT go backwards: Current day for the trader is {} but the date to make trade is {}"
+                             .format(date_to_string(self._current_day), date_to_string(current_day)))
+
+        self._current_day = current_day
+        orders = list(self._func(market_data_cumulative=market_data_cumulative, current_day=current_day,
+                                 position=self._position, cash=self.cash,
+                                 transaction_history=self._transaction_history,
+                                 market_name=market_name, real_time_price=real_time_price))
+        current_prices = [self._get_current_price(order.symbol, market_data_cumulative, current_day, real_time_price)
+                          for order in orders]
+        return self.execute_orders(orders, current_prices, current_day, force)
+
+    def execute_orders(self, orders, current_prices, current_day=None, force=False):
+        """
+        Validate and execute a batch of orders in one pass. The price bounds are checked on all the orders at once,
+        and if the cash after every order and the positions allow all the remaining orders to be filled in the given
+        order, they are applied together. Otherwise the orders are filled one by one in the given order, the same as
+        make_trades does. Instead of logging each skipped order, the number of skipped orders is logged by reason at
+        the end.
+        :param orders: a list of Transaction objects, in the order they should be executed
+        :param current_prices: a list of the current market price for each order. None if there is no price available
+        :param current_day: the datetime of the trading day, only used for logging
+        :param force: if True, the orders are executed one by one without checking price bounds, cash, or positions,
+        the same as make_trades does. A ValueError is raised as soon as an order takes the cash below zero
+        :return: the list of transactions that have been executed
+        """
+        if len(orders) == 0:
+            return []
+        if force:
+            return self._execute_forced(orders, current_prices, current_day)
+
+        count = len(orders)
+        actions = np.fromiter((order.action for order in orders), dtype=np.int64, count=count)
+        amounts = np.fromiter((order.amount for order in orders), dtype=np.int64, count=count)
+        prices = np.fromiter((order.price for order in orders), dtype=float, count=count)
+        commissions = np.fromiter((self.commission_calc_func(order) for order in orders), dtype=float, count=count)
+        market_prices = np.array([np.nan if price is None else price for price in current_prices], dtype=float)
+        symbols, symbol_codes = np.unique([order.symbol for order in orders], return_inverse=True)
+
+        rejected = np.zeros(count, dtype=np.int8)
+        rejected[np.isnan(market_prices)] = _NO_PRICE_DATA
+        rejected[(rejected == 0) & (actions > 0) & (prices < market_prices)] = _BUY_BELOW_MARKET
+        rejected[(rejected == 0) & (actions < 0) & (prices > market_prices)] = _SELL_ABOVE_MARKET
+
+        # cash -= action * (amount * price + action * commission), which is the cost plus commission for a buy, and
+        # the income minus commission for a sell
+        cash_deltas = -(actions * amounts * prices + actions * actions * commissions)
+        position_deltas = actions * amounts
+        start_positions = np.array([self._position.get(symbol, 0) for symbol in symbols], dtype=np.int64)
+
+        candidates = rejected == 0
+        if self._can_fill_all(candidates, cash_deltas, position_deltas, symbol_codes, start_positions):
+            filled = candidates
+        else:
+            filled = self._fill_in_order(candidates, actions, amounts, cash_deltas, symbol_codes, start_positions,
+                                         rejected)
+
+        self.cash = float(self._cash + cash_deltas[filled].sum())
+        end_positions = start_positions + np.bincount(symbol_codes[filled], weights=position_deltas[filled],
+                                                      minlength=len(symbols)).astype(np.int64)
+        for code in np.unique(symbol_codes[filled]):
+            self._position[symbols[code]] = int(end_positions[code])
+
+        valid_transactions = [orders[i] for i in np.flatnonzero(filled)]
+        self._transaction_history.extend(valid_transactions)
+        self._log_batch_result(valid_transactions, rejected, current_day)
+        return valid_transactions
+
+    def _execute_forced(self, orders, current_prices, current_day):
+        valid_transactions = []
+        rejected = np.zeros(len(orders), dtype=np.int8)
+        for i, (order, current_price) in enumerate(zip(orders, current_prices)):
+            if current_price is None:
+                rejected[i] = _NO_PRICE_DATA
+                continue
+            self._apply_transaction(order)
+            valid_transactions.append(order)
+        self._log_batch_result(valid_transactions, rejected, current_day)
+        return valid_transactions
+
+    def _can_fill_all(self, candidates, cash_deltas, position_deltas, symbol_codes, start_positions):
+        # Cash must never drop below zero after any order, and the position of a symbol must never drop below zero
+        # after a sell, when all the candidates are filled in the given order
+        cash_after = self._cash + np.cumsum(np.where(candidates, cash_deltas, 0))
+        if np.any(cash_after[candidates] < 0):
+            return False
+
+        sells = candidates & (position_deltas < 0)
+        if not np.any(sells):
+            return True
+        # Running positions per symbol: group the orders by symbol keeping their order, then take the cumulative sum
+        # within each group
+        order = np.argsort(symbol_codes, kind="stable")
+        sorted_codes = symbol_codes[order]
+        sorted_deltas = np.where(candidates, position_deltas, 0)[order]
+        running = np.cumsum(sorted_deltas)
+        group_starts = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]
+        group_bases = (running - sorted_deltas)[group_starts]
+        positions_after = np.empty_like(running)
+        positions_after[order] = running - group_bases[np.cumsum(group_starts) - 1] + start_positions[sorted_codes]
+        return not np.any(positions_after[sells] < 0)
+
+    def _fill_in_order(self, candidates, actions, amounts, cash_deltas, symbol_codes, start_positions, rejected):
+        filled = np.zeros(len(candidates), dtype=bool)
+        cash = self._cash
+        positions = start_positions.copy()
+        for i in np.flatnonzero(candidates):
+            if actions[i] > 0 and cash + cash_deltas[i] < 0:
+                rejected[i] = _NOT_ENOUGH_CASH
+                continue
+            if actions[i] < 0 and positions[symbol_codes[i]] < amounts[i]:
+                rejected[i] = _NOT_ENOUGH_POSITION
+                continue
+            cash += cash_deltas[i]
+            positions[symbol_codes[i]] += actions[i] * amounts[i]
+            filled[i] = True
+        return filled
+
+    @staticmethod
+    def _log_batch_result(valid_transactions, rejected, current_day):
+        day_text = date_to_string(current_day) if current_day is not None else "the current day"
+        counts = np.bincount(rejected, minlength=len(_SKIP_REASONS))
+        if counts[1:].sum() > 0:
+            logging.error("Skipped {} of {} transactions on {}: {}".format(
+                counts[1:].sum(), len(rejected), day_text,
+                ", ".join("{} {}".format(counts[code], _SKIP_REASONS[code])
+                          for code in range(1, len(_SKIP_REASONS)) if counts[code] > 0)))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for transaction in valid_transactions:
+                logging.debug("{}ing amount {} on {} with price {}".format(
+                    transaction.get_action_name(), transaction.amount, transaction.symbol, transaction.price))
+        logging.info("Executed {} of {} transactions on {}".format(len(valid_transactions), len(rejected), day_text))
+
+    def _get_current_price(self, symbol, market_data_cumulative, current_day, real_time_price=None):
+        if real_time_price is not None:
+            # If we are checking against real market data
+            if symbol in real_time_price:
+                return real_time_price[symbol][REALTIME_PRICE_KEY]
+            return None
+
+        # If we are only simulating a trade, then use the previous close price as realtime price
+        if symbol in market_data_cumulative[current_day]:
+            current_price = market_data_cumulative[current_day][symbol]["close"]
+            self._latest_close_price[symbol] = current_price
+            return current_price
+        # In case we have gap in data, we will use the previous closing price for buy/sell
+        return self._latest_close_price.get(symbol)
+
     def log_assets(self):
         logging.info("Total value of the trader {}: {} on day {}".format(self._name, self.get_total_value(),
                                                                          date_to_string(self._current_day)))
@@ -178,6 +333,9 @@ class Trader:
         return total_value
 
     def plot_performance(self):
+        # matplotlib takes a long time to import, so it is only imported when plotting
+        import matplotlib.pyplot as plt
+
         value_history = {}
         transaction_list = []
         for transaction in self._transaction_history:
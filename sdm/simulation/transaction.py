@@ -1,14 +1,44 @@
-from pydantic import BaseModel, field_validator, Field
 import datetime as dt
+import numbers
+
 from sdm.util.date_utils import datetime_to_string
 
 
-class Transaction(BaseModel):
-    amount: int = Field(description="the number of shares to be traded in the transaction", gt=0)
-    symbol: str
-    action: int
-    price: float = Field(description="price of the stock in the transaction", gt=0)
-    datetime: dt.datetime
+class Transaction:
+    __slots__ = ("amount", "symbol", "action", "price", "datetime")
+
+    def __init__(self, *, amount, symbol, action, price, datetime):
+        """
+        Initializer. The transaction is validated here instead of with a pydantic model, since strategies create many
+        of them and importing pydantic takes a long time.
+        :param amount: the number of shares to be traded in the transaction. Must be a positive integer
+        :param symbol: the symbol of the stock
+        :param action: 1 to buy, -1 to sell, or 0 to hold
+        :param price: price of the stock in the transaction. Must be positive
+        :param datetime: the datetime object of the transaction
+        """
+        if action not in [-1, 0, 1]:
+            raise ValueError("action given {} is invalid. Must be one of these: -1, 0, 1".format(action))
+        if isinstance(amount, bool) or not isinstance(amount, numbers.Real) or amount != int(amount) or amount <= 0:
+            raise ValueError("amount given {} is invalid. Must be a positive integer".format(amount))
+        if isinstance(price, bool) or not isinstance(price, numbers.Real) or not price > 0:
+            raise ValueError("price given {} is invalid. Must be a positive number".format(price))
+        if not isinstance(datetime, dt.datetime):
+            raise ValueError("datetime given {} is invalid. Must be a datetime object".format(datetime))
+        self.amount = int(amount)
+        self.symbol = str(symbol)
+        self.action = int(action)
+        self.price = float(price)
+        self.datetime = datetime
+
+    def __eq__(self, other):
+        if not isinstance(other, Transaction):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return "Transaction(amount={}, symbol={!r}, action={}, price={}, datetime={!r})".format(
+            self.amount, self.symbol, self.action, self.price, self.datetime)
 
     def get_action_name(self):
         return "buy" if self.action > 0 else "sell" if self.action < 0 else "hold"
@@ -25,10 +55,3 @@ class Transaction(BaseModel):
                 "symbol": self.symbol,
                 "amount": self.amount,
                 "price": self.price}
-
-    @field_validator("action")
-    @classmethod
-    def action(cls, action):
-        if action not in [-1, 0, 1]:
-            raise ValueError(f"action given {action} is invalid. Must be one of these: -1, 0, 1")
-        return action
@@ -0,0 +1,136 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.scanner import scan
+from sdm.master import StockDataMaster
+from sdm.operation.adjustment import AdjustmentStore, Action, derive_actions, find_split_fraction, ACTION_SPLIT, \
+    ACTION_DIVIDEND
+
+from collections import OrderedDict
+from fractions import Fraction
+import copy
+import os
+import tempfile
+import unittest
+
+import sdm.constants as c
+
+
+def add_actions(symbol_data, split_day, dividend_day, split=2):
+    """
+    Turn the prices before split_day into the raw prices of a split for 1, 2 for 1 by default, and add the adjusted
+    close of the split and of a 1% dividend on dividend_day
+    """
+    result = OrderedDict()
+    for i, (datetime, record) in enumerate(symbol_data.items()):
+        record = dict(record)
+        factor = 0.99 if i < dividend_day else 1
+        if i < split_day:
+            record.update({key: record[key] * split for key in ["open", "high", "low", "close"]})
+            record["volume"] = record["volume"] / split
+            factor /= split
+        record[c.ADJUSTED_CLOSE_KEY] = record["close"] * factor
+        result[datetime] = record
+    return result
+
+
+class TestAdjustment(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=3, years=1, seed=7)
+        self.raw = {symbol: add_actions(symbol_data, 100, 150) for symbol, symbol_data in self.data.items()}
+        self.dates = list(self.data["S0000"].keys())
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_derive_actions(self):
+        actions, start, end = derive_actions(self.raw["S0000"])
+        self.assertEqual((start, end), (self.dates[0], self.dates[-1]))
+        self.assertEqual([(action.datetime, action.kind) for action in actions],
+                         [(self.dates[100], ACTION_SPLIT), (self.dates[150], ACTION_DIVIDEND)])
+        self.assertAlmostEqual(actions[0].ratio, 0.5)
+        self.assertAlmostEqual(actions[1].ratio, 0.99)
+        self.assertEqual(derive_actions(self.data["S0000"]), ([], None, None))
+
+        # a 5 for 4 split is a split, even if it changes the prices less than a large dividend
+        actions, _, _ = derive_actions(add_actions(self.data["S0001"], 50, 0, split=1.25))
+        self.assertEqual(actions, [Action(self.dates[50], 0.8, ACTION_SPLIT)])
+        self.assertEqual(find_split_fraction(0.8333), Fraction(5, 6))
+        self.assertEqual(find_split_fraction(20.02), 20)
+        self.assertIsNone(find_split_fraction(0.9))
+        self.assertIsNone(find_split_fraction(0.99))
+
+    def test_adjust(self):
+        store = AdjustmentStore(os.path.join(self.directory.name, "daily.adjustments.json"))
+        self.assertEqual(store.update(self.raw), ["S0000", "S0001", "S0002"])
+        adjusted = store.adjust(copy.deepcopy(self.raw))
+        for symbol, symbol_data in adjusted.items():
+            for datetime, record in symbol_data.items():
+                expected = self.data[symbol][datetime]
+                self.assertAlmostEqual(record["close"], self.raw[symbol][datetime][c.ADJUSTED_CLOSE_KEY])
+                self.assertAlmostEqual(record["volume"], expected["volume"])
+                factor = 0.99 if datetime < self.dates[150] else 1
+                self.assertAlmostEqual(record["high"], expected["high"] * factor)
+
+        # the actions are read back from the file, and new data only changes the actions of its own symbol
+        store = AdjustmentStore(store.file_path)
+        self.assertEqual(len(store.get_actions("S0001")), 2)
+        recent = OrderedDict(list(self.raw["S0001"].items())[140:])
+        for record in recent.values():
+            record[c.ADJUSTED_CLOSE_KEY] = record["close"]
+        self.assertEqual(store.update({"S0001": recent, "S0002": self.raw["S0002"]}), ["S0001"])
+        self.assertEqual([action.kind for action in store.get_actions("S0001")], [ACTION_SPLIT])
+        self.assertEqual(len(store.get_actions("S0002")), 2)
+
+    def test_master(self):
+        sdm = StockDataMaster(self.directory.name)
+        sdm.save_data(copy.deepcopy(self.raw), "daily.db")
+        self.assertEqual(len(sdm.get_adjustment_store("daily.db").get_actions("S0002")), 2)
+        raw = sdm.load_data("daily.db")
+        adjusted = sdm.load_data("daily.db", adjusted=True)
+        self.assertAlmostEqual(raw["S0002"][self.dates[0]]["close"], self.raw["S0002"][self.dates[0]]["close"], 3)
+        self.assertAlmostEqual(adjusted["S0002"][self.dates[0]]["close"],
+                               self.raw["S0002"][self.dates[0]][c.ADJUSTED_CLOSE_KEY], 2)
+        sdm.save_data(copy.deepcopy(self.data), "daily.db", append=False)
+        self.assertEqual(sdm.get_adjustment_store("daily.db").get_actions("S0002"), [])
+
+    def test_append_days(self):
+        sdm = StockDataMaster(self.directory.name)
+        raw = copy.deepcopy(self.raw)
+        sdm.save_data({symbol: OrderedDict(list(symbol_data.items())[:100]) for symbol, symbol_data in raw.items()},
+                      "daily.db")
+        # the days are appended one at a time, as by close_day, so the day before each action is not saved with it
+        for day in range(100, len(self.dates)):
+            sdm.upsert_data({symbol: {self.dates[day]: dict(symbol_data[self.dates[day]])}
+                             for symbol, symbol_data in raw.items()}, "daily.db")
+        store = sdm.get_adjustment_store("daily.db")
+        self.assertEqual(store.get_actions("S0001"), derive_actions(self.raw["S0001"])[0])
+        self.assertEqual([action.kind for action in AdjustmentStore(store.file_path).get_actions("S0001")],
+                         [ACTION_SPLIT, ACTION_DIVIDEND])
+
+        loaded = sdm.load_data("daily.db")
+        adjusted = store.adjust(loaded)
+        self.assertAlmostEqual(adjusted["S0001"][self.dates[0]]["volume"], self.data["S0001"][self.dates[0]]["volume"])
+        # the data passed in is not changed
+        self.assertAlmostEqual(loaded["S0001"][self.dates[0]]["close"], self.raw["S0001"][self.dates[0]]["close"], 3)
+
+    def test_feature_cache(self):
+        sdm = StockDataMaster(self.directory.name)
+        sdm.save_data(copy.deepcopy(self.raw), "daily.db")
+        raw = sdm.load_data("daily.db")
+        adjusted = sdm.load_data("daily.db", adjusted=True)
+        expected = scan(adjusted, days=120)
+        self.assertNotEqual(scan(raw, days=120), expected)
+        # the tables of the raw data are not read for the adjusted data
+        scan(raw, days=120, feature_cache=sdm.get_feature_cache("daily.db"))
+        cache = sdm.get_feature_cache("daily.db", adjusted=True)
+        self.assertNotEqual(cache.directory, sdm.get_feature_cache("daily.db").directory)
+        self.assertEqual(scan(adjusted, days=120, feature_cache=cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+        sdm.upsert_data({"S0001": copy.deepcopy(self.raw["S0001"])}, "daily.db")
+        self.assertEqual(sorted(os.listdir(cache.directory)), ["S0000.npy", "S0002.npy", "columns.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+from sdm.benchmark.synthetic import generate_historical_data, generate_realtime_quotes
+from sdm.benchmark.suite import get_candlestick_detectors, measure, simulate
+from sdm.operation.validation import find_historical_violations, summarize_violations, RULE_GAP
+from sdm.util.market_utils import get_open_days
+
+import datetime as dt
+import unittest
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_synthetic_data(self):
+        data = generate_historical_data(symbols=20, years=1, market="nyse", gap_rate=0.5, seed=1)
+        self.assertEqual(data, generate_historical_data(symbols=20, years=1, market="nyse", gap_rate=0.5, seed=1))
+        self.assertEqual(len(data), 20)
+        open_days = get_open_days(dt.datetime(2020, 1, 1), dt.datetime(2020, 12, 31), "nyse")
+        self.assertEqual(max(len(symbol_data) for symbol_data in data.values()), len(open_days))
+        by_rule, by_symbol = summarize_violations(find_historical_violations(data, "nyse", 3))
+        self.assertEqual(list(by_rule.keys()), [RULE_GAP])
+        self.assertEqual(len(generate_realtime_quotes(5)), 5)
+
+    def test_measure(self):
+        data = generate_historical_data(symbols=3, years=1)
+        result = measure("simulation", lambda: simulate(data, "nasdaq"), 100)
+        self.assertEqual((result["name"], result["rows"]), ("simulation", 100))
+        self.assertGreater(result["peak_memory_mb"], 0)
+        self.assertIn("is_hammer", get_candlestick_detectors())
+        self.assertNotIn("is_three_window", get_candlestick_detectors())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+from sdm.api.fmp import FMPAPI
+from sdm.api.iex_cloud import IEXCloudAPI
+from sdm.util.columnar import *
+
+import datetime as dt
+import unittest
+
+import numpy as np
+
+
+def record(date, close, **kwargs):
+    return dict({"date": date, "open": close - 1, "high": close + 1, "low": close - 2, "close": close,
+                 "volume": 100}, **kwargs)
+
+
+DATES = ["2021-01-04", "2021-01-05", "2021-01-06", "2021-01-07", "2021-01-08"]
+DATETIMES = [dt.datetime(2021, 1, day) for day in [4, 5, 6, 7, 8]]
+
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [record(date, 10 + i) for i, date in enumerate(DATES)]
+
+    def test_parse_datetime_strings(self):
+        self.assertEqual(parse_datetime_strings(DATES).tolist(), DATETIMES)
+        self.assertEqual(parse_datetime_strings(["2021-01-04 13:47:00"]).tolist(), [dt.datetime(2021, 1, 4, 13, 47)])
+        self.assertEqual(parse_datetime_strings(["01/04/2021", "01/05/2021"], "%m/%d/%Y").tolist(), DATETIMES[:2])
+
+    def test_ascending_order(self):
+        dates = parse_datetime_strings(DATES)
+        order, duplicates = ascending_order(dates)
+        self.assertEqual((order.tolist(), duplicates.tolist()), ([0, 1, 2, 3, 4], []))
+        order, duplicates = ascending_order(dates[::-1])
+        self.assertEqual((order.tolist(), duplicates.tolist()), ([4, 3, 2, 1, 0], []))
+        order, duplicates = ascending_order(dates[[2, 0, 4, 1, 3]])
+        self.assertEqual((order.tolist(), duplicates.tolist()), ([1, 3, 0, 4, 2], []))
+        # the first of the duplicated dates is kept
+        order, duplicates = ascending_order(dates[[1, 0, 1, 2, 0]])
+        self.assertEqual((order.tolist(), duplicates.tolist()), ([1, 0, 3], [4, 2]))
+        self.assertEqual(ascending_order(dates[:0])[0].tolist(), [])
+
+    def test_records_to_historical(self):
+        for records in [self.records, self.records[::-1], [self.records[i] for i in [3, 0, 4, 2, 1]]]:
+            data, duplicates = records_to_historical(records, "date", drop_keys=["volume"])
+            self.assertEqual(list(data.keys()), DATETIMES)
+            self.assertEqual([values["close"] for values in data.values()], [10, 11, 12, 13, 14])
+            self.assertEqual(data[DATETIMES[0]], {"open": 9, "high": 11, "low": 8, "close": 10})
+            self.assertEqual(duplicates, [])
+
+        duplicate = record(DATES[2], 20)
+        data, duplicates = records_to_historical(self.records[::-1] + [duplicate, {"close": 1}], "date")
+        self.assertEqual(list(data.keys()), DATETIMES)
+        self.assertEqual(data[DATETIMES[2]]["close"], 12)
+        self.assertEqual(duplicates, [duplicate])
+
+    def test_date_range(self):
+        data, _ = records_to_historical(self.records[::-1], "date", dt.datetime(2021, 1, 5), dt.datetime(2021, 1, 7))
+        self.assertEqual(list(data.keys()), DATETIMES[1:4])
+        # a duplicate outside of the range is not reported
+        records = self.records + [record(DATES[0], 20)]
+        self.assertEqual(records_to_historical(records, "date", dt.datetime(2021, 1, 5))[1], [])
+        columns, _ = records_to_columns(records, "date", dt.datetime(2021, 1, 5), dt.datetime(2021, 1, 6))
+        self.assertEqual(columns[c.DATETIME_KEY].tolist(), DATETIMES[1:3])
+        self.assertEqual(list(columns_to_historical(columns).keys()), DATETIMES[1:3])
+
+    def test_records_to_columns(self):
+        records = [self.records[i] for i in [2, 0, 4, 1, 3]] + [dict(record(DATES[1], 20), close=None)]
+        records[0]["volume"] = "n/a"
+        columns, duplicates = records_to_columns(records, "date")
+        self.assertEqual(columns[c.DATETIME_KEY].dtype, np.dtype(DATETIME_UNIT))
+        self.assertEqual(columns[c.DATETIME_KEY].tolist(), DATETIMES)
+        np.testing.assert_array_equal(columns["close"], [10, 11, 12, 13, 14])
+        np.testing.assert_array_equal(columns["volume"], [100, 100, np.nan, 100, 100])
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(column_length(columns), 5)
+
+    def test_historical_round_trip(self):
+        data, _ = records_to_historical(self.records, "date")
+        columns = historical_to_columns(data)
+        self.assertEqual(set(columns), {c.DATETIME_KEY} | set(c.BASE_COLUMNS))
+        np.testing.assert_array_equal(columns["open"], [9, 10, 11, 12, 13])
+        self.assertEqual(columns_to_historical(columns), data)
+        self.assertTrue(np.isnan(historical_to_columns(data, ["adjClose"])["adjClose"]).all())
+        columns, _ = records_to_columns(self.records[::-1], "date")
+        self.assertEqual(columns_to_historical(columns), data)
+
+    def test_convert_historical_response(self):
+        fmp = FMPAPI("token", "nasdaq")
+        records = self.records[::-1] + [record(DATES[3], 20)]
+        with self.assertLogs(level="WARNING") as logs:
+            columns = fmp.convert_historical_response(records, as_columns=True, symbol="MSFT")
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Duplicate date 2021-01-07", logs.output[0])
+        self.assertIn("for symbol MSFT", logs.output[0])
+        self.assertEqual(columns[c.DATETIME_KEY].tolist(), DATETIMES)
+        np.testing.assert_array_equal(columns["close"], [10, 11, 12, 13, 14])
+        data = fmp.convert_historical_response(records, dt.datetime(2021, 1, 6))
+        self.assertEqual(list(data.keys()), DATETIMES[2:])
+        self.assertEqual(columns_to_historical(fmp.convert_historical_response(records, dt.datetime(2021, 1, 6),
+                                                                               as_columns=True)), data)
+
+        iex = IEXCloudAPI("token", "nasdaq")
+        records = [record(date, 10 + i, symbol="MSFT", label=date) for i, date in enumerate(DATES)][::-1]
+        with self.assertLogs(level="WARNING") as logs:
+            data = iex.convert_historical_response(records + [records[1]], end_date=dt.datetime(2021, 1, 7))
+        self.assertIn("for symbol MSFT", logs.output[0])
+        self.assertEqual(list(data.keys()), DATETIMES[:4])
+        self.assertEqual(data[DATETIMES[0]], {"open": 9, "high": 11, "low": 8, "close": 10, "volume": 100})
+        columns = iex.convert_historical_response(records, end_date=dt.datetime(2021, 1, 7), as_columns=True)
+        self.assertEqual(columns_to_historical(columns), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
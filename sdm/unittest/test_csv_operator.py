@@ -0,0 +1,128 @@
+from sdm.persistence.csv_operator import CSVOperator
+from sdm.persistence.partitioned_csv_operator import PartitionedCSVOperator
+
+from sdm.util.date_utils import datetime_to_string
+from sdm.util.misc_utils import enforce_precision
+
+from collections import OrderedDict
+import csv
+import datetime as dt
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import sdm.constants as c
+
+
+class TestCSVOperator(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._operator = CSVOperator(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_historical_round_trip(self):
+        data = {"MSFT": OrderedDict((dt.datetime(2020, 1, day), {"open": 1.23456, "close": 2, "volume": None})
+                                    for day in [2, 3, 6]),
+                "AAPL": OrderedDict([(dt.datetime(2020, 1, 2), {"open": 3.0, "close": 4.5, "volume": 100})])}
+        self._operator.save_to_file(data, "daily.csv", append=False)
+        self.assertEqual(data["AAPL"][dt.datetime(2020, 1, 2)], {"open": 3.0, "close": 4.5, "volume": 100})
+
+        loaded = self._operator.load_from_file("daily.csv")
+        self.assertEqual(list(loaded["MSFT"].keys()), list(data["MSFT"].keys()))
+        self.assertEqual(loaded["MSFT"][dt.datetime(2020, 1, 3)], {"open": 1.235, "close": 2.0, "volume": None})
+        loaded = self._operator.load_from_file("daily.csv", symbol="MSFT", start_date=dt.datetime(2020, 1, 3))
+        self.assertEqual(list(loaded.keys()), ["MSFT"])
+        self.assertEqual(list(loaded["MSFT"].keys()), [dt.datetime(2020, 1, 3), dt.datetime(2020, 1, 6)])
+
+    def test_same_output_as_dict_writer(self):
+        # the rows written record by record with csv.DictWriter and enforce_precision before the bulk writer
+        data = {"MSFT": OrderedDict((dt.datetime(2020, 1, day), {"open": 982.7855 + day, "close": np.float64(2.0005),
+                                                                 "volume": None, "extra": {"ratio": 0.1235}})
+                                    for day in [2, 3, 6]),
+                "AAPL": OrderedDict([(dt.datetime(2020, 1, 2), {"open": 1.0005, "close": 4, "volume": 100,
+                                                                "extra": [2.5555, "a"]})])}
+        expected_path = os.path.join(self._directory.name, "expected.csv")
+        with open(expected_path, "w", newline='') as f:
+            writer = csv.DictWriter(f, [c.SYMBOL_KEY, c.DATETIME_KEY, "open", "close", "volume", "extra"])
+            writer.writeheader()
+            for symbol, symbol_data in data.items():
+                for datetime, record in symbol_data.items():
+                    row = OrderedDict([(c.SYMBOL_KEY, symbol), (c.DATETIME_KEY, datetime_to_string(datetime))])
+                    row.update(record)
+                    writer.writerow(enforce_precision(row))
+
+        self._operator.save_to_file(data, "daily.csv", append=False)
+        with open(expected_path, "rb") as expected, open(os.path.join(self._directory.name, "daily.csv"), "rb") as f:
+            self.assertEqual(f.read(), expected.read())
+
+    def test_unordered_file_sorted(self):
+        with open(os.path.join(self._directory.name, "daily.csv"), "w") as f:
+            f.write("symbol,datetime,close,exchange\n"
+                    "MSFT,2020-01-06 00:00:00,3,NASDAQ\n"
+                    "MSFT,2020-01-02 00:00:00,1,NASDAQ\n"
+                    "\n"
+                    "MSFT,2020-01-03 00:00:00,2,NASDAQ\n")
+        loaded = self._operator.load_from_file("daily.csv")
+        self.assertEqual([record["close"] for record in loaded["MSFT"].values()], [1.0, 2.0, 3.0])
+        self.assertEqual(loaded["MSFT"][dt.datetime(2020, 1, 2)]["exchange"], "NASDAQ")
+
+    def test_string_columns_kept(self):
+        with open(os.path.join(self._directory.name, "daily.csv"), "w") as f:
+            f.write("symbol,datetime,close,cusip,code,ratio\n"
+                    "MSFT,2020-01-02 00:00:00,-1.5,0123,1_000,1e-05\n"
+                    "MSFT,2020-01-03 00:00:00,2,4567,12,\n")
+        loaded = self._operator.load_from_file("daily.csv")["MSFT"]
+        self.assertEqual(loaded[dt.datetime(2020, 1, 2)], {"close": -1.5, "cusip": "0123", "code": "1_000",
+                                                           "ratio": 1e-05})
+        self.assertEqual(loaded[dt.datetime(2020, 1, 3)], {"close": 2.0, "cusip": "4567", "code": "12",
+                                                           "ratio": None})
+
+    def test_realtime_round_trip(self):
+        data = {"MSFT": {"price": 10.5, "name": "Microsoft", "datetime": dt.datetime(2020, 1, 2, 10, 30)}}
+        self._operator.save_to_file(data, "realtime.csv", data_type="realtime", append=False)
+        loaded = self._operator.load_from_file("realtime.csv", data_type="realtime")
+        self.assertEqual(loaded, data)
+
+
+class TestPartitionedCSVOperator(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_partition_by_symbol_year(self):
+        operator = PartitionedCSVOperator(self._directory.name, "symbol_year")
+        data = {"MSFT": OrderedDict([(dt.datetime(2019, 12, 31), {"close": 1.0}),
+                                     (dt.datetime(2020, 1, 2), {"close": 2.0})]),
+                "AAPL": OrderedDict([(dt.datetime(2020, 1, 2), {"close": 3.0})])}
+        operator.save_to_file(data, "daily", append=False)
+        operator.save_to_file({"MSFT": OrderedDict([(dt.datetime(2020, 1, 3), {"close": 4.0})])}, "daily")
+
+        manifest = operator.load_manifest("daily")
+        self.assertEqual(manifest["partitions"][os.path.join("MSFT", "2020.csv")]["records"], 2)
+        self.assertEqual(sorted(operator.load_symbol_list("daily")), ["AAPL", "MSFT"])
+        self.assertEqual(operator.find_partitions(manifest, "MSFT", start_date=dt.datetime(2020, 1, 1)),
+                         [os.path.join("MSFT", "2020.csv")])
+
+        loaded = operator.load_from_file("daily", symbol="MSFT")
+        self.assertEqual(list(loaded.keys()), ["MSFT"])
+        self.assertEqual([record["close"] for record in loaded["MSFT"].values()], [1.0, 2.0, 4.0])
+        parallel_operator = PartitionedCSVOperator(self._directory.name, "symbol_year", processes=2)
+        self.assertEqual(parallel_operator.load_from_file("daily"), operator.load_from_file("daily"))
+
+        operator.save_to_file({"IBM": OrderedDict([(dt.datetime(2020, 1, 2), {"close": 5.0})])}, "daily", append=False)
+        self.assertEqual(list(operator.load_from_file("daily").keys()), ["IBM"])
+        self.assertFalse(os.path.exists(os.path.join(self._directory.name, "daily", "MSFT", "2020.csv")))
+        with self.assertRaises(ValueError):
+            PartitionedCSVOperator(self._directory.name, "symbol").save_to_file(data, "daily")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+from sdm.util.date_utils import *
+
+import datetime as dt
+import unittest
+
+
+class TestDateUtils(unittest.TestCase):
+
+    def test_timestamp_conversion(self):
+        # 2020-03-08 is when daylight saving time starts in Toronto, and 2020-11-01 is when it ends
+        timestamps = [0, 1583650800, 1583654400, 1604206800, 1604210400, 1604214000]
+        self.assertEqual(timestamps_to_datetimes(timestamps), [timestamp_to_datetime(ts) for ts in timestamps])
+        self.assertEqual(timestamp_to_datetime(1583650800), dt.datetime(2020, 3, 8, 3))
+        self.assertEqual(timestamp_to_datetime(1604206800), dt.datetime(2020, 11, 1, 1))
+        self.assertEqual(timestamp_to_datetime(1604210400), dt.datetime(2020, 11, 1, 1))
+
+    def test_datetime_round_trip(self):
+        datetimes = [dt.datetime(2020, 1, 2), dt.datetime(2020, 7, 2, 13, 47), dt.datetime(2020, 1, 2)]
+        timestamps = datetimes_to_timestamps(datetimes)
+        self.assertEqual(timestamps[0], 1577941200)
+        self.assertEqual(timestamps, [datetime_to_timestamp(datetime) for datetime in datetimes])
+        self.assertEqual(timestamps_to_datetimes(timestamps), datetimes)
+        self.assertEqual(datetime_to_timestamp(dt.datetime(2020, 11, 1, 1, 30)), 1604208600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.features import compute_feature_table, rsi, CandleFeatures
+from sdm.candlestick.pattern.trend import rsi as trend_rsi
+from sdm.candlestick.feature_cache import FeatureCache, table_to_columns
+from sdm.candlestick.scanner import scan
+from sdm.master import StockDataMaster
+
+from collections import OrderedDict
+import datetime as dt
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=10, years=1, seed=4)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_feature_table(self):
+        days = list(self.data["S0000"].values())
+        table = compute_feature_table(self.data["S0000"])
+        self.assertAlmostEqual(table["body"][5], abs(days[5]["close"] - days[5]["open"]))
+        self.assertEqual(table["up_window"][5], days[5]["low"] >= days[4]["high"])
+        self.assertAlmostEqual(table["return_5"][10], days[10]["close"] / days[5]["close"] - 1)
+        self.assertTrue(np.isnan(table["return_5"][4]))
+
+    def test_rsi(self):
+        for symbol_data in self.data.values():
+            days = list(symbol_data.values())
+            closes = np.array([day["close"] for day in days])
+            # rounded the same as trend.rsi, not only close to it
+            values = rsi(CandleFeatures({"close": closes}), 12)
+            self.assertEqual(values[12:].tolist(), [trend_rsi(days[i], days[i - 12:i], 12)
+                                                    for i in range(12, len(days))])
+        # an RSI of 5.485 is rounded up by the builtin round, but down to the even 5.48 by np.round
+        closes = [100.0, 105.485] + [10.969999999999999] * 11
+        self.assertEqual(rsi(CandleFeatures({"close": np.array(closes)}), 12)[-1], 5.49)
+        days = [{"close": close} for close in closes]
+        self.assertEqual(trend_rsi(days[-1], days[:-1], 12), 5.49)
+
+    def test_scan_with_cache(self):
+        cache = FeatureCache(os.path.join(self.directory.name, "features"))
+        expected = scan(self.data, days=30)
+        self.assertEqual(scan(self.data, days=30, feature_cache=cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (0, 10))
+        self.assertEqual(scan(self.data, days=30, feature_cache=cache), expected)
+        self.assertEqual((cache.hits, cache.misses), (10, 10))
+
+        # the days of a shorter range are taken from the table
+        shorter = OrderedDict(list(self.data["S0001"].items())[:-1])
+        table = cache.get_table("S0001", shorter)
+        self.assertEqual((cache.hits, cache.misses), (11, 10))
+        self.assertEqual(len(table), len(shorter))
+        columns = table_to_columns(table)
+        self.assertEqual(columns["datetime"].astype("datetime64[s]").tolist(), list(shorter.keys()))
+        np.testing.assert_array_equal(columns["white"], compute_feature_table(shorter)["white"])
+
+    def test_date_range(self):
+        cache = FeatureCache(os.path.join(self.directory.name, "features"))
+        middle = {symbol: OrderedDict(list(symbol_data.items())[50:150]) for symbol, symbol_data in self.data.items()}
+        self.assertEqual(scan(middle, days=30, feature_cache=cache), scan(middle, days=30))
+        self.assertEqual((cache.hits, cache.misses), (0, 10))
+        # the whole history replaces the tables of the range, and the range is then taken from them
+        self.assertEqual(scan(self.data, days=30, feature_cache=cache), scan(self.data, days=30))
+        self.assertEqual((cache.hits, cache.misses), (0, 20))
+        self.assertEqual(scan(middle, days=30, feature_cache=cache), scan(middle, days=30))
+        self.assertEqual((cache.hits, cache.misses), (10, 20))
+
+        # a range not in the table is computed, but does not replace the longer table saved
+        later = OrderedDict(list(self.data["S0001"].items())[100:])
+        later[max(later) + dt.timedelta(days=1)] = dict(next(reversed(later.values())))
+        self.assertEqual(len(cache.get_table("S0001", later)), len(later))
+        reopened = FeatureCache(cache.directory)
+        self.assertEqual(len(reopened.get_table("S0001", self.data["S0001"])), len(self.data["S0001"]))
+        self.assertEqual((reopened.hits, reopened.misses), (1, 0))
+
+    def test_invalidate_on_save(self):
+        sdm = StockDataMaster(self.directory.name, file_type="csv")
+        sdm.save_data(self.data, "historical.csv", append=False)
+        cache = sdm.get_feature_cache("historical.csv")
+        cache.get_tables(self.data)
+        self.assertEqual(len(self.list_tables(cache)), 10)
+        sdm.save_data({"S0002": self.data["S0002"]}, "historical.csv")
+        self.assertEqual(len(self.list_tables(cache)), 9)
+        self.assertNotIn("S0002.npy", self.list_tables(cache))
+        self.assertIs(sdm.get_feature_cache("historical.csv"), cache)
+        cache.get_tables(self.data)
+        self.assertEqual((cache.hits, cache.misses), (9, 11))
+        sdm.save_data(self.data, "historical.csv", append=False)
+        self.assertEqual(self.list_tables(cache), [])
+
+    @staticmethod
+    def list_tables(cache):
+        return [name for name in os.listdir(cache.directory) if name.endswith(".npy")]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+from sdm.benchmark.import_time import measure_import_time
+from sdm.simulation.transaction import Transaction
+from sdm.util import market_utils
+
+import datetime as dt
+import unittest
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_core_modules_without_heavy_dependencies(self):
+        result = measure_import_time()
+        self.assertEqual(result["heavy_modules"], [])
+        self.assertGreater(result["seconds"], 0)
+
+    def test_holidays_built_on_demand(self):
+        self.assertFalse(market_utils.is_open_day(dt.datetime(2020, 12, 25), "nasdaq"))
+        self.assertFalse(market_utils.is_open_day(dt.datetime(2020, 12, 28), "tsx"))
+        self.assertTrue(market_utils.is_open_day(dt.datetime(2020, 12, 28), "nasdaq"))
+        self.assertIn(dt.datetime(2020, 12, 25), market_utils.DEFAULT_CALENDAR)
+        self.assertIs(market_utils.CA_CALENDAR, market_utils.get_holidays("tsx"))
+
+    def test_transaction_validation(self):
+        transaction = Transaction(action=1, symbol="AAPL", amount=10.0, price=100, datetime=dt.datetime(2020, 1, 2))
+        self.assertEqual(transaction.amount, 10)
+        self.assertEqual(transaction, Transaction(action=1, symbol="AAPL", amount=10, price=100.0,
+                                                  datetime=dt.datetime(2020, 1, 2)))
+        for kwargs in [{"action": 2}, {"amount": 0}, {"amount": 1.5}, {"price": -1}, {"datetime": "2020-01-02"}]:
+            with self.assertRaises(ValueError):
+                Transaction(**dict(dict(action=1, symbol="AAPL", amount=10, price=100,
+                                        datetime=dt.datetime(2020, 1, 2)), **kwargs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+from sdm.util import instrumentation
+
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_collects_nothing(self):
+        with instrumentation.span(instrumentation.SPAN_LOAD):
+            instrumentation.count(instrumentation.COUNTER_ROWS_LOADED, 10)
+        self.assertEqual(instrumentation.get_report(), {"spans": {}, "counters": {}})
+
+    def test_report_and_profiles(self):
+        instrumentation.enable(profile_stages=[instrumentation.SPAN_PARSE])
+
+        @instrumentation.timed(instrumentation.SPAN_PARSE)
+        def parse(text):
+            return json.loads(text)
+
+        for _ in range(3):
+            parse("[1, 2, 3]")
+        instrumentation.count(instrumentation.COUNTER_REQUESTS)
+        instrumentation.count(instrumentation.COUNTER_BYTES_DOWNLOADED, 9)
+
+        report = instrumentation.get_report()
+        self.assertEqual(report["spans"][instrumentation.SPAN_PARSE]["calls"], 3)
+        self.assertEqual(report["counters"], {instrumentation.COUNTER_REQUESTS: 1,
+                                              instrumentation.COUNTER_BYTES_DOWNLOADED: 9})
+        with tempfile.TemporaryDirectory() as directory:
+            instrumentation.export_report(os.path.join(directory, "report.json"))
+            instrumentation.export_report(os.path.join(directory, "report.csv"))
+            with open(os.path.join(directory, "report.json")) as f:
+                self.assertEqual(json.load(f), report)
+            with open(os.path.join(directory, "report.csv")) as f:
+                self.assertEqual([row["name"] for row in csv.DictReader(f)],
+                                 [instrumentation.SPAN_PARSE, instrumentation.COUNTER_REQUESTS,
+                                  instrumentation.COUNTER_BYTES_DOWNLOADED])
+            files = instrumentation.export_profiles(os.path.join(directory, "profiles"))
+            self.assertEqual([os.path.basename(file) for file in files], ["parse.prof"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from sdm.benchmark.synthetic import generate_realtime_quotes
+from sdm.master import StockDataMaster
+from sdm.operation.intraday import IntradayBarAggregator, aggregate_quotes
+
+from collections import OrderedDict
+import datetime as dt
+import tempfile
+import unittest
+
+
+def aggregate(records, minutes):
+    bars = {}
+    for _, symbol, datetime, bar in aggregate_quotes(records, [minutes]):
+        bars.setdefault(symbol, OrderedDict())[datetime] = bar
+    return {symbol: OrderedDict(sorted(symbol_bars.items())) for symbol, symbol_bars in bars.items()}
+
+
+class TestIntraday(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.polls = []
+        for day in [4, 5]:
+            for i in range(20):
+                datetime = dt.datetime(2021, 1, day, 9, 30) + dt.timedelta(seconds=45 * i)
+                quotes = generate_realtime_quotes(symbols=4, datetime=datetime, seed=i + day * 100)
+                for quote in quotes.values():
+                    quote["volume"] = 1000 * day + 10 * i
+                self.polls.append(quotes)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_aggregator(self):
+        aggregator = IntradayBarAggregator(minutes=5)
+        self.assertIsNone(aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 31), {"price": 10, "volume": 100}))
+        self.assertIsNone(aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 33), {"price": 12, "volume": 130}))
+        self.assertIsNone(aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 34), {"price": 9}))
+        completed = aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 35), {"price": 11, "volume": 150})
+        self.assertEqual(completed, ("AAAA", dt.datetime(2021, 1, 4, 9, 30),
+                                     {"open": 10, "high": 12, "low": 9, "close": 9, "volume": 130}))
+        # a quote out of order is rejected before its volume is taken as the latest of the day
+        with self.assertRaises(ValueError):
+            aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 32), {"price": 11, "volume": 1000})
+        self.assertIsNone(aggregator.add_quote("AAAA", dt.datetime(2021, 1, 4, 9, 36), {"price": 11, "volume": 170}))
+        self.assertEqual(aggregator.flush(), [("AAAA", dt.datetime(2021, 1, 4, 9, 35),
+                                               {"open": 11, "high": 11, "low": 11, "close": 11, "volume": 40})])
+        # the first quote of a day adds the total volume of the day so far
+        aggregator.add_quote("AAAA", dt.datetime(2021, 1, 5, 9, 31), {"price": 11, "volume": 40})
+        self.assertEqual(aggregator.flush()[0][2]["volume"], 40)
+
+    def test_aggregate_quotes(self):
+        records = []
+        for day in [1, 2]:
+            for i in range(6):
+                datetime = dt.datetime(2021, 3, day, 10, 0, 0) + dt.timedelta(seconds=30 * i)
+                records.append(("AAAA", datetime, {"price": 10 + i, "volume": 100 * day + 10 * i}))
+                records.append(("BBBB", datetime, {"latestPrice": 20 - i, "volume": None}))
+                records.append(("CCCC", datetime, {"volume": 10}))
+        bars = aggregate(records, 1)
+        self.assertEqual(sorted(bars), ["AAAA", "BBBB"])
+        self.assertEqual(list(bars["AAAA"])[:3], [dt.datetime(2021, 3, 1, 10, 0), dt.datetime(2021, 3, 1, 10, 1),
+                                                  dt.datetime(2021, 3, 1, 10, 2)])
+        self.assertEqual(bars["AAAA"][dt.datetime(2021, 3, 1, 10, 1)],
+                         {"open": 12, "high": 13, "low": 12, "close": 13, "volume": 20})
+        self.assertEqual(bars["AAAA"][dt.datetime(2021, 3, 2, 10, 0)]["volume"], 210)
+        self.assertEqual(bars["BBBB"][dt.datetime(2021, 3, 1, 10, 2)]["low"], 15)
+        self.assertEqual(bars["BBBB"][dt.datetime(2021, 3, 1, 10, 2)]["volume"], 0)
+        self.assertEqual(len(aggregate(records, 5)["AAAA"]), 2)
+
+    def test_aggregate_saved_quotes(self):
+        sdm = StockDataMaster(self.directory.name, data_type="realtime")
+        for quotes in self.polls:
+            sdm.save_data({symbol: dict(quote) for symbol, quote in quotes.items()}, "realtime.db")
+        records = list(sdm.iterate_records("realtime.db", batch_size=7))
+        self.assertEqual(len(records), 160)
+        self.assertEqual([datetime for _, datetime, _ in records], sorted(datetime for _, datetime, _ in records))
+
+        file_names = sdm.aggregate_intraday_bars("realtime.db", minutes=[1, 5], batch_size=7)
+        self.assertEqual(file_names, {1: "realtime_1min.db", 5: "realtime_5min.db"})
+        for length, file_name in file_names.items():
+            self.assertEqual(sdm.load_data(file_name, "historical"), aggregate(records, length))
+        self.assertEqual(sdm.load_resampled_data("realtime.db", "5min", "nasdaq"),
+                         sdm.load_data("realtime_5min.db", "historical"))
+
+        # the same bars from the csv files loaded at once
+        csv_sdm = StockDataMaster(self.directory.name, file_type="csv", data_type="realtime")
+        for quotes in self.polls:
+            csv_sdm.save_data({symbol: dict(quote) for symbol, quote in quotes.items()}, "realtime.csv")
+        bars = {}
+        for length, symbol, datetime, bar in aggregate_quotes(csv_sdm.iterate_records("realtime.csv"), [5]):
+            bars.setdefault(symbol, {})[datetime] = bar
+        self.assertEqual(bars, sdm.load_data("realtime_5min.db", "historical"))
+        self.assertEqual(len(bars["S0000"]), 6)
+        self.assertEqual(sum(bar["volume"] for bar in bars["S0000"].values()), self.polls[19]["S0000"]["volume"] +
+                         self.polls[-1]["S0000"]["volume"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sdm.constants as c
+from sdm.master import StockDataMaster
+from sdm.operation.realtime_collector import RealtimeCollector
+
+import datetime as dt
+import tempfile
+import unittest
+
+
+class FakeAPI:
+
+    def __init__(self, snapshots):
+        self._snapshots = iter(snapshots)
+
+    def get_market(self):
+        return "nasdaq"
+
+    def get_realtime_quote_all(self):
+        return next(self._snapshots)
+
+
+def quote(price, minute):
+    return {"price": price, "volume": 100, "datetime": dt.datetime(2020, 1, 2, 10, minute)}
+
+
+class TestRealtimeCollector(unittest.TestCase):
+
+    def test_only_changed_quotes_saved(self):
+        snapshots = [{"AAPL": quote(100, 0), "MSFT": quote(50, 0)},
+                     {"AAPL": quote(100, 1), "MSFT": quote(51, 1)},
+                     {"AAPL": quote(101, 2), "MSFT": quote(51, 2), "IBM": quote(10, 2)}]
+        with tempfile.TemporaryDirectory() as directory:
+            sdm = StockDataMaster(file_path=directory, file_type="sql", data_type="realtime")
+            collector = RealtimeCollector(FakeAPI(snapshots), sdm, "quotes.db", poll_interval=0.01,
+                                          only_when_open=False)
+            collector.run(max_polls=3)
+
+            self.assertEqual(collector.get_latest_snapshot()["AAPL"]["price"], 101)
+            self.assertIn(c.DATETIME_KEY, collector.get_latest_snapshot()["AAPL"])
+            saved = sdm.load_data("quotes.db", start_date=dt.datetime(2019, 12, 31),
+                                  end_date=dt.datetime(2020, 1, 4))
+            self.assertEqual({symbol: record["price"] for symbol, record in saved.items()},
+                             {"AAPL": 101, "MSFT": 51, "IBM": 10})
+
+    def test_own_connection(self):
+        snapshots = [{"AAPL": quote(100 + i, i)} for i in range(3)]
+        with tempfile.TemporaryDirectory() as directory:
+            sdm = StockDataMaster(file_path=directory, file_type="sql", data_type="realtime")
+            # the caller keeps its own file open while the collector runs
+            sdm.open_connection("other.db")
+            connection = sdm._file_operator._connection
+            collector = RealtimeCollector(FakeAPI(snapshots), sdm, "quotes.db", poll_interval=0.01,
+                                          only_when_open=False)
+            collector.run(max_polls=3)
+            self.assertIs(sdm._file_operator._connection, connection)
+            sdm.save_data({"MSFT": quote(50, 0)}, "other.db")
+            sdm.close_connection()
+            self.assertEqual(len(list(sdm.iterate_records("quotes.db"))), 3)
+            self.assertEqual(len(list(sdm.iterate_records("other.db"))), 1)
+
+    def test_diff_snapshots_ignores_datetime(self):
+        self.assertEqual(RealtimeCollector.diff_snapshots({"AAPL": quote(100, 0)}, {"AAPL": quote(100, 5)}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.render import build_candlestick_figure, downsample_columns, render_charts
+from sdm.candlestick.scanner import scan
+from sdm.util.columnar import historical_to_columns
+
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=6, years=2, seed=5)
+        self.columns = historical_to_columns(self.data["S0000"])
+
+    def test_downsample(self):
+        columns = {key: values[:10] for key, values in self.columns.items()}
+        chart = downsample_columns(columns, 4)
+        self.assertEqual(len(chart["datetime"]), 4)
+        np.testing.assert_array_equal(chart["datetime"], columns["datetime"][[0, 3, 6, 9]])
+        self.assertEqual(chart["high"][1], columns["high"][3:6].max())
+        self.assertEqual(chart["low"][3], columns["low"][9])
+        self.assertEqual((chart["open"][1], chart["close"][1]), (columns["open"][3], columns["close"][5]))
+        self.assertIs(downsample_columns(columns, 10), columns)
+
+    def test_figure(self):
+        datetimes = list(self.data["S0000"].keys())
+        hits = datetimes[::5] + [datetimes[0].replace(year=1990)]
+        figure = build_candlestick_figure("S0000", self.columns, hits, "Hammer", max_points=100, max_shapes=20)
+        go.Figure(figure)
+        self.assertLessEqual(len(figure["data"][0]["x"]), 100)
+        self.assertEqual(len(figure["layout"]["shapes"]), 20)
+        self.assertTrue(all(shape["x0"] in figure["data"][0]["x"] for shape in figure["layout"]["shapes"]))
+        figure = build_candlestick_figure("S0000", self.columns, hits, max_points=None, max_shapes=None)
+        self.assertEqual(len(figure["data"][0]["x"]), len(datetimes))
+        self.assertEqual(len(figure["layout"]["shapes"]), len(datetimes[::5]))
+
+    def test_render_charts(self):
+        hits = scan(self.data, days=100)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = render_charts(self.data, hits, directory, days=200, processes=2)
+            self.assertEqual(sorted(paths), sorted(os.path.join(directory, symbol + ".html") for symbol in hits))
+            self.assertEqual(sorted(os.listdir(directory)), sorted(["plotly.min.js"] +
+                                                                    [symbol + ".html" for symbol in hits]))
+            with open(paths[0]) as f:
+                self.assertIn('src="plotly.min.js"', f.read())
+        with self.assertRaises(ValueError):
+            render_charts(self.data, hits, directory, formats=["svg"])
+        if importlib.util.find_spec("kaleido") is None:
+            with self.assertRaises(ValueError):
+                render_charts(self.data, hits, directory, formats=["png"])
+
+
+if __name__ == '__main__':
+    unittest.main()
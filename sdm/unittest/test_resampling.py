@@ -0,0 +1,77 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.master import StockDataMaster
+from sdm.operation.resampling import resample_historical, parse_frequency
+
+from collections import OrderedDict
+import datetime as dt
+import os
+import tempfile
+import unittest
+
+
+class TestResampling(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=5, years=1, seed=8)
+
+    def test_weekly(self):
+        weekly = resample_historical(self.data, "weekly", "nasdaq")
+        for symbol, symbol_data in self.data.items():
+            weeks = OrderedDict()
+            for datetime, record in symbol_data.items():
+                weeks.setdefault(datetime.isocalendar()[:2], []).append(record)
+            self.assertEqual(len(weekly[symbol]), len(weeks))
+            for bar, records in zip(weekly[symbol].values(), weeks.values()):
+                self.assertEqual(bar["open"], records[0]["open"])
+                self.assertEqual(bar["high"], max(record["high"] for record in records))
+                self.assertEqual(bar["low"], min(record["low"] for record in records))
+                self.assertEqual(bar["close"], records[-1]["close"])
+                self.assertAlmostEqual(bar["volume"], sum(record["volume"] for record in records))
+        # a week starting with a holiday is dated on its first open day
+        self.assertIn(dt.datetime(2020, 1, 21), weekly["S0000"])
+        self.assertIn(dt.datetime(2020, 1, 27), weekly["S0000"])
+
+    def test_monthly(self):
+        monthly = resample_historical(self.data, "monthly", "nasdaq")
+        self.assertEqual(list(monthly["S0001"])[:3], [dt.datetime(2020, 1, 2), dt.datetime(2020, 2, 3),
+                                                      dt.datetime(2020, 3, 2)])
+        january = [record for datetime, record in self.data["S0001"].items() if datetime.month == 1]
+        self.assertEqual(monthly["S0001"][dt.datetime(2020, 1, 2)]["close"], january[-1]["close"])
+
+    def test_missing_volume(self):
+        symbol_data = OrderedDict((dt.datetime(2020, 1, day), dict(open=1, high=2, low=1, close=2, volume=10))
+                                  for day in [6, 7, 8, 13, 14])
+        symbol_data[dt.datetime(2020, 1, 7)]["volume"] = None
+        for day in [13, 14]:
+            symbol_data[dt.datetime(2020, 1, day)]["volume"] = None
+        weekly = resample_historical({"AAAA": symbol_data}, "weekly", "nasdaq")["AAAA"]
+        self.assertEqual(weekly[dt.datetime(2020, 1, 6)]["volume"], 20)
+        self.assertIsNone(weekly[dt.datetime(2020, 1, 13)]["volume"])
+
+    def test_parse_frequency(self):
+        self.assertEqual(parse_frequency("5min"), 5)
+        self.assertIsNone(parse_frequency("weekly"))
+        with self.assertRaises(ValueError):
+            parse_frequency("hourly")
+
+    def test_load_resampled_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sdm = StockDataMaster(directory)
+            sdm.save_data(self.data, "daily.db")
+            weekly = sdm.load_resampled_data("daily.db", "weekly", "nasdaq")
+            self.assertEqual(weekly, sdm.load_data("daily_weekly.db"))
+            self.assertEqual(len(weekly["S0002"]), len(resample_historical(self.data, "weekly", "nasdaq")["S0002"]))
+            modified = os.path.getmtime(os.path.join(directory, "daily_weekly.db"))
+            self.assertEqual(sdm.load_resampled_data("daily.db", "weekly", "nasdaq", symbol="S0002"),
+                             {"S0002": weekly["S0002"]})
+            self.assertEqual(os.path.getmtime(os.path.join(directory, "daily_weekly.db")), modified)
+
+            # the resampled dataset is made again after the daily data is saved
+            sdm.save_data({"S0002": OrderedDict([(dt.datetime(2021, 1, 4), dict(open=1, high=2, low=1, close=2,
+                                                                                volume=10))])}, "daily.db")
+            weekly = sdm.load_resampled_data("daily.db", "weekly", "nasdaq")
+            self.assertEqual(weekly["S0002"][dt.datetime(2021, 1, 4)]["close"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
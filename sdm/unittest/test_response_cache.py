@@ -0,0 +1,58 @@
+from sdm.api.fmp import FMPAPI
+from sdm.api.response_cache import ResponseCache
+import sdm.constants as c
+
+import tempfile
+import time
+import unittest
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_token_stripped_from_key(self):
+        self.assertEqual(ResponseCache.normalize_url("https://A.com/v3/quote/MSFT?to=2&apikey=abc&from=1"),
+                         ResponseCache.normalize_url("https://a.com/v3/quote/MSFT?from=1&to=2&apikey=xyz"))
+        self.assertEqual(ResponseCache.normalize_url("https://a.com/v1/ref-data/symbols?token=abc"),
+                         "https://a.com/v1/ref-data/symbols")
+
+    def test_get_put_and_expire(self):
+        cache = ResponseCache(self._directory.name)
+        cache.put("https://a.com/list?apikey=1", '[{"symbol": "MSFT"}]')
+        cache.put("https://a.com/quote?apikey=1", "[]", ttl=0)
+        cache.put("https://a.com/old?apikey=1", "[]", ttl=-1)
+        self.assertEqual(cache.get("https://a.com/list?apikey=2"), '[{"symbol": "MSFT"}]')
+        self.assertIsNone(cache.get("https://a.com/quote?apikey=1"))
+        self.assertIsNone(cache.get("https://a.com/old?apikey=1"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.close()
+
+    def test_least_recently_used_evicted(self):
+        cache = ResponseCache(self._directory.name, max_size=50)
+        cache.put("https://a.com/1", "1" * 1000)
+        time.sleep(0.01)
+        cache.put("https://a.com/2", "2" * 1000)
+        time.sleep(0.01)
+        cache.get("https://a.com/1")
+        time.sleep(0.01)
+        cache.put("https://a.com/3", "3" * 1000)
+        self.assertIsNone(cache.get("https://a.com/2"))
+        self.assertIsNotNone(cache.get("https://a.com/3"))
+        cache.close()
+
+    def test_fmp_ttl(self):
+        fmp = FMPAPI("token", "nasdaq")
+        self.assertIsNone(fmp._get_cache_ttl("historical-price-full/MSFT?from=2020-01-01&to=2020-12-31&apikey=1"))
+        # without the end date, the response runs up to the latest day
+        self.assertEqual(fmp._get_cache_ttl("historical-price-full/MSFT?from=2020-01-01&apikey=1"),
+                         c.RESPONSE_CACHE_RECENT_TTL)
+        self.assertEqual(fmp._get_cache_ttl("batch-request-end-of-day-prices?apikey=1"), c.RESPONSE_CACHE_RECENT_TTL)
+
+
+if __name__ == '__main__':
+    unittest.main()
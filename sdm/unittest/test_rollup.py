@@ -0,0 +1,73 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.master import StockDataMaster
+from sdm.operation.rollup import rollup_quotes, close_day
+from sdm.simulation.market import Market
+
+import datetime as dt
+import tempfile
+import unittest
+
+
+class TestRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.date = dt.datetime(2021, 1, 4)
+        self.polls = []
+        for i, price in enumerate([10, 12, 9, 11]):
+            datetime = self.date + dt.timedelta(hours=10, minutes=i)
+            self.polls.append({"S0000": {"price": price, "open": 10.5, "dayHigh": 12.5, "dayLow": 9.5,
+                                         "volume": 100 * (i + 1), "datetime": datetime},
+                               "S0001": {"latestPrice": 20 + i, "volume": 50 * (i + 1) if i < 3 else None,
+                                         "datetime": datetime},
+                               "S0002": {"price": -1, "volume": 10, "datetime": datetime}})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rollup_quotes(self):
+        records = [(symbol, quote["datetime"], quote) for quotes in self.polls for symbol, quote in quotes.items()]
+        bars = rollup_quotes(records)
+        self.assertEqual(bars["S0000"], {"open": 10.5, "high": 12.5, "low": 9, "close": 11, "volume": 400})
+        self.assertEqual(bars["S0001"], {"open": 20, "high": 23, "low": 20, "close": 23, "volume": 150})
+
+    def test_close_day(self):
+        sdm = StockDataMaster(self.directory.name)
+        historical = generate_historical_data(symbols=3, years=1, seed=9)
+        sdm.save_data({symbol: dict(symbol_data) for symbol, symbol_data in historical.items()}, "daily.db")
+        for quotes in self.polls:
+            sdm.save_data({symbol: dict(quote) for symbol, quote in quotes.items()}, "realtime.db", "realtime")
+        # quotes of the next day are not rolled up
+        sdm.save_data({"S0000": {"price": 50, "datetime": self.date + dt.timedelta(days=1, hours=10)}}, "realtime.db",
+                      "realtime")
+
+        market = Market(historical, "nasdaq", self.date, dt.datetime(2021, 1, 8))
+        sdm.save_data({"S0001": {self.date: {"open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}}}, "daily.db")
+        bars = close_day(sdm, "realtime.db", "daily.db", "nasdaq", date=self.date, market=market)
+        self.assertEqual(list(bars), ["S0000", "S0001"])
+        self.assertEqual(bars["S0000"]["close"], 11)
+
+        # the bar saved before is replaced, and the invalid one is not saved
+        saved = sdm.load_data("daily.db", start_date=self.date)
+        self.assertEqual(saved["S0001"][self.date]["close"], 23)
+        self.assertEqual(saved["S0000"][self.date]["volume"], 400)
+        self.assertNotIn("S0002", saved)
+        self.assertEqual(len(sdm.load_data("daily.db", symbol="S0001")["S0001"]), len(historical["S0001"]) + 1)
+
+        self.assertTrue(market.has_data_for_date(self.date))
+        self.assertEqual(market.get_current_day(), self.date + dt.timedelta(days=1))
+        with self.assertRaises(ValueError):
+            close_day(sdm, "realtime.db", "daily.db", "nasdaq", date=self.date, market=market)
+        with self.assertRaises(ValueError):
+            close_day(sdm, "realtime.db", "daily.db", "nasdaq", date=dt.datetime(2021, 1, 2))
+
+    def test_close_day_csv(self):
+        sdm = StockDataMaster(self.directory.name, file_type="csv")
+        # the check is done before the quotes are read
+        sdm.iterate_records = None
+        with self.assertRaisesRegex(ValueError, "sql"):
+            close_day(sdm, "realtime.csv", "daily.csv", "nasdaq", date=self.date)
+
+
+if __name__ == '__main__':
+    unittest.main()
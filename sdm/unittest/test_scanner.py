@@ -0,0 +1,68 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.scanner import scan, scan_arrays, find_symbols, PATTERNS, BULLISH
+from sdm.candlestick.streaming import get_detectors, call_detector
+
+from collections import OrderedDict
+import datetime as dt
+import random
+import unittest
+
+DAYS = 180
+
+
+def make_volatile_data(symbols, days, seed=0):
+    # prices jumping a lot between days and many bodies close to zero, so every pattern is printed several times
+    rnd = random.Random(seed)
+    data = {}
+    for symbol in range(symbols):
+        symbol_data = OrderedDict()
+        price = 100.0
+        for day in range(days):
+            price = max(price + rnd.gauss(0, 4), 10)
+            open_price = round(price + rnd.uniform(-3, 3), 2)
+            close_price = round(open_price + rnd.uniform(-0.05, 0.05) if rnd.random() < 0.2 else
+                                price + rnd.uniform(-3, 3), 2)
+            symbol_data[dt.datetime(2020, 1, 1) + dt.timedelta(days=day)] = {
+                "open": open_price, "close": close_price, "volume": 1000,
+                "high": round(max(open_price, close_price) + rnd.expovariate(2), 2),
+                "low": round(min(open_price, close_price) - rnd.expovariate(2), 2)}
+        data["S{}".format(symbol)] = symbol_data
+    return data
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=30, years=1, seed=3)
+
+    def test_same_as_original_functions(self):
+        data = make_volatile_data(50, 200, seed=4)
+        data["SHORT"] = OrderedDict(list(data["S0"].items())[:15])
+        symbols, datetimes, names, hits = scan_arrays(data, days=DAYS)
+        self.assertEqual(names, list(PATTERNS.keys()))
+        for col, name in enumerate(names):
+            func = get_detectors([name])[name]
+            found = 0
+            for row, symbol in enumerate(symbols):
+                days = list(data[symbol].values())
+                expected = [bool(call_detector(func, days, i)) for i in range(max(len(days) - DAYS, 0), len(days))]
+                self.assertEqual(hits[row, col, DAYS - len(expected):].tolist(), expected, name)
+                self.assertFalse(hits[row, col, :DAYS - len(expected)].any())
+                found += sum(expected)
+            self.assertGreater(found, 0, name)
+
+    def test_scan(self):
+        hits = scan(self.data, days=DAYS, patterns=["hammer", "doji", "down_trend"])
+        self.assertEqual(hits, scan(self.data, days=DAYS, patterns=["hammer", "doji", "down_trend"], processes=2))
+        for symbol, patterns in hits.items():
+            for name, dates in patterns.items():
+                self.assertTrue(all(date in self.data[symbol] for date in dates))
+        bullish = find_symbols(hits, BULLISH)
+        self.assertEqual(bullish, sorted(symbol for symbol, patterns in hits.items() if "hammer" in patterns))
+        self.assertTrue(set(find_symbols(hits, BULLISH, trend="down_trend")).issubset(bullish))
+        with self.assertRaises(ValueError):
+            scan(self.data, patterns=["unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
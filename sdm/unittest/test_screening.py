@@ -0,0 +1,64 @@
+from sdm.benchmark.synthetic import generate_historical_data
+from sdm.candlestick.pattern.trend import rsi
+from sdm.master import StockDataMaster
+from sdm.operation.screening import screen, compute_metrics
+
+import sqlite3
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import sdm.constants as c
+
+
+class TestScreening(unittest.TestCase):
+
+    def setUp(self):
+        self.data = generate_historical_data(symbols=20, years=1, seed=6)
+        self.dates = list(self.data["S0000"].keys())
+        self.date = self.dates[-10]
+
+    def test_metrics(self):
+        result = screen(self.data, self.date, metrics=["close", "return_5", "atr_3", "rsi_12", "volume_ratio_4"],
+                        sort_by="close")
+        days = [record for datetime, record in self.data["S0000"].items() if datetime <= self.date]
+        metrics = result["S0000"]
+        self.assertEqual(metrics["close"], days[-1]["close"])
+        self.assertAlmostEqual(metrics["return_5"], days[-1]["close"] / days[-6]["close"] - 1)
+        true_ranges = [max(day["high"] - day["low"], abs(day["high"] - prev["close"]), abs(day["low"] - prev["close"]))
+                       for prev, day in zip(days[-4:-1], days[-3:])]
+        self.assertAlmostEqual(metrics["atr_3"], sum(true_ranges) / 3)
+        self.assertAlmostEqual(metrics["rsi_12"], rsi(days[-1], days[-13:-1]), places=6)
+        average_volume = sum(day["volume"] for day in days[-5:-1]) / 4
+        self.assertAlmostEqual(metrics["volume_ratio_4"], days[-1]["volume"] / average_volume)
+
+    def test_rank_and_filter(self):
+        result = screen(self.data, self.date, sort_by="return_20", filters={"volume": (None, 1e12), "rsi_14": (30, 70)},
+                        top=5)
+        self.assertLessEqual(len(result), 5)
+        returns = [metrics["return_20"] for metrics in result.values()]
+        self.assertEqual(returns, sorted(returns, reverse=True))
+        everything = screen(self.data, self.date, metrics=["return_20", "rsi_14"], top=None)
+        expected = [symbol for symbol, metrics in everything.items() if 30 <= metrics["rsi_14"] <= 70][:5]
+        self.assertEqual(list(result), expected)
+        # a symbol without enough days is not ranked, and one without data on the date is skipped
+        self.assertEqual(len(screen(self.data, self.dates[10], sort_by="return_20")), 0)
+        with self.assertRaises(ValueError):
+            compute_metrics({column: np.ones((1, 6)) for column in c.BASE_COLUMNS}, ["momentum_5"])
+
+    def test_master_screen(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sdm = StockDataMaster(directory)
+            sdm.save_data(self.data, "daily.db")
+            result = sdm.screen("daily.db", self.date, "nasdaq", filters={"volume": (0, None)}, top=10)
+            self.assertEqual(result, screen(self.data, self.date, filters={"volume": (0, None)}, top=10))
+            with sqlite3.connect(os.path.join(directory, "daily.db")) as conn:
+                plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM {} WHERE {} between 0 and 1".format(
+                    c.TABLE_NAME, c.TIMESTAMP_COLUMN)).fetchall()
+            self.assertIn(c.TIMESTAMP_INDEX_NAME, str(plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
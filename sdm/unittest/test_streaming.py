@@ -0,0 +1,50 @@
+from sdm.benchmark.synthetic import generate_historical_data, generate_realtime_quotes
+from sdm.candlestick.scanner import scan, BULLISH
+from sdm.candlestick.streaming import StreamingPatternDetector, PatternEvent, quote_to_bar
+
+import datetime as dt
+import unittest
+
+
+class TestStreamingPatternDetector(unittest.TestCase):
+
+    def test_same_as_scanner(self):
+        data = generate_historical_data(symbols=10, years=1, seed=2)
+        received = []
+        detector = StreamingPatternDetector(on_event=received.append)
+        events = []
+        for symbol, symbol_data in data.items():
+            for datetime, bar in symbol_data.items():
+                events.extend(detector.add_bar(symbol, datetime, bar))
+        self.assertEqual(events, received)
+        self.assertEqual(len(detector.get_latest_bars("S0000")), 21)
+
+        days = max(len(symbol_data) for symbol_data in data.values())
+        expected = {(symbol, datetime, pattern) for symbol, patterns in scan(data, days=days).items()
+                    for pattern, datetimes in patterns.items() for datetime in datetimes}
+        self.assertEqual({(event.symbol, event.datetime, event.pattern) for event in events}, expected)
+
+    def test_snapshot(self):
+        data = generate_historical_data(symbols=5, years=1, end_date=dt.datetime(2020, 12, 31))
+        detector = StreamingPatternDetector(patterns=["hammer", "long_white"])
+        detector.load_history(data)
+        self.assertEqual(list(detector.get_latest_bars("S0000").items()), list(data["S0000"].items())[-2:])
+
+        quote = {"open": 10, "dayHigh": 21, "dayLow": 9.9, "price": 20, "volume": 100}
+        self.assertEqual(quote_to_bar(quote), {"open": 10, "high": 21, "low": 9.9, "close": 20, "volume": 100})
+        self.assertIsNone(quote_to_bar({"open": 10, "price": 20}))
+        events = detector.add_snapshot({"S0000": quote}, datetime=dt.datetime(2021, 1, 4))
+        self.assertEqual(events, [PatternEvent("S0000", dt.datetime(2021, 1, 4), "long_white", BULLISH)])
+        # an updated bar of the same day replaces the previous one
+        self.assertEqual(detector.add_snapshot({"S0000": dict(quote, price=10.01)}, datetime=dt.datetime(2021, 1, 4)),
+                         [])
+        detector.add_snapshot(generate_realtime_quotes(5, dt.datetime(2021, 1, 5)))
+        self.assertEqual(next(reversed(detector.get_latest_bars("S0001"))), dt.datetime(2021, 1, 5))
+        with self.assertRaises(ValueError):
+            detector.add_bar("S0000", dt.datetime(2021, 1, 1), data["S0000"][next(reversed(data["S0000"]))])
+        with self.assertRaises(ValueError):
+            StreamingPatternDetector(patterns=["unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
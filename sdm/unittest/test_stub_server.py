@@ -0,0 +1,63 @@
+from sdm.api.fmp import FMPAPI
+from sdm.api.iex_cloud import IEXCloudAPI
+from sdm.api.response_cache import ResponseCache
+from sdm.benchmark.stub_server import StubProviderServer
+
+import datetime as dt
+import tempfile
+import unittest
+
+
+class TestStubServer(unittest.TestCase):
+
+    def test_fmp_and_iex_endpoints(self):
+        with StubProviderServer(symbols=150) as server:
+            fmp = FMPAPI("token", "nasdaq", base_url=server.fmp_base_url)
+            self.assertEqual(sorted(fmp.get_symbol_list()), server.get_symbols())
+            start_date = dt.datetime.today() - dt.timedelta(days=30)
+            data = fmp.get_daily_historical_per_symbol("S0001", start_date)["S0001"]
+            self.assertTrue(all(datetime >= start_date for datetime in data))
+            self.assertEqual(list(data.keys()), sorted(data.keys()))
+            self.assertEqual(len(fmp.get_realtime_quote_all()), 150)
+
+            iex = IEXCloudAPI("token", "nasdaq", base_url=server.iex_base_url)
+            self.assertEqual(len(iex.get_realtime_quote_all()), 150)
+            self.assertEqual(server.requests["iex_batch"], 2)
+
+    def test_missing_days(self):
+        with StubProviderServer(symbols=3) as server:
+            fmp = FMPAPI("token", "nasdaq", base_url=server.fmp_base_url)
+            start_date = dt.datetime.today() - dt.timedelta(days=30)
+            data = fmp.get_daily_historical_per_symbol("S0001", start_date)
+            data.update(fmp.get_daily_historical_per_symbol("S0002", start_date))
+            datetimes = list(data["S0001"].keys())
+            missing = datetimes[3:5] + datetimes[10:11]
+            records = {datetime: data["S0001"].pop(datetime) for datetime in missing}
+            requests = server.requests["fmp_historical"]
+
+            result = fmp.get_daily_historical_missing(data)
+            self.assertEqual(list(result.keys()), ["S0001"])
+            self.assertEqual(result["S0001"], records)
+            self.assertEqual(list(result["S0001"].keys()), missing)
+            self.assertEqual(server.requests["fmp_historical"], requests + 1)
+            self.assertEqual(len(data["S0001"]), len(datetimes) - 3)
+
+    def test_retries_and_cache(self):
+        # with seed 6 the fifth request answered fails, and the retries have to wait for the rate limit
+        server = StubProviderServer(symbols=5, rate_limit=3, retry_after=0.6, error_rate=0.2, seed=6)
+        with server, tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(directory)
+            fmp = FMPAPI("token", "nasdaq", base_url=server.fmp_base_url, response_cache=cache)
+            end_date = dt.datetime.today() - dt.timedelta(days=10)
+            for _ in range(2):
+                for symbol in server.get_symbols():
+                    self.assertIn(symbol, fmp.get_daily_historical_per_symbol(symbol, end_date=end_date))
+            self.assertEqual(server.errors, 1)
+            self.assertGreater(server.rate_limited, 0)
+            self.assertEqual(server.requests["fmp_historical"], 5)
+            self.assertEqual(cache.hits, 5)
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+from sdm.simulation.trader import Trader
+from sdm.simulation.transaction import Transaction
+
+import datetime as dt
+import unittest
+
+TODAY = dt.datetime(2020, 1, 2)
+MARKET_DATA = {TODAY: {"AAPL": {"close": 100.0}, "MSFT": {"close": 50.0}}}
+
+
+def make_strategy(orders):
+    def strategy(**kwargs):
+        for order in orders:
+            yield order
+    return strategy
+
+
+def order(action, symbol, amount, price):
+    return Transaction(action=action, symbol=symbol, amount=amount, price=price, datetime=TODAY)
+
+
+class TestBatchExecution(unittest.TestCase):
+
+    @staticmethod
+    def make_traders(orders, init_fund, position):
+        traders = []
+        for _ in range(2):
+            trader = Trader(make_strategy(orders), init_fund, TODAY, TODAY, commission_calc_func=lambda t: 1)
+            trader._position = dict(position or {})
+            traders.append(trader)
+        return traders
+
+    def assert_same_result(self, orders, init_fund=1000, position=None, force=False):
+        traders = self.make_traders(orders, init_fund, position)
+        expected = traders[0].make_trades(MARKET_DATA, TODAY, "nasdaq", force=force)
+        actual = traders[1].make_trades_batch(MARKET_DATA, TODAY, "nasdaq", force=force)
+        self.assertEqual(expected, actual)
+        self.assertAlmostEqual(traders[0].cash, traders[1].cash)
+        self.assertEqual(traders[0].get_position(), traders[1].get_position())
+        return actual
+
+    def test_all_orders_filled(self):
+        orders = [order(1, "AAPL", 3, 101), order(1, "MSFT", 4, 50), order(-1, "AAPL", 2, 99)]
+        self.assertEqual(len(self.assert_same_result(orders)), 3)
+
+    def test_orders_skipped_in_sequence(self):
+        orders = [order(1, "AAPL", 5, 100), order(1, "MSFT", 20, 50), order(-1, "MSFT", 1, 50),
+                  order(-1, "AAPL", 6, 100), order(1, "AAPL", 1, 90), order(1, "IBM", 1, 10), order(1, "MSFT", 9, 50)]
+        self.assertEqual(len(self.assert_same_result(orders, position={"MSFT": 1})), 3)
+
+    def test_cash_checked_after_every_order(self):
+        # the net total is positive, but the cash drops below zero after the first buy
+        orders = [order(1, "AAPL", 20, 100), order(-1, "MSFT", 30, 50), order(1, "MSFT", 1, 50)]
+        self.assertEqual(len(self.assert_same_result(orders, position={"MSFT": 30})), 2)
+
+    def test_force(self):
+        orders = [order(1, "AAPL", 5, 90), order(-1, "MSFT", 3, 60), order(1, "IBM", 1, 10)]
+        self.assertEqual(len(self.assert_same_result(orders, force=True)), 2)
+        # each forced order is applied in turn, so a buy that takes the cash below zero raises even if a later sell
+        # would make up for it
+        orders = [order(1, "AAPL", 20, 100), order(-1, "MSFT", 30, 50)]
+        traders = self.make_traders(orders, 1000, {"MSFT": 30})
+        with self.assertRaises(ValueError):
+            traders[0].make_trades(MARKET_DATA, TODAY, "nasdaq", force=True)
+        with self.assertRaises(ValueError):
+            traders[1].make_trades_batch(MARKET_DATA, TODAY, "nasdaq", force=True)
+
+    def test_empty_orders(self):
+        self.assertEqual(self.assert_same_result([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
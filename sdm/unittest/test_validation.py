@@ -0,0 +1,78 @@
+from sdm.operation.validation import *
+
+from collections import OrderedDict
+import datetime as dt
+import unittest
+
+
+def bar(open_price=10, high=12, low=9, close=11, volume=100):
+    return {"open": open_price, "high": high, "low": low, "close": close, "volume": volume}
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_record_rules(self):
+        data = {"MSFT": OrderedDict([(dt.datetime(2020, 1, 2), bar()),
+                                     (dt.datetime(2020, 1, 3), bar(low=11.5)),
+                                     (dt.datetime(2020, 1, 6), {"open": 1, "high": 1, "low": 1, "close": 1}),
+                                     (dt.datetime(2020, 1, 7), bar(close="NaN")),
+                                     (dt.datetime(2020, 1, 8), bar(volume=-1))])}
+        violations = find_historical_violations(data, "nasdaq", 2)
+        self.assertEqual([(v.datetime.day, v.rule) for v in violations],
+                         [(3, RULE_HIGH_LOW), (6, RULE_MISSING_COLUMN), (7, RULE_INVALID_VALUE),
+                          (8, RULE_INVALID_VALUE)])
+        self.assertEqual(find_historical_violations(data, "nasdaq", 1)[0].rule, RULE_MISSING_COLUMN)
+        self.assertEqual(find_historical_violations(data, "nasdaq", 0), [])
+        self.assertFalse(validate_historical_data(data, "nasdaq", 1))
+
+    def test_calendar_rules(self):
+        # 2020-01-20 is Martin Luther King Jr. Day, and 2020-01-21 is missing
+        data = {"MSFT": OrderedDict((dt.datetime(2020, 1, day), bar()) for day in [16, 17, 20, 22, 23])}
+        violations = find_historical_violations(data, "nasdaq", 3)
+        self.assertEqual([(v.datetime.day, v.rule) for v in violations], [(20, RULE_CLOSED_DAY), (21, RULE_GAP)])
+        by_rule, by_symbol = summarize_violations(violations)
+        self.assertEqual(by_symbol["MSFT"], 2)
+        self.assertFalse(validate_historical_data(data, "tsx", 3))
+        self.assertTrue(validate_historical_data({"MSFT": OrderedDict(list(data["MSFT"].items())[:2])}, "nasdaq", 3))
+
+    def test_order_rule(self):
+        data = {"MSFT": OrderedDict((dt.datetime(2021, 1, day), bar()) for day in [4, 6, 5, 7])}
+        self.assertFalse(validate_historical_data(data, "nasdaq", 3))
+        violations = find_historical_violations(data, "nasdaq", 3)
+        self.assertEqual([(v.datetime.day, v.rule) for v in violations], [(5, RULE_ORDER)])
+        self.assertTrue(validate_historical_data(data, "nasdaq", 2))
+        # a second record on the same day is a duplicate, and is dropped to clean the data
+        data["MSFT"][dt.datetime(2021, 1, 7, 16)] = bar()
+        cleaned = clean_historical_data(data, find_historical_violations(data, "nasdaq", 3))
+        self.assertEqual([datetime.day for datetime in cleaned["MSFT"]], [4, 6, 7])
+
+    def test_find_missing_dates(self):
+        data = {"MSFT": OrderedDict((dt.datetime(2020, 1, day), bar()) for day in [2, 3, 8, 10]),
+                "AAPL": OrderedDict((dt.datetime(2020, 1, day), bar()) for day in [2, 3, 6])}
+        self.assertEqual(find_missing_dates(data, "nasdaq"),
+                         {"MSFT": [dt.datetime(2020, 1, 6), dt.datetime(2020, 1, 7), dt.datetime(2020, 1, 9)]})
+        self.assertEqual(find_missing_dates(data, "nasdaq", end_date=dt.datetime(2020, 1, 7))["AAPL"],
+                         [dt.datetime(2020, 1, 7)])
+
+    def test_parallel_summary_and_clean(self):
+        data = {symbol: OrderedDict([(dt.datetime(2020, 1, 2), bar()), (dt.datetime(2020, 1, 3), bar(low=11.5)),
+                                     (dt.datetime(2020, 1, 6), bar(open_price=None))])
+                for symbol in ["AAPL", "MSFT", "IBM"]}
+        data["GOOG"] = OrderedDict([(dt.datetime(2020, 1, 2), bar())])
+        summary = validate_historical_data_parallel(data, "nasdaq", 2, processes=2, clean_method="repair")
+        self.assertFalse(summary["passed"])
+        self.assertEqual((summary["records"], summary["violations"]), (10, 6))
+        self.assertEqual(summary["by_rule"], {RULE_HIGH_LOW: 3, RULE_INVALID_VALUE: 3})
+        self.assertEqual(summary["by_symbol"], {"AAPL": 2, "MSFT": 2, "IBM": 2})
+        repaired = summary["cleaned_data"]["IBM"]
+        self.assertEqual(list(repaired.keys()), [dt.datetime(2020, 1, 2), dt.datetime(2020, 1, 3)])
+        self.assertEqual(repaired[dt.datetime(2020, 1, 3)]["low"], 10)
+        self.assertEqual(data["IBM"][dt.datetime(2020, 1, 3)]["low"], 11.5)
+
+        cleaned = clean_historical_data(data, find_historical_violations(data, "nasdaq", 2), "drop")
+        self.assertEqual(len(cleaned["AAPL"]), 1)
+        self.assertTrue(validate_historical_data(cleaned, "nasdaq", 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+This module converts stock data between the nested dict format used everywhere in SDM and a columnar format, so that
+bulk operations can be done on whole columns at once instead of record by record.
+
+The columnar format of one symbol is a dict with the datetime key mapped to a numpy datetime64[s] array sorted in
+ascending order, and each of the other keys (by default the base columns open, high, low, close, volume) mapped to a
+float numpy array of the same length. Missing or invalid values are NaN.
+"""
+import datetime as dt
+from collections import OrderedDict
+
+import numpy as np
+
+import sdm.constants as c
+from sdm.util.date_utils import string_to_datetime
+from sdm.util.misc_utils import enforce_precision
+
+DATETIME_UNIT = "datetime64[s]"
+
+
+def parse_datetime_strings(strings, date_format=c.DATE_FORMAT):
+    """
+    Parse a list of date or datetime strings at once. ISO formatted strings (e.g. 2020-01-02 or 2020-01-02 13:47:00) are
+    parsed by numpy directly, and any other format falls back to parsing each string with date_format.
+    :return: a numpy datetime64[s] array
+    """
+    try:
+        return np.array(strings, dtype=DATETIME_UNIT)
+    except ValueError:
+        return np.array([string_to_datetime(string, date_format) for string in strings], dtype=DATETIME_UNIT)
+
+
+def to_datetime64(datetime):
+    return np.datetime64(datetime, "s")
+
+
+EPOCH = dt.datetime(1970, 1, 1)
+_SECOND = dt.timedelta(seconds=1)
+
+
+def datetimes_to_datetime64(datetimes):
+    """
+    Convert a list of naive datetime objects to a numpy datetime64[s] array, several times faster than numpy converts
+    them one by one. Any other values fall back to numpy.
+    """
+    try:
+        seconds = np.fromiter(((datetime - EPOCH) // _SECOND for datetime in datetimes), dtype=np.int64,
+                              count=len(datetimes))
+    except TypeError:
+        return np.array(datetimes, dtype=DATETIME_UNIT)
+    return seconds.astype(DATETIME_UNIT)
+
+
+def to_float_array(values):
+    """
+    Convert a list of values to a float numpy array. None and values that are not numbers become NaN.
+    """
+    try:
+        return np.array(values, dtype=float)
+    except (ValueError, TypeError):
+        return np.array([_to_float(value) for value in values], dtype=float)
+
+
+def round_column(values):
+    """
+    Round all the float values in a list to FLOAT_PRECISION the same way as enforce_precision, including the ones in
+    nested dicts and lists. The other values are kept as they are.
+    :return: a list of the rounded values
+    """
+    return list(map(enforce_precision, values))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def ascending_order(dates):
+    """
+    Find the order to sort the dates ascending with the duplicates removed. If the dates are already in ascending or
+    descending order, no sorting is done at all.
+    :param dates: a numpy datetime64 array
+    :return: a tuple (order, duplicates). order is the index array to sort the dates, keeping the first of the
+    duplicated dates. duplicates is the index array of the other duplicated dates which are removed.
+    """
+    diffs = np.diff(dates)
+    if np.all(diffs > np.timedelta64(0)):
+        return np.arange(len(dates)), np.array([], dtype=int)
+    if np.all(diffs < np.timedelta64(0)):
+        return np.arange(len(dates))[::-1], np.array([], dtype=int)
+    order = np.argsort(dates, kind="stable")
+    sorted_dates = dates[order]
+    keep = np.r_[True, sorted_dates[1:] != sorted_dates[:-1]]
+    return order[keep], order[~keep]
+
+
+def _select_records(records, date_key, start_date, end_date, date_format):
+    records = [record for record in records if date_key in record]
+    dates = parse_datetime_strings([record[date_key] for record in records], date_format)
+    in_range = np.flatnonzero((dates >= to_datetime64(start_date)) & (dates <= to_datetime64(end_date)))
+    order, duplicates = ascending_order(dates[in_range])
+    return records, dates, in_range[order], in_range[duplicates]
+
+
+def records_to_historical(records, date_key, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE, drop_keys=(),
+                          date_format=c.DATE_FORMAT):
+    """
+    Convert a list of records from an API response to the historical data of one symbol.
+    :param records: a list of dicts, each with a date string under date_key
+    :param date_key: the key of the date string in each record
+    :param start_date: records before this datetime are skipped
+    :param end_date: records after this datetime are skipped
+    :param drop_keys: the keys to be removed from each record. The date key is always removed.
+    :param date_format: the format of the date string if it is not ISO formatted
+    :return: a tuple (data, duplicates). data is an OrderedDict with datetime object as the key in ascending order,
+    and the value is the record without the dropped keys. duplicates is a list of the records skipped because there is
+    already a record on the same date.
+    """
+    records, dates, selected, duplicates = _select_records(records, date_key, start_date, end_date, date_format)
+    drop_keys = set(drop_keys) | {date_key}
+    datetimes = dates[selected].tolist()
+    result = OrderedDict(zip(datetimes, ({key: value for key, value in records[i].items() if key not in drop_keys}
+                                         for i in selected)))
+    return result, [records[i] for i in duplicates]
+
+
+def records_to_columns(records, date_key, start_date=c.EARLIEST_DATE, end_date=c.LATEST_DATE,
+                       columns=c.BASE_COLUMNS, date_format=c.DATE_FORMAT):
+    """
+    Convert a list of records from an API response directly to the columnar format of one symbol.
+    :return: a tuple (columns, duplicates), the same as records_to_historical but with the data in columnar format
+    """
+    records, dates, selected, duplicates = _select_records(records, date_key, start_date, end_date, date_format)
+    selected_records = [records[i] for i in selected]
+    result = {c.DATETIME_KEY: dates[selected]}
+    for column in columns:
+        result[column] = to_float_array([record.get(column) for record in selected_records])
+    return result, [records[i] for i in duplicates]
+
+
+def historical_to_columns(symbol_data, columns=c.BASE_COLUMNS):
+    """
+    Convert the historical data of one symbol to the columnar format.
+    :param symbol_data: an OrderedDict with datetime object as the key in ascending order, and the value is the stock
+    data of the date as another dict
+    :param columns: the keys of the stock data to be converted to columns
+    :return: the data in columnar format
+    """
+    records = list(symbol_data.values())
+    result = {c.DATETIME_KEY: datetimes_to_datetime64(list(symbol_data.keys()))}
+    for column in columns:
+        result[column] = to_float_array([record.get(column) for record in records])
+    return result
+
+
+def columns_to_historical(columns):
+    """
+    Convert the columnar format of one symbol back to the historical data format.
+    :return: an OrderedDict with datetime object as the key, and the value is a dict of all the other columns
+    """
+    keys = [key for key in columns if key != c.DATETIME_KEY]
+    rows = zip(*(columns[key].tolist() for key in keys))
+    return OrderedDict(zip(columns[c.DATETIME_KEY].tolist(), (dict(zip(keys, row)) for row in rows)))
+
+
+def column_length(columns):
+    return len(columns[c.DATETIME_KEY])
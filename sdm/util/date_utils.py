@@ -1,7 +1,13 @@
 import sdm.constants as c
 import datetime as dt
+from functools import lru_cache
+
+import numpy as np
 import pytz
 
+# Number of distinct timestamps or datetimes kept by the cached scalar conversions
+CONVERSION_CACHE_SIZE = 65536
+
 
 def date_to_string(date, date_format=c.DATE_FORMAT):
     return dt.datetime.strftime(date, date_format)
@@ -19,12 +25,75 @@ def string_to_datetime(string, date_format=c.DATETIME_FORMAT):
     return dt.datetime.strptime(string, date_format)
 
 
+@lru_cache(maxsize=None)
+def get_timezone(timezone=c.TIMEZONE):
+    return pytz.timezone(timezone)
+
+
+@lru_cache(maxsize=CONVERSION_CACHE_SIZE)
 def timestamp_to_datetime(timestamp):
-    return dt.datetime.fromtimestamp(timestamp, tz=pytz.timezone('America/Toronto')).replace(tzinfo=None)
+    """
+    Convert a unix timestamp to a naive datetime in the local time of the market timezone.
+    """
+    return dt.datetime.fromtimestamp(timestamp, tz=get_timezone()).replace(tzinfo=None)
 
 
+@lru_cache(maxsize=CONVERSION_CACHE_SIZE)
 def datetime_to_timestamp(datetime):
-    return int(datetime.timestamp())
+    """
+    Convert a naive datetime in the local time of the market timezone to a unix timestamp. An ambiguous datetime when
+    the clock is set back is taken as the first one, in daylight saving time.
+    """
+    if datetime.tzinfo is not None:
+        return int(datetime.timestamp())
+    return int(get_timezone().localize(datetime, is_dst=True).timestamp())
+
+
+def timestamps_to_datetime64(timestamps):
+    """
+    Convert unix timestamps to the local time of the market timezone all at once, by looking up the UTC offset of each
+    timestamp in the transition table of the timezone.
+    :param timestamps: a list or numpy array of unix timestamps in seconds
+    :return: a numpy datetime64[s] array of the local times
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    transitions, offsets = _get_transition_table()
+    if transitions is None:
+        return np.array([timestamp_to_datetime(timestamp) for timestamp in timestamps.tolist()], dtype="datetime64[s]")
+    indexes = np.maximum(np.searchsorted(transitions, timestamps, side="right") - 1, 0)
+    return (timestamps + offsets[indexes]).astype("datetime64[s]")
+
+
+def timestamps_to_datetimes(timestamps):
+    """
+    Same as timestamp_to_datetime for a list of timestamps.
+    :return: a list of naive datetime objects
+    """
+    return timestamps_to_datetime64(timestamps).tolist()
+
+
+def datetimes_to_timestamps(datetimes):
+    """
+    Same as datetime_to_timestamp for a list of datetimes. Each distinct datetime is only converted once, since the
+    same dates are repeated for every symbol in stock data.
+    :return: a list of unix timestamps
+    """
+    unique_datetimes = {datetime: None for datetime in datetimes}
+    for datetime in unique_datetimes:
+        unique_datetimes[datetime] = datetime_to_timestamp(datetime)
+    return list(map(unique_datetimes.__getitem__, datetimes))
+
+
+@lru_cache(maxsize=None)
+def _get_transition_table(timezone=c.TIMEZONE):
+    # pytz keeps the UTC datetimes when the offset of the timezone changes, and the offset after each of them. Timezones
+    # with a fixed offset do not have the table, so they are converted one by one instead
+    tz = get_timezone(timezone)
+    if not hasattr(tz, "_utc_transition_times"):
+        return None, None
+    transitions = np.array(tz._utc_transition_times, dtype="datetime64[s]").astype(np.int64)
+    offsets = np.array([int(info[0].total_seconds()) for info in tz._transition_info], dtype=np.int64)
+    return transitions, offsets
 
 
 def get_current_datetime():
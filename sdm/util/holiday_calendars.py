@@ -0,0 +1,41 @@
+"""
+This module defines the holiday calendars of the markets with pandas. It is only imported when the holidays are needed,
+since importing pandas takes a long time compared to the rest of sdm.
+"""
+import datetime as dt
+
+from dateutil.relativedelta import MO
+from pandas import DateOffset
+from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, nearest_workday, USMartinLutherKingJr, \
+    USPresidentsDay, GoodFriday, USMemorialDay, USLaborDay, USThanksgivingDay, next_monday
+
+
+class USTradingCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday('NewYearsDay', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('USIndependenceDay', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+
+class CATradingCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday('NewYearsDay', month=1, day=1, observance=next_monday),
+        Holiday('FamilyDay', start_date=dt.datetime(2008, 1, 1), month=2, day=1, offset=DateOffset(weekday=MO(3))),
+        GoodFriday,
+        Holiday('VictoriaDay', month=5, day=24, offset=DateOffset(weekday=MO(-1))),
+        Holiday('CanadaDay', month=7, day=1, observance=next_monday),
+        Holiday('CivicHoliday', month=8, day=1, offset=DateOffset(weekday=MO(1))),
+        USLaborDay,
+        Holiday('CAThanksgiving', month=10, day=1, offset=DateOffset(weekday=MO(2))),
+        Holiday('Christmas', month=12, day=25, observance=
+        lambda d: d + dt.timedelta(2) if d.weekday() == 5 or d.weekday() == 6 else d),
+        Holiday('BoxingDay', month=12, day=26, observance=
+        lambda d: d + dt.timedelta(2) if d.weekday() == 5 or d.weekday() == 6 else d)
+    ]
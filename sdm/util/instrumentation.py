@@ -0,0 +1,211 @@
+"""
+This module is the instrumentation layer of SDM. The main steps of a pipeline are wrapped in named spans, and the
+amount of work done is added to named counters, so a report can show where the time is spent. It is disabled by
+default, and a span or counter only costs a function call and a flag check until enable() is called.
+
+    from sdm.util import instrumentation
+    instrumentation.enable(profile_stages=["load"])
+    ... run the pipeline ...
+    instrumentation.export_report("/tmp/sdm_report.json")
+    instrumentation.export_profiles("/tmp/sdm_profiles")
+"""
+import cProfile
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+# Names of the spans around the main steps of a pipeline
+SPAN_DOWNLOAD = "download"
+SPAN_PARSE = "parse"
+SPAN_PERSIST = "persist"
+SPAN_LOAD = "load"
+SPAN_TRANSPOSE = "transpose"
+SPAN_VALIDATE = "validate"
+SPAN_PATTERN_SCAN = "pattern_scan"
+SPAN_SIMULATION_DAY = "simulation_day"
+
+# Names of the counters
+COUNTER_REQUESTS = "requests"
+COUNTER_RETRIES = "retries"
+COUNTER_BYTES_DOWNLOADED = "bytes_downloaded"
+COUNTER_CACHE_HITS = "cache_hits"
+COUNTER_CACHE_MISSES = "cache_misses"
+COUNTER_ROWS_SAVED = "rows_saved"
+COUNTER_ROWS_LOADED = "rows_loaded"
+COUNTER_ROWS_VALIDATED = "rows_validated"
+
+_enabled = False
+_lock = threading.Lock()
+# span name -> [calls, total seconds, min seconds, max seconds]
+_spans = {}
+_counters = Counter()
+_profile_stages = set()
+# span name -> cProfile.Profile collecting the calls made inside the span
+_profiles = {}
+_profiling = threading.local()
+
+
+class _Span:
+
+    def __init__(self, name):
+        self._name = name
+        self._start = None
+        self._profile = None
+
+    def __enter__(self):
+        if self._name in _profile_stages and not getattr(_profiling, "active", False):
+            # only one profiler can be active at a time, so a profiled span inside another one is only timed
+            with _lock:
+                self._profile = _profiles.setdefault(self._name, cProfile.Profile())
+            _profiling.active = True
+            self._profile.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+            _profiling.active = False
+        with _lock:
+            stats = _spans.get(self._name)
+            if stats is None:
+                _spans[self._name] = [1, elapsed, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = min(stats[2], elapsed)
+                stats[3] = max(stats[3], elapsed)
+        return False
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(profile_stages=()):
+    """
+    Start collecting the spans and counters.
+    :param profile_stages: the names of the spans to also run under cProfile, which is much slower than only timing
+    """
+    global _enabled
+    _profile_stages.clear()
+    _profile_stages.update(profile_stages)
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    Clear everything collected so far, without changing whether it is enabled.
+    """
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _profiles.clear()
+
+
+def span(name):
+    """
+    Time the code inside a with statement under the span name, e.g. with span(SPAN_LOAD): ...
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """
+    Decorator to time every call of a function under the span name.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+    """
+    Add the value to the counter name.
+    """
+    if _enabled:
+        with _lock:
+            _counters[name] += value
+
+
+def get_report():
+    """
+    :return: a dict with spans mapping each span name to its calls, total_seconds, mean_seconds, min_seconds and
+    max_seconds, and counters mapping each counter name to its value
+    """
+    with _lock:
+        spans = {name: {"calls": calls, "total_seconds": total, "mean_seconds": total / calls,
+                        "min_seconds": minimum, "max_seconds": maximum}
+                 for name, (calls, total, minimum, maximum) in _spans.items()}
+        return {"spans": spans, "counters": dict(_counters)}
+
+
+def export_report(file_path):
+    """
+    Save the report to a json file, or a csv file if the file name ends with .csv. The csv file has one row per span
+    and per counter.
+    """
+    report = get_report()
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["type", "name", "calls", "total_seconds", "mean_seconds", "min_seconds", "max_seconds",
+                             "value"])
+            for name, stats in report["spans"].items():
+                writer.writerow(["span", name, stats["calls"], stats["total_seconds"], stats["mean_seconds"],
+                                 stats["min_seconds"], stats["max_seconds"], ""])
+            for name, value in report["counters"].items():
+                writer.writerow(["counter", name, "", "", "", "", "", value])
+    else:
+        with open(file_path, "w") as f:
+            json.dump(report, f, indent=2)
+    logging.info("Instrumentation report has been written to file {}".format(file_path))
+
+
+def export_profiles(directory):
+    """
+    Save the cProfile stats of each profiled span to <span name>.prof in the directory, to be read with pstats.
+    :return: the list of files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    with _lock:
+        for name, profile in _profiles.items():
+            file_path = os.path.join(directory, "{}.prof".format(name))
+            profile.dump_stats(file_path)
+            files.append(file_path)
+    logging.info("Profiles of {} stages have been written to directory {}".format(len(files), directory))
+    return files
@@ -28,3 +28,16 @@ def is_non_empty_file(file_path, file_name=None):
     if file_name is not None:
         file_path = os.path.join(file_path, file_name)
     return os.path.isfile(file_path) and os.path.getsize(file_path) > 0
+
+
+def write_atomically(file_path, write_func, mode="w"):
+    """
+    Write a file through a temporary file that replaces it at the end, so the file is never left half written.
+    :param file_path: the path of the file to write
+    :param write_func: a function that takes the opened temporary file and writes the content into it
+    :param mode: the mode to open the temporary file with, "w" for text or "wb" for binary
+    """
+    temp_path = file_path + ".tmp"
+    with open(temp_path, mode) as file:
+        write_func(file)
+    os.replace(temp_path, file_path)
@@ -1,56 +1,45 @@
 import datetime as dt
+import functools
 
-from dateutil.relativedelta import MO
-from pandas import DateOffset
-from pandas.tseries.holiday import AbstractHolidayCalendar, Holiday, nearest_workday, USMartinLutherKingJr, \
-    USPresidentsDay, GoodFriday, USMemorialDay, USLaborDay, USThanksgivingDay, next_monday
+import numpy as np
 
 import sdm.constants as c
 from sdm.util.date_utils import trunc_date, get_current_datetime
 
+# Names that used to be defined in this module, now built lazily so importing it does not import pandas
+_LAZY_NAMES = {"USTradingCalendar", "CATradingCalendar", "DEFAULT_CALENDAR", "CA_CALENDAR"}
 
-class USTradingCalendar(AbstractHolidayCalendar):
-    rules = [
-        Holiday('NewYearsDay', month=1, day=1, observance=nearest_workday),
-        USMartinLutherKingJr,
-        USPresidentsDay,
-        GoodFriday,
-        USMemorialDay,
-        Holiday('USIndependenceDay', month=7, day=4, observance=nearest_workday),
-        USLaborDay,
-        USThanksgivingDay,
-        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
-    ]
-
-
-class CATradingCalendar(AbstractHolidayCalendar):
-    rules = [
-        Holiday('NewYearsDay', month=1, day=1, observance=next_monday),
-        Holiday('FamilyDay', start_date=dt.datetime(2008, 1, 1), month=2, day=1, offset=DateOffset(weekday=MO(3))),
-        GoodFriday,
-        Holiday('VictoriaDay', month=5, day=24, offset=DateOffset(weekday=MO(-1))),
-        Holiday('CanadaDay', month=7, day=1, observance=next_monday),
-        Holiday('CivicHoliday', month=8, day=1, offset=DateOffset(weekday=MO(1))),
-        USLaborDay,
-        Holiday('CAThanksgiving', month=10, day=1, offset=DateOffset(weekday=MO(2))),
-        Holiday('Christmas', month=12, day=25, observance=
-        lambda d: d + dt.timedelta(2) if d.weekday() == 5 or d.weekday() == 6 else d),
-        Holiday('BoxingDay', month=12, day=26, observance=
-        lambda d: d + dt.timedelta(2) if d.weekday() == 5 or d.weekday() == 6 else d)
-    ]
-
-
-inst = USTradingCalendar()
-DEFAULT_CALENDAR = inst.holidays(c.EARLIEST_DATE - dt.timedelta(days=1), c.LATEST_DATE + dt.timedelta(days=1))
-inst_ca = CATradingCalendar()
-CA_CALENDAR = inst_ca.holidays(c.EARLIEST_DATE - dt.timedelta(days=1), c.LATEST_DATE + dt.timedelta(days=1))
-
-
-def is_open_day(date, market, holidays=DEFAULT_CALENDAR):
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError("module {} has no attribute {}".format(__name__, name))
+    if name == "DEFAULT_CALENDAR":
+        return get_holidays("nasdaq")
+    if name == "CA_CALENDAR":
+        return get_holidays("tsx")
+    from sdm.util import holiday_calendars
+    return getattr(holiday_calendars, name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_holidays(market):
+    """
+    Get the holidays of the market from EARLIEST_DATE to LATEST_DATE. pandas is imported by the first call.
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :return: a pandas DatetimeIndex of the holidays, without the special closed days of the market
+    """
+    from sdm.util.holiday_calendars import USTradingCalendar, CATradingCalendar
+    calendar = CATradingCalendar() if market == "tsx" else USTradingCalendar()
+    return calendar.holidays(c.EARLIEST_DATE - dt.timedelta(days=1), c.LATEST_DATE + dt.timedelta(days=1))
+
+
+def is_open_day(date, market, holidays=None):
     if date.weekday() >= 5:
         return False
 
     if market != 'tsx':
+        if holidays is None:
+            holidays = get_holidays(market)
         if trunc_date(date) in c.US_SPECIAL_CLOSED_DAYS:
             return False
         if trunc_date(date) in holidays and not (date.weekday() == 4 and date.month == 12 and date.day == 31):
@@ -58,7 +47,7 @@ def is_open_day(date, market, holidays=DEFAULT_CALENDAR):
             # the nearest observed new years day. Only applicable to US though.
             return False
     else:
-        holidays = CA_CALENDAR
+        holidays = get_holidays(market)
         if trunc_date(date) in c.CA_SPECIAL_OPEN_DAYS:
             return True
         if trunc_date(date) in c.CA_SPECIAL_CLOSED_DAYS:
@@ -69,7 +58,7 @@ def is_open_day(date, market, holidays=DEFAULT_CALENDAR):
     return True
 
 
-def shift_open_days(date, days_to_shift, market, holidays=DEFAULT_CALENDAR):
+def shift_open_days(date, days_to_shift, market, holidays=None):
     if days_to_shift == 0:
         raise ValueError("Need to shift for at least one day!")
     delta = 1 if days_to_shift > 0 else -1
@@ -81,6 +70,59 @@ def shift_open_days(date, days_to_shift, market, holidays=DEFAULT_CALENDAR):
     return date
 
 
+@functools.lru_cache(maxsize=None)
+def get_trading_calendar(market):
+    """
+    Get the calendar of open days of the market, to check many dates at once with numpy functions such as
+    np.is_busday(dates, busdaycal=calendar) and np.busday_count(begin_dates, end_dates, busdaycal=calendar).
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :return: a numpy busdaycalendar with weekends and all the closed days of the market as holidays
+    """
+    if market == "tsx":
+        closed_days = set(get_holidays(market).to_pydatetime()) | set(c.CA_SPECIAL_CLOSED_DAYS)
+        closed_days -= set(c.CA_SPECIAL_OPEN_DAYS)
+    else:
+        # If a new year is on Saturday and new years eve falls on Friday, then Friday is partially open even it is the
+        # nearest observed new years day
+        closed_days = {date for date in get_holidays(market).to_pydatetime()
+                       if not (date.weekday() == 4 and date.month == 12 and date.day == 31)}
+        closed_days |= set(c.US_SPECIAL_CLOSED_DAYS)
+    return np.busdaycalendar(holidays=np.array(sorted(closed_days), dtype="datetime64[D]"))
+
+
+def get_open_days(start_date, end_date, market):
+    """
+    :return: a numpy datetime64[D] array of all the open days of the market from start_date to end_date inclusive
+    """
+    days = np.arange(np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1)
+    return days[np.is_busday(days, busdaycal=get_trading_calendar(market))]
+
+
+def find_missing_dates(data, market, start_date=None, end_date=None):
+    """
+    Find the open days without data for each symbol, by comparing the dates of the symbol against all the open days
+    in its date range.
+    :param data: the historical data used in sdm. A dict with symbol as the key, and the value is an OrderedDict with
+    datetime object as the key
+    :param market: 'nyse', 'nasdaq', or 'tsx'
+    :param start_date: the first date expected to have data. Default is the first date of each symbol
+    :param end_date: the last date expected to have data. Default is the last date of each symbol
+    :return: a dict with symbol as the key, and the value is a list of datetime objects of the missing open days in
+    ascending order. Symbols without any missing day are not included.
+    """
+    result = {}
+    for symbol, symbol_data in data.items():
+        if len(symbol_data) == 0:
+            continue
+        dates = np.array(list(symbol_data.keys()), dtype="datetime64[D]")
+        expected = get_open_days(dates.min() if start_date is None else start_date,
+                                 dates.max() if end_date is None else end_date, market)
+        missing = np.setdiff1d(expected, dates)
+        if len(missing) > 0:
+            result[symbol] = missing.astype("datetime64[s]").tolist()
+    return result
+
+
 def is_open_time(current_time, market):
     start_time = dt.datetime.combine(current_time.date(), dt.time(9, 30, 00))
     end_time = dt.datetime.combine(current_time.date(), dt.time(16, 00, 00))